@@ -18,6 +18,8 @@
 */
 
 #include <Python.h>
+#include <pythread.h>
+#include <time.h>
 #include <alsa/asoundlib.h>
 
 #define PyInt_FromLong PyLong_FromLong
@@ -29,7 +31,8 @@ static PyObject *ErrorObject;
 /* ----------------------------------------------------- */
 
 static char alsaseq_client__doc__[] =
-"client( name, ninputports, noutputports, createqueue ) --> None.\n\n"
+"client( name, ninputports, noutputports, createqueue\n"
+"        [, pool, inpool, inbuf, outbuf] ) --> Client.\n\n"
 "Create an ALSA sequencer client with zero or more input or output ports,\n"
 "and optionally a timing queue.\n\n"
 "ninputports and noutputports are created if quantity requested is\n"
@@ -37,80 +40,999 @@ static char alsaseq_client__doc__[] =
 "createqueue = True creates a queue for stamping arrival time of incoming\n"
 "events and scheduling future start time of outgoing events.\n\n"
 "createqueue = None creates a client that receives events without\n"
-"stamping arrival time and sends outgoing events for imediate execution.";
+"stamping arrival time and sends outgoing events for imediate execution.\n\n"
+"pool, inpool size the kernel output and input pools in events, inbuf,\n"
+"outbuf the libasound input and output buffers in bytes.  0 or left out\n"
+"keeps the ALSA default.  Grow them if stats() shows overruns or\n"
+"blocked output on dense controller bursts.\n\n"
+"The module level functions use the last client made by client().\n"
+"Use alsaseq.Client(...) with the same arguments for more clients,\n"
+"each with its own ports, routes and methods of the same names.";
+
+// inmidi_many() packs each event as this many native ints:
+//   type, channel, note/param, velocity/value
+#define INMIDI_FIELDS 4
+// with stamp on, two more: arrival time seconds, nanoseconds
+#define INMIDI_STAMPED_FIELDS 6
+
+#define RX_RING 64  /* power of 2, also max events per inmidi_many() */
+
+#define ROUTE_DROP    0  /* swallow it */
+#define ROUTE_PASS    1  /* send on as is */
+#define ROUTE_CHANNEL 2  /* send on, on tx_channel */
+#define ROUTE_CC      3  /* controller arg0 on tx_channel, same value */
+#define ROUTE_NRPN    4  /* NRPN arg0(MSB), arg1(LSB), data MSB arg2 and
+                            value as data LSB.  arg1 < 0 re-uses the LSB of
+                            the last NRPN a rule sent */
+#define ROUTE_PYTHON  5  /* hand up to python, to punch holes in wildcards */
+#define maximum_routes 128
+
+typedef struct {
+  int action, tx_channel; // tx_channel < 0 keeps the rx channel
+  int arg[3];
+} route_t;
+
+// snd_midi_event buffer, the longest sysex outbytes() sends as one event
+#define MIDI_CODER_BUF 256
+
+#define ROUTE_TYPES 7          /* event types we route, see route_slot() */
+#define ROUTE_ANY_CH 16        /* channel slot matching any channel */
+#define ROUTE_ANY_PARAM 128    /* param slot matching any param */
+
+// routes() table of one input port
+typedef struct {
+  route_t routes[maximum_routes];
+  int nroutes;
+  int tx_port; // our output port the rules send from, -1 the first
+  // 1 + routes[] index of rule for type, channel, param.  0 for no rule.
+  unsigned char index[ROUTE_TYPES][ROUTE_ANY_CH+1][ROUTE_ANY_PARAM+1];
+  int nrpn_lsb; // of the last NRPN a rule sent, routelsb() shares it
+} route_table_t;
+
+// filter() rules, by event type and optionally source port
+#define FILTER_ANY    1  /* drop the type from anywhere */
+#define FILTER_SOURCE 2  /* drop the type from some sources, see filter_src */
+#define maximum_filter_srcs 32
+
+typedef struct {
+  int type, client, port; // -1 matches any
+} filter_src_t;
+
+// A sequencer client, with its own handle, ports, queue, rx ring and
+// routing table.  The module level functions work on the client made
+// by client(), so old scripts keep working.
+typedef struct {
+  PyObject_HEAD
+  snd_seq_t *seq_handle;
+  int queue_id, ninputports, noutputports, createqueue;
+  int firstoutputport, lastoutputport;
+
+  // copy of rx events, for modifications.
+  // it's about 32 bytes roughly..
+  // So our python can send the last rx'ed packet with
+  // just slight modifications, without the whole event getting passed
+  // to and from.
+  // Kept as a small ring, so events drained in one inmidi_many() call
+  // can each still be sent with outlast().
+  snd_seq_event_t rx_events[RX_RING];
+  unsigned int rx_head;   // count of rx'ed events, newest is rx_head-1
+  unsigned int rx_batch;  // rx_head at start of last inmidi_many() drain
+
+  // routing table by input port, events are looked up in the one for the
+  // port they came in on.
+  route_table_t route_tables[maximum_nports];
+
+  // NRPN address(MSB, LSB) each output port and channel has selected, as
+  // far as we know from what we sent, -1 unknown.  nrpn() and ROUTE_NRPN
+  // skip the 99, 98 CCs when the address is already selected.
+  // tx_event() keeps it up to date, out_lock held.
+  int tx_nrpn[maximum_nports][16][2];
+
+  // The blocking libasound calls run with the GIL released, so other python
+  // threads keep going while we wait on the sequencer.  in_lock guards the
+  // libasound input buffer, out_lock the output side.  The rx_events ring
+  // is only touched with the GIL held.  Never wait on one of these locks
+  // while holding the GIL, see seq_lock().
+  PyThread_type_lock in_lock, out_lock;
+
+  // raw MIDI bytes from events, for inbytes().  outbytes() makes its own
+  // coder each call, a sysex it sends points into the coder buffer.
+  snd_midi_event_t *rx_coder;
+
+  // counts for stats(), rx ones kept under in_lock, tx ones under out_lock
+  unsigned long nreceived, noverrun, nsent, ndropped, nblocked;
+  int lost_base; // kernel event_lost count at the last stats( reset )
+
+  // filter(), events dropped before routes() or python see them
+  unsigned char filter_mask[256];  // FILTER_ bits by event type
+  filter_src_t filter_src[maximum_filter_srcs];
+  int nfilter_src;
+  unsigned long filtered[256];     // count dropped, by event type
+
+  // an event wait() read ahead for python, the next read hands it out
+  snd_seq_event_t stash;
+  int stashed, stash_cap;
+  unsigned char *stash_data; // copy of variable length data
+} ClientObject;
+
+static PyTypeObject Client_Type;
+static ClientObject *default_client; // made by client()
 
-snd_seq_t *seq_handle;
-int queue_id, ninputports, noutputports, createqueue;
-int firstoutputport, lastoutputport;
+//-------------------------------------------------
+// keep a copy of a rx event in the ring, return the copy.
+static snd_seq_event_t *
+rx_store(ClientObject *self, const snd_seq_event_t *ev)
+{
+  snd_seq_event_t *dst = &self->rx_events[self->rx_head & (RX_RING - 1)];
+  *dst = *ev;
+  self->rx_head++;
+  return dst;
+}
+
+//-------------------------------------------------
+// reduce an event to the MIDI info inmidi() hands back.
+static void
+rx_record(const snd_seq_event_t *ev, int *rec)
+{
+  rec[0] = ev->type;
+  rec[1] = ev->data.note.channel;
+  switch( ev->type ) {
+  case SND_SEQ_EVENT_NOTE:
+  case SND_SEQ_EVENT_NOTEON:
+  case SND_SEQ_EVENT_NOTEOFF:
+  case SND_SEQ_EVENT_KEYPRESS:
+      rec[2] = ev->data.note.note;
+      rec[3] = ev->data.note.velocity;
+      break;
+
+  // System Announce news, see announce().  client, port of who changed.
+  case SND_SEQ_EVENT_CLIENT_START:
+  case SND_SEQ_EVENT_CLIENT_EXIT:
+  case SND_SEQ_EVENT_CLIENT_CHANGE:
+  case SND_SEQ_EVENT_PORT_START:
+  case SND_SEQ_EVENT_PORT_EXIT:
+  case SND_SEQ_EVENT_PORT_CHANGE:
+      rec[1] = ev->data.addr.client;
+      rec[2] = ev->data.addr.port;
+      rec[3] = 0;
+      break;
+  // the data is not here, just its length
+  case SND_SEQ_EVENT_SYSEX:
+      rec[1] = 0;
+      rec[2] = ev->data.ext.len;
+      rec[3] = 0;
+      break;
+  // sender client, port, and dest packed as client << 8 | port
+  case SND_SEQ_EVENT_PORT_SUBSCRIBED:
+  case SND_SEQ_EVENT_PORT_UNSUBSCRIBED:
+      rec[1] = ev->data.connect.sender.client;
+      rec[2] = ev->data.connect.sender.port;
+      rec[3] = (ev->data.connect.dest.client << 8) | ev->data.connect.dest.port;
+      break;
+
+  default:
+      rec[2] = ev->data.control.param;
+      rec[3] = ev->data.control.value;
+      break;
+  }
+}
+
+//-------------------------------------------------
+// take lock, letting other threads run if we have to wait for it.
+static void
+seq_lock(PyThread_type_lock lock)
+{
+  if (!PyThread_acquire_lock(lock, NOWAIT_LOCK)) {
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(lock, WAIT_LOCK);
+    Py_END_ALLOW_THREADS
+  }
+}
+
+//-------------------------------------------------
+// wait for the sequencer to be readable(POLLIN) or have room(POLLOUT).
+// The handle is nonblocking, this is where we block instead, without
+// the GIL.  Returns 0, or -errno if poll failed or got a signal.
+static int
+seq_poll(ClientObject *self, short events)
+{
+  int npfd = snd_seq_poll_descriptors_count(self->seq_handle, events);
+  struct pollfd *pfd = (struct pollfd *)alloca(npfd * sizeof(struct pollfd));
+
+  snd_seq_poll_descriptors(self->seq_handle, pfd, npfd, events);
+  if ( poll( pfd, npfd, -1 ) < 0 )
+    return -errno;
+  return 0;
+}
+
+//-------------------------------------------------
+// read one event, counting it for stats().  -ENOSPC means the kernel
+// queue overran and threw events away, count it and read on.  -EAGAIN if
+// there is none, rx_input() does the waiting.  in_lock held.
+static int
+rx_read(ClientObject *self, snd_seq_event_t **ev)
+{
+  int res;
+
+  if ( self->stashed ) {
+    self->stashed = 0;
+    *ev = &self->stash;
+    return 0;
+  }
+  for (;;) {
+    res = snd_seq_event_input( self->seq_handle, ev );
+    if ( res == -ENOSPC ) {
+      self->noverrun++;
+      continue;
+    }
+    if ( res >= 0 )
+      self->nreceived++;
+    return res;
+  }
+}
+
+//-------------------------------------------------
+// snd_seq_event_input_pending( fetch ), counting an overrun it runs into.
+static int
+rx_pending(ClientObject *self)
+{
+  int res;
+
+  if ( self->stashed )
+    return 1;
+  res = snd_seq_event_input_pending( self->seq_handle, 1 );
+  if ( res == -ENOSPC ) {
+    self->noverrun++;
+    res = snd_seq_event_input_pending( self->seq_handle, 1 );
+  }
+  return res;
+}
+
+//-------------------------------------------------
+// our output port number to 0 for the first output port and up, out of
+// range ones as tx_prepare() moves them.
+static int
+tx_out_index(ClientObject *self, int port)
+{
+  if ( port > self->lastoutputport )
+    port = self->lastoutputport;
+  if ( port < self->firstoutputport )
+    port = self->firstoutputport;
+  return port - self->firstoutputport;
+}
+
+//-------------------------------------------------
+// note the NRPN address a controller event we sent selects.  RPN select
+// or a failed send leaves the synth's address unknown.  out_lock held.
+static void
+tx_nrpn_track(ClientObject *self, const snd_seq_event_t *ev, int err)
+{
+  int *sel = self->tx_nrpn[tx_out_index(self, ev->source.port)]
+                          [ev->data.control.channel & 0x0f];
+
+  switch ( ev->data.control.param ) {
+  case 99: // NRPN MSB
+  case 98: // NRPN LSB
+      if ( err < 0 )
+          sel[0] = sel[1] = -1;
+      else
+          sel[ev->data.control.param == 98] = ev->data.control.value;
+      break;
+  case 101: // RPN MSB
+  case 100: // RPN LSB
+      sel[0] = sel[1] = -1;
+      break;
+  }
+}
+
+//-------------------------------------------------
+// send one event now(direct), or put it in the output buffer, waiting
+// while the kernel pool is full.  Counted for stats().  out_lock held.
+static int
+tx_event(ClientObject *self, snd_seq_event_t *ev, int direct)
+{
+  int err;
+
+  while ( (err = direct ? snd_seq_event_output_direct( self->seq_handle, ev )
+                        : snd_seq_event_output( self->seq_handle, ev )) == -EAGAIN ) {
+    self->nblocked++;
+    if ( (err = seq_poll(self, POLLOUT)) < 0 )
+      break;
+  }
+  if ( err < 0 )
+    self->ndropped++;
+  else
+    self->nsent++;
+  if ( ev->type == SND_SEQ_EVENT_CONTROLLER )
+    tx_nrpn_track(self, ev, err);
+  return err;
+}
+
+//-------------------------------------------------
+// send the output buffer, waiting while the kernel pool is full.
+// out_lock held.
+static int
+tx_drain(ClientObject *self)
+{
+  int err;
+
+  // > 0 is bytes still to go after a partial write
+  while ( (err = snd_seq_drain_output( self->seq_handle )) != 0 ) {
+    if ( err < 0 && err != -EAGAIN )
+      break;
+    self->nblocked++;
+    if ( (err = seq_poll(self, POLLOUT)) < 0 )
+      break;
+  }
+  return err;
+}
+
+//-------------------------------------------------
+// fill in queue, source, dest of an event we are about to send.
+static void
+tx_prepare(ClientObject *self, snd_seq_event_t *ev)
+{
+  /* If not a direct event, use the queue */
+  if ( ev->queue != SND_SEQ_QUEUE_DIRECT )
+      ev->queue = self->queue_id;
+  /* Modify source port if out of bounds */
+  if ( ev->source.port < self->firstoutputport ) 
+     snd_seq_ev_set_source(ev, self->firstoutputport );
+  else if ( ev->source.port > self->lastoutputport )
+     snd_seq_ev_set_source(ev, self->lastoutputport );
+  /* Use subscribed ports, except if ECHO event */
+  if ( ev->type != SND_SEQ_EVENT_ECHO ) snd_seq_ev_set_subs(ev);
+  // kb - above sets dest.client(SUBSCRIBERS), .port to UNKNOWN..
+  // not sure if that is needed, maybe it's already set on rx.
+}
+
+//-------------------------------------------------
+// send one event straight out, without the GIL.
+static void
+tx_direct(ClientObject *self, snd_seq_event_t *ev)
+{
+  seq_lock(self->out_lock);
+  Py_BEGIN_ALLOW_THREADS
+  tx_event(self, ev, 1);
+  PyThread_release_lock(self->out_lock);
+  Py_END_ALLOW_THREADS
+}
 
-// copy of rx events, for modifications.
-// it's about 32 bytes roughly..
-// So our python can send the last rx'ed packet with
-// just slight modifications, without the whole event getting passed
-// to and from.
-snd_seq_event_t rx_events[2];  // only use first now.
+//-------------------------------------------------
+// queue up several events and send with one drain, without the GIL.
+static void
+tx_burst(ClientObject *self, snd_seq_event_t *evs, int n)
+{
+  int i;
+
+  seq_lock(self->out_lock);
+  Py_BEGIN_ALLOW_THREADS
+  for ( i=0; i < n; i++ )
+      tx_event(self, &evs[i], 0);
+  tx_drain(self);
+  PyThread_release_lock(self->out_lock);
+  Py_END_ALLOW_THREADS
+}
+
+//-------------------------------------------------
+// set up a controller event to send from our output port(< 0 the first).
+static void
+tx_cc(ClientObject *self, snd_seq_event_t *ev, int port, int ch, int cc, int value)
+{
+  snd_seq_ev_clear(ev);
+  snd_seq_ev_set_controller(ev, ch, cc, value);
+  snd_seq_ev_set_direct(ev);
+  if ( port >= 0 )
+    snd_seq_ev_set_source(ev, port);
+  tx_prepare(self, ev);
+}
+
+//-------------------------------------------------
+// send a NRPN with one drain, without the GIL.  The 99, 98 address CCs
+// are left out if the channel already has that address selected.
+// Returns CCs sent.
+static int
+tx_nrpn(ClientObject *self, int port, int ch, int msb, int lsb, int data_msb, int value)
+{
+  snd_seq_event_t tx[4];
+  int i, n = 0, *sel;
+
+  seq_lock(self->out_lock);
+  Py_BEGIN_ALLOW_THREADS
+  sel = self->tx_nrpn[tx_out_index(self, port)][ch];
+  if ( sel[0] != msb || sel[1] != lsb ) {
+    tx_cc(self, &tx[n++], port, ch, 99, msb);       // NRPN MSB
+    tx_cc(self, &tx[n++], port, ch, 98, lsb);       // NRPN LSB
+  }
+  tx_cc(self, &tx[n++], port, ch, 6, data_msb);     // data entry MSB
+  tx_cc(self, &tx[n++], port, ch, 38, value);       // data entry LSB
+  for ( i=0; i < n; i++ )
+      tx_event(self, &tx[i], 0);
+  tx_drain(self);
+  PyThread_release_lock(self->out_lock);
+  Py_END_ALLOW_THREADS
+  return n;
+}
+
+//-------------------------------------------------
+// set the MIDI info of an event, the reverse of rx_record().
+static void
+ev_set_record(snd_seq_event_t *ev, const int *rec)
+{
+  ev->type = rec[0];
+  ev->data.note.channel = rec[1]; // same spot for control.channel
+  switch( ev->type ) {
+  case SND_SEQ_EVENT_NOTE:
+  case SND_SEQ_EVENT_NOTEON:
+  case SND_SEQ_EVENT_NOTEOFF:
+  case SND_SEQ_EVENT_KEYPRESS:
+      ev->data.note.note = rec[2];
+      ev->data.note.velocity = rec[3];
+      break;
+
+  case SND_SEQ_EVENT_CLIENT_START:
+  case SND_SEQ_EVENT_CLIENT_EXIT:
+  case SND_SEQ_EVENT_CLIENT_CHANGE:
+  case SND_SEQ_EVENT_PORT_START:
+  case SND_SEQ_EVENT_PORT_EXIT:
+  case SND_SEQ_EVENT_PORT_CHANGE:
+      ev->data.addr.client = rec[1];
+      ev->data.addr.port = rec[2];
+      break;
+  case SND_SEQ_EVENT_PORT_SUBSCRIBED:
+  case SND_SEQ_EVENT_PORT_UNSUBSCRIBED:
+      ev->data.connect.sender.client = rec[1];
+      ev->data.connect.sender.port = rec[2];
+      ev->data.connect.dest.client = rec[3] >> 8;
+      ev->data.connect.dest.port = rec[3] & 0xff;
+      break;
+
+  default:
+      ev->data.control.param = rec[2];
+      ev->data.control.value = rec[3];
+      break;
+  }
+}
+
+//-------------------------------------------------
+// build an event to send from inmidi() style info.
+static void
+tx_record(ClientObject *self, snd_seq_event_t *ev, const int *rec)
+{
+  snd_seq_ev_clear(ev);
+  ev_set_record(ev, rec);
+  snd_seq_ev_set_direct(ev);
+  tx_prepare(self, ev);
+}
 
 //-------------------------------------------------
+// alsaseq.Event, a snd_seq_event_t in a python object.  No tuples get
+// built to look at one, and the raw event is there as a buffer.
+typedef struct {
+  PyObject_HEAD
+  snd_seq_event_t ev;
+} EventObject;
+
+static PyTypeObject Event_Type;
+
+#define Event_Check(op) PyObject_TypeCheck(op, &Event_Type)
+
+static PyObject *
+Event_FromEvent(const snd_seq_event_t *ev)
+{
+  EventObject *e = PyObject_New(EventObject, &Event_Type);
+
+  if ( e == NULL )
+    return NULL;
+  e->ev = *ev;
+  return (PyObject *)e;
+}
+
+static int
+Event_init(EventObject *self, PyObject *args, PyObject *kwds)
+{
+  static char *kwlist[] = {"type", "channel", "param", "value", NULL};
+  int rec[INMIDI_FIELDS] = {0, 0, 0, 0};
+
+  if (!PyArg_ParseTupleAndKeywords(args, kwds, "|iiii", kwlist,
+          &rec[0], &rec[1], &rec[2], &rec[3] ))
+      return -1;
+  snd_seq_ev_clear(&self->ev);
+  ev_set_record(&self->ev, rec);
+  snd_seq_ev_set_direct(&self->ev);
+  return 0;
+}
+
+// type, channel, note/param, value, closure is the inmidi() field.
+static PyObject *
+Event_get_field(EventObject *self, void *closure)
+{
+  int rec[INMIDI_FIELDS];
+
+  rx_record(&self->ev, rec);
+  return PyInt_FromLong( rec[(Py_intptr_t)closure] );
+}
+
+static int
+Event_set_field(EventObject *self, PyObject *value, void *closure)
+{
+  int rec[INMIDI_FIELDS];
+  long v;
+
+  if ( value == NULL ) {
+    PyErr_SetString( PyExc_TypeError, "can't delete Event fields" );
+    return -1;
+  }
+  v = PyLong_AsLong( value );
+  if ( v == -1 && PyErr_Occurred() )
+    return -1;
+  rx_record(&self->ev, rec);
+  rec[(Py_intptr_t)closure] = v;
+  ev_set_record(&self->ev, rec);
+  return 0;
+}
+
+static PyObject *
+Event_get_time(EventObject *self, void *closure)
+{
+  return Py_BuildValue( "(ii)", self->ev.time.time.tv_sec, self->ev.time.time.tv_nsec );
+}
+
+static int
+Event_set_time(EventObject *self, PyObject *value, void *closure)
+{
+  if ( value == NULL ) {
+    PyErr_SetString( PyExc_TypeError, "can't delete Event fields" );
+    return -1;
+  }
+  if (!PyArg_ParseTuple( value, "ii;time should be (seconds, nanoseconds)",
+         &self->ev.time.time.tv_sec, &self->ev.time.time.tv_nsec ))
+    return -1;
+  return 0;
+}
+
+// source or dest, closure is the offset of the snd_seq_addr_t.
+static PyObject *
+Event_get_addr(EventObject *self, void *closure)
+{
+  snd_seq_addr_t *addr = (snd_seq_addr_t *)((char *)&self->ev + (Py_intptr_t)closure);
+
+  return Py_BuildValue( "(bb)", addr->client, addr->port );
+}
+
+static int
+Event_set_addr(EventObject *self, PyObject *value, void *closure)
+{
+  snd_seq_addr_t *addr = (snd_seq_addr_t *)((char *)&self->ev + (Py_intptr_t)closure);
+
+  if ( value == NULL ) {
+    PyErr_SetString( PyExc_TypeError, "can't delete Event fields" );
+    return -1;
+  }
+  if (!PyArg_ParseTuple( value, "bb;address should be (client, port)",
+         &addr->client, &addr->port ))
+    return -1;
+  return 0;
+}
+
 static PyObject *
-alsaseq_client(PyObject *self /* Not used */, PyObject *args)
+Event_repr(EventObject *self)
+{
+  int rec[INMIDI_FIELDS];
+
+  rx_record(&self->ev, rec);
+  return PyUnicode_FromFormat( "alsaseq.Event(%d, %d, %d, %d)",
+             rec[0], rec[1], rec[2], rec[3] );
+}
+
+static int
+Event_getbuffer(EventObject *self, Py_buffer *view, int flags)
+{
+  return PyBuffer_FillInfo( view, (PyObject *)self, &self->ev,
+             sizeof(self->ev), 0, flags );
+}
+
+static PyGetSetDef Event_getset[] = {
+ {"type",	(getter)Event_get_field,	(setter)Event_set_field,	"event type, SND_SEQ_EVENT_*",	(void *)0},
+ {"channel",	(getter)Event_get_field,	(setter)Event_set_field,	"MIDI channel 0-15",	(void *)1},
+ {"note",	(getter)Event_get_field,	(setter)Event_set_field,	"note of note events, same as param",	(void *)2},
+ {"param",	(getter)Event_get_field,	(setter)Event_set_field,	"controller number, or note of note events",	(void *)2},
+ {"value",	(getter)Event_get_field,	(setter)Event_set_field,	"velocity of note events, else the control value",	(void *)3},
+ {"time",	(getter)Event_get_time,	(setter)Event_set_time,	"time stamp (seconds, nanoseconds)",	NULL},
+ {"source",	(getter)Event_get_addr,	(setter)Event_set_addr,	"(client, port) sent from",	(void *)offsetof(snd_seq_event_t, source)},
+ {"dest",	(getter)Event_get_addr,	(setter)Event_set_addr,	"(client, port) sent to",	(void *)offsetof(snd_seq_event_t, dest)},
+	{NULL}		/* sentinel */
+};
+
+static PyBufferProcs Event_as_buffer = {
+	.bf_getbuffer = (getbufferproc)Event_getbuffer,
+};
+
+static char Event__doc__[] =
+"Event( type=0, channel=0, param=0, value=0 ) --> Event.\n\n"
+"An ALSA sequencer event, for immediate execution.  The arguments are as\n"
+"in inmidi(), param is the note of note events and value the velocity.\n"
+"inevent() returns these, and output(), output_many() take them.\n\n"
+"The raw snd_seq_event_t (EVENT_SIZE bytes) is shared with the buffer\n"
+"protocol, so memoryview(event) reads and writes it with no copy.\n"
+"inevents() hands a batch of them over the same way, in one buffer.";
+
+#if PY_MAJOR_VERSION >= 3
+#define EVENT_TPFLAGS Py_TPFLAGS_DEFAULT
+#else
+#define EVENT_TPFLAGS (Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_NEWBUFFER)
+#endif
+
+static PyTypeObject Event_Type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	.tp_name = "alsaseq.Event",
+	.tp_basicsize = sizeof(EventObject),
+	.tp_repr = (reprfunc)Event_repr,
+	.tp_as_buffer = &Event_as_buffer,
+	.tp_flags = EVENT_TPFLAGS,
+	.tp_doc = Event__doc__,
+	.tp_getset = Event_getset,
+	.tp_init = (initproc)Event_init,
+	.tp_new = PyType_GenericNew,
+};
+
+//-------------------------------------------------
+// In-C routing table, see routes().  Events that match a rule are
+// handled right in the input path, and never get up to python.
+static int
+route_slot(int type)
+{
+  switch( type ) {
+  case SND_SEQ_EVENT_NOTEON:     return 0;
+  case SND_SEQ_EVENT_NOTEOFF:    return 1;
+  case SND_SEQ_EVENT_KEYPRESS:   return 2;
+  case SND_SEQ_EVENT_CONTROLLER: return 3;
+  case SND_SEQ_EVENT_PGMCHANGE:  return 4;
+  case SND_SEQ_EVENT_CHANPRESS:  return 5;
+  case SND_SEQ_EVENT_PITCHBEND:  return 6;
+  }
+  return -1;
+}
+
+//-------------------------------------------------
+// run filter() rules on a rx event.  Returns 1, and counts it, if it
+// should be dropped.  GIL held, filter() swaps rules with it held.
+static int
+rx_filtered(ClientObject *self, const snd_seq_event_t *ev)
+{
+  int m = self->filter_mask[ev->type], i;
+
+  if ( m & FILTER_SOURCE ) {
+    for ( i=0; i < self->nfilter_src; i++ ) {
+      filter_src_t *f = &self->filter_src[i];
+      if ( (f->type < 0 || f->type == ev->type) &&
+           (f->client < 0 || f->client == ev->source.client) &&
+           (f->port < 0 || f->port == ev->source.port) ) {
+        m |= FILTER_ANY;
+        break;
+      }
+    }
+  }
+  if ( m & FILTER_ANY ) {
+    self->filtered[ev->type]++;
+    return 1;
+  }
+  return 0;
+}
+
+//-------------------------------------------------
+// run the routing table on a rx event.  Returns 1 if a rule took care of
+// it, 0 if python should get it.
+static int
+rx_routed(ClientObject *self, const snd_seq_event_t *ev)
+{
+  int slot, ch, param, i;
+  int rec[INMIDI_FIELDS];
+  route_table_t *t;
+  route_t *r;
+  snd_seq_event_t tx[1];
+
+  if ( ev->dest.port >= self->ninputports )
+      return 0;
+  t = &self->route_tables[ev->dest.port];
+  if ( t->nroutes == 0 || (slot = route_slot(ev->type)) < 0 )
+      return 0;
+  rx_record(ev, rec);
+  ch = rec[1] & 0x0f;
+  param = (rec[2] >= 0 && rec[2] < ROUTE_ANY_PARAM) ? rec[2] : ROUTE_ANY_PARAM;
+  // most specific rule wins
+  i = t->index[slot][ch][param];
+  if ( i == 0 ) i = t->index[slot][ch][ROUTE_ANY_PARAM];
+  if ( i == 0 ) i = t->index[slot][ROUTE_ANY_CH][param];
+  if ( i == 0 ) i = t->index[slot][ROUTE_ANY_CH][ROUTE_ANY_PARAM];
+  if ( i == 0 )
+      return 0;
+  r = &t->routes[i - 1];
+  if ( r->tx_channel >= 0 )
+      ch = r->tx_channel;
+
+  switch( r->action ) {
+  case ROUTE_DROP:
+      break;
+  case ROUTE_PASS:
+  case ROUTE_CHANNEL:
+      tx[0] = *ev;
+      if ( r->action == ROUTE_CHANNEL )
+          tx[0].data.note.channel = ch; // same spot for control.channel
+      snd_seq_ev_set_source(&tx[0], t->tx_port >= 0 ? t->tx_port
+                                                    : self->firstoutputport);
+      tx_prepare(self, &tx[0]);
+      tx_direct(self, &tx[0]);
+      break;
+  case ROUTE_CC:
+      tx_cc(self, &tx[0], t->tx_port, ch, r->arg[0], rec[3]);
+      tx_direct(self, &tx[0]);
+      break;
+  case ROUTE_NRPN:
+      if ( r->arg[1] >= 0 )
+          t->nrpn_lsb = r->arg[1];
+      tx_nrpn(self, t->tx_port, ch, r->arg[0], t->nrpn_lsb, r->arg[2], rec[3]);
+      break;
+  default: // ROUTE_PYTHON
+      return 0;
+  }
+  return 1;
+}
+
+//-------------------------------------------------
+// wait for and read one event, without the GIL(or in_lock while it
+// waits), and keep a copy in the ring.  Returns the copy, or NULL with
+// exception set.  Events the routing table handles are skipped, if
+// they were all there was NULL is returned with no exception.
+static snd_seq_event_t *
+rx_input(ClientObject *self)
+{
+  snd_seq_event_t *ev, *copy;
+  int res;
+
+  seq_lock(self->in_lock);
+  for (;;) {
+    Py_BEGIN_ALLOW_THREADS
+    res = rx_read(self, &ev);
+    Py_END_ALLOW_THREADS
+    if ( res == -EAGAIN ) {
+      // wait without in_lock, so stats() and the rest don't wait with us
+      PyThread_release_lock(self->in_lock);
+      Py_BEGIN_ALLOW_THREADS
+      res = seq_poll(self, POLLIN);
+      Py_END_ALLOW_THREADS
+      seq_lock(self->in_lock);
+      if ( res >= 0 )
+        continue;
+    }
+    if (res < 0) {
+      PyThread_release_lock(self->in_lock);
+      PyErr_SetString(PyExc_IOError, snd_strerror(res));
+      return NULL;
+    }
+    if ( rx_filtered(self, ev) )
+      continue; // as if it never came, keep waiting
+    if ( !rx_routed(self, ev) ) {
+      copy = rx_store(self, ev); // ev is only good until the next read
+      PyThread_release_lock(self->in_lock);
+      return copy;
+    }
+    if ( rx_pending(self) <= 0 )
+      break;
+  }
+  PyThread_release_lock(self->in_lock);
+  return NULL;
+}
+
+//-------------------------------------------------
+// keep an event read ahead by wait() for the next read.  Variable length
+// data is copied, ev only points into the libasound buffer.
+static int
+rx_stash(ClientObject *self, const snd_seq_event_t *ev)
+{
+  self->stash = *ev;
+  if ( snd_seq_ev_is_variable( ev ) ) {
+    if ( (int)ev->data.ext.len > self->stash_cap ) {
+      unsigned char *bigger = self->stash_data;
+      PyMem_Resize( bigger, unsigned char, ev->data.ext.len );
+      if ( bigger == NULL ) {
+        PyErr_NoMemory();
+        return -1;
+      }
+      self->stash_data = bigger;
+      self->stash_cap = ev->data.ext.len;
+    }
+    memcpy( self->stash_data, ev->data.ext.ptr, ev->data.ext.len );
+    self->stash.data.ext.ptr = self->stash_data;
+  }
+  self->stashed = 1;
+  return 0;
+}
+
+//-------------------------------------------------
+// for wait(), read past what is there for filter() and routes(), so
+// those never wake python.  Returns 1 with an event for python stashed,
+// 0 if there is none, -1 with exception set.
+static int
+rx_wanted(ClientObject *self)
+{
+  snd_seq_event_t *ev;
+  int res = 0;
+
+  if ( self->stashed )
+    return 1;
+  seq_lock(self->in_lock);
+  while ( rx_read(self, &ev) >= 0 ) {
+    if ( rx_filtered(self, ev) || rx_routed(self, ev) )
+      continue;
+    res = rx_stash(self, ev) < 0 ? -1 : 1;
+    break;
+  }
+  PyThread_release_lock(self->in_lock);
+  return res;
+}
+
+//-------------------------------------------------
+// find a ring event for outlast(), index >= 0 is into last inmidi_many()
+// batch, index < 0 counts back from newest(-1 is last rx).
+static snd_seq_event_t *
+rx_lookup(ClientObject *self, int index)
+{
+  unsigned int avail = self->rx_head < RX_RING ? self->rx_head : RX_RING;
+
+  if (index < 0) {
+    if ((unsigned int)-index > avail)
+      return NULL;
+    return &self->rx_events[(self->rx_head + index) & (RX_RING - 1)];
+  }
+  if ((unsigned int)index >= self->rx_head - self->rx_batch)
+    return NULL;
+  return &self->rx_events[(self->rx_batch + index) & (RX_RING - 1)];
+}
+
+//-------------------------------------------------
+// open the sequencer and make the ports, for Client() and client().
+static int
+Client_init(ClientObject *self, PyObject *args, PyObject *kwds)
 {
+  static char *kwlist[] = { "name", "ninputports", "noutputports", "createqueue",
+                            "pool", "inpool", "inbuf", "outbuf", NULL };
   const char * client_name;
+  int ninputports, noutputports, createqueue;
+  int pool = 0, inpool = 0, inbuf = 0, outbuf = 0;
+  int portid, n;
 
-  if (!PyArg_ParseTuple(args, "siii", &client_name, &ninputports, &noutputports, &createqueue ) )
-		return NULL;
+  if (!PyArg_ParseTupleAndKeywords(args, kwds, "siii|iiii", kwlist, &client_name,
+            &ninputports, &noutputports, &createqueue, &pool, &inpool, &inbuf, &outbuf ) )
+		return -1;
 
   if ( ninputports > maximum_nports || noutputports > maximum_nports ) {
-    printf( "Only %d ports of each are allowed.\n", maximum_nports );
-    exit( 1 );
+    PyErr_Format( PyExc_ValueError, "Only %d ports of each are allowed.", maximum_nports );
+    return -1;
     }
+  if ( self->seq_handle != NULL ) {
+    PyErr_SetString( PyExc_RuntimeError, "client already open" );
+    return -1;
+  }
 
-  int portid, n;
+  if ( self->in_lock == NULL )
+    self->in_lock = PyThread_allocate_lock();
+  if ( self->out_lock == NULL )
+    self->out_lock = PyThread_allocate_lock();
+  if ( self->in_lock == NULL || self->out_lock == NULL ) {
+    PyErr_NoMemory();
+    return -1;
+  }
+  if ( self->rx_coder == NULL && snd_midi_event_new( MIDI_CODER_BUF, &self->rx_coder ) < 0 ) {
+    self->rx_coder = NULL;
+    PyErr_NoMemory();
+    return -1;
+  }
+  snd_midi_event_no_status( self->rx_coder, 1 ); // status byte on every message
 
-  if (snd_seq_open(&seq_handle, "default", SND_SEQ_OPEN_DUPLEX, 0) < 0) {
-    fprintf(stderr, "Error creating ALSA client.\n");
-    exit(1);
+  // nonblocking, we wait in seq_poll() so blocked output can be counted
+  if (snd_seq_open(&self->seq_handle, "default", SND_SEQ_OPEN_DUPLEX, SND_SEQ_NONBLOCK) < 0) {
+    self->seq_handle = NULL;
+    PyErr_SetString( PyExc_IOError, "Error creating ALSA client." );
+    return -1;
   }
-  snd_seq_set_client_name(seq_handle, client_name );
+  snd_seq_set_client_name(self->seq_handle, client_name );
+  if ( (pool > 0 && snd_seq_set_client_pool_output( self->seq_handle, pool ) < 0) ||
+       (inpool > 0 && snd_seq_set_client_pool_input( self->seq_handle, inpool ) < 0) ||
+       (inbuf > 0 && snd_seq_set_input_buffer_size( self->seq_handle, inbuf ) < 0) ||
+       (outbuf > 0 && snd_seq_set_output_buffer_size( self->seq_handle, outbuf ) < 0) ) {
+    PyErr_SetString( PyExc_IOError, "Error setting pool or buffer size." );
+    goto fail;
+  }
+  self->ninputports = ninputports;
+  self->noutputports = noutputports;
+  self->createqueue = createqueue;
 
-  if ( createqueue )
-      queue_id = snd_seq_alloc_queue(seq_handle);
+  if ( self->createqueue )
+      self->queue_id = snd_seq_alloc_queue(self->seq_handle);
   else
-      queue_id = SND_SEQ_QUEUE_DIRECT;
+      self->queue_id = SND_SEQ_QUEUE_DIRECT;
 
   //  #                                        SND_SEQ_PORT_TYPE_APPLICATION |
   //  #                                        SND_SEQ_PORT_TYPE_MIDI_GENERIC);
-  for ( n=0; n < ninputports; n++ ) {
-    if (( portid = snd_seq_create_simple_port(seq_handle, "Input port",
+  for ( n=0; n < self->ninputports; n++ ) {
+    if (( portid = snd_seq_create_simple_port(self->seq_handle, "Input port",
             SND_SEQ_PORT_CAP_WRITE|SND_SEQ_PORT_CAP_SUBS_WRITE,
             SND_SEQ_PORT_TYPE_APPLICATION)) < 0) {
-    fprintf(stderr, "Error creating input port %d.\n", n );
-    exit(1);
+      PyErr_Format( PyExc_IOError, "Error creating input port %d.", n );
+      goto fail;
     }
-    if( createqueue ) {
+    if( self->createqueue ) {
       /* set timestamp info of port  */
       snd_seq_port_info_t *pinfo;
       snd_seq_port_info_alloca(&pinfo);
-      snd_seq_get_port_info( seq_handle, portid, pinfo );
+      snd_seq_get_port_info( self->seq_handle, portid, pinfo );
       snd_seq_port_info_set_timestamping(pinfo, 1);
-      snd_seq_port_info_set_timestamp_queue(pinfo, queue_id );
+      snd_seq_port_info_set_timestamp_queue(pinfo, self->queue_id );
       snd_seq_port_info_set_timestamp_real( pinfo, 1 );
-      snd_seq_set_port_info( seq_handle, portid, pinfo );
+      snd_seq_set_port_info( self->seq_handle, portid, pinfo );
     }
   }
 
-  for ( n=0; n < noutputports; n++ ) {
-    if (( portid = snd_seq_create_simple_port(seq_handle, "Output port",
+  for ( n=0; n < self->noutputports; n++ ) {
+    if (( portid = snd_seq_create_simple_port(self->seq_handle, "Output port",
             SND_SEQ_PORT_CAP_READ|SND_SEQ_PORT_CAP_SUBS_READ,
             SND_SEQ_PORT_TYPE_APPLICATION)) < 0) {
-      fprintf(stderr, "Error creating output port %d.\n", n );
-      exit(1);
+      PyErr_Format( PyExc_IOError, "Error creating output port %d.", n );
+      goto fail;
     }
   }
-    firstoutputport = ninputports;
-    lastoutputport  = noutputports + ninputports - 1;
+    memset( self->tx_nrpn, 0xff, sizeof(self->tx_nrpn) ); // all -1
+    self->firstoutputport = self->ninputports;
+    self->lastoutputport  = self->noutputports + self->ninputports - 1;
+    return 0;
+
+fail:
+    snd_seq_close( self->seq_handle );
+    self->seq_handle = NULL;
+    return -1;
+}
+
+static void
+Client_dealloc(ClientObject *self)
+{
+  if ( self->seq_handle != NULL )
+    snd_seq_close( self->seq_handle );
+  if ( self->in_lock != NULL )
+    PyThread_free_lock( self->in_lock );
+  if ( self->out_lock != NULL )
+    PyThread_free_lock( self->out_lock );
+  if ( self->rx_coder != NULL )
+    snd_midi_event_free( self->rx_coder );
+  PyMem_Del( self->stash_data );
+  Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+//-------------------------------------------------
+// client() makes the client the module level functions use.
+static PyObject *
+alsaseq_client(PyObject *self /* Not used */, PyObject *args, PyObject *kwds)
+{
+  PyObject *c = PyObject_Call( (PyObject *)&Client_Type, args, kwds );
+
+  if ( c == NULL )
+    return NULL;
+  Py_XDECREF( default_client );
+  default_client = (ClientObject *)c;
+  Py_INCREF( c );
+  return c;
+}
 
-    Py_INCREF(Py_None);
-    return Py_None;
+// the module level functions just pass on to the client() client.
+#define DEFAULT_CLIENT(name) \
+static PyObject * \
+alsaseq_default_##name(PyObject *self /* Not used */, PyObject *args) \
+{ \
+  if ( default_client == NULL ) { \
+    PyErr_SetString( PyExc_RuntimeError, "call client() first" ); \
+    return NULL; \
+  } \
+  return alsaseq_##name( default_client, args ); \
 }
 
 //------------------------------------------------------------
@@ -119,7 +1041,7 @@ static char alsaseq_list__doc__[] =
 "  returns: [(client_id, port_id, client_name, port_name),]\n";
 
 static PyObject *
-alsaseq_list(PyObject *self /* Not used */, PyObject *args)
+alsaseq_list(ClientObject *self, PyObject *args)
 {
  int outflag = 0;
  if (!PyArg_ParseTuple(args, "i", &outflag))
@@ -134,7 +1056,7 @@ alsaseq_list(PyObject *self /* Not used */, PyObject *args)
   snd_seq_client_info_set_client(client_info, -1);
 
   PyObject *pyList = PyList_New(0);
-  while (snd_seq_query_next_client(seq_handle, client_info) == 0) {
+  while (snd_seq_query_next_client(self->seq_handle, client_info) == 0) {
         int client_id = snd_seq_client_info_get_client(client_info);
         //std::string client_name = snd_seq_client_info_get_name(client_info);
         const char *client_name = snd_seq_client_info_get_name(client_info);
@@ -144,7 +1066,7 @@ alsaseq_list(PyObject *self /* Not used */, PyObject *args)
         snd_seq_port_info_set_client(port_info, client_id);
         snd_seq_port_info_set_port(port_info, -1);
 
-        while (snd_seq_query_next_port(seq_handle, port_info) == 0) {
+        while (snd_seq_query_next_port(self->seq_handle, port_info) == 0) {
             unsigned int capability =
                             snd_seq_port_info_get_capability(port_info);
 
@@ -169,13 +1091,17 @@ static char alsaseq_start__doc__[] =
 ;
 
 static PyObject *
-alsaseq_start(PyObject *self /* Not used */, PyObject *args)
+alsaseq_start(ClientObject *self, PyObject *args)
 {
 	if (!PyArg_ParseTuple(args, "" ))
 		return NULL;
 
-        snd_seq_start_queue(seq_handle, queue_id, NULL);
-        snd_seq_drain_output(seq_handle);
+        seq_lock(self->out_lock);
+        Py_BEGIN_ALLOW_THREADS
+        snd_seq_start_queue(self->seq_handle, self->queue_id, NULL);
+        tx_drain(self);
+        PyThread_release_lock(self->out_lock);
+        Py_END_ALLOW_THREADS
 
 	Py_INCREF(Py_None);
 	return Py_None;
@@ -187,13 +1113,17 @@ static char alsaseq_stop__doc__[] =
 ;
 
 static PyObject *
-alsaseq_stop(PyObject *self /* Not used */, PyObject *args)
+alsaseq_stop(ClientObject *self, PyObject *args)
 {
 	if (!PyArg_ParseTuple(args, "" ))
 		return NULL;
 
-        snd_seq_stop_queue(seq_handle, queue_id, NULL);
-        snd_seq_drain_output(seq_handle);
+        seq_lock(self->out_lock);
+        Py_BEGIN_ALLOW_THREADS
+        snd_seq_stop_queue(self->seq_handle, self->queue_id, NULL);
+        tx_drain(self);
+        PyThread_release_lock(self->out_lock);
+        Py_END_ALLOW_THREADS
 
 	Py_INCREF(Py_None);
 	return Py_None;
@@ -208,7 +1138,7 @@ static char alsaseq_status__doc__[] =
 "If the client does not have a queue the value ( 0, ( 0, 0 ), 0 ) is returned.";
 
 static PyObject *
-alsaseq_status(PyObject *self /* Not used */, PyObject *args)
+alsaseq_status(ClientObject *self, PyObject *args)
 {
         snd_seq_queue_status_t *queue_status;
         int running, events;
@@ -217,7 +1147,7 @@ alsaseq_status(PyObject *self /* Not used */, PyObject *args)
 		return NULL;
 
         snd_seq_queue_status_malloc( &queue_status );
-        snd_seq_get_queue_status( seq_handle, queue_id, queue_status );
+        snd_seq_get_queue_status( self->seq_handle, self->queue_id, queue_status );
         current_time = snd_seq_queue_status_get_real_time( queue_status );
         running = snd_seq_queue_status_get_status( queue_status );
         events = snd_seq_queue_status_get_events( queue_status );
@@ -226,9 +1156,33 @@ alsaseq_status(PyObject *self /* Not used */, PyObject *args)
 	return Py_BuildValue( "(i(ii),i)", running, current_time->tv_sec, current_time->tv_nsec, events );
 }
 
+//-------------------------------------------------
+static char alsaseq_queuetime__doc__[] =
+"queuetime() --> ( sec, nanoseconds ).\n\n"
+"Current real time of the queue, to compare with inmidi( stamp ) times.\n"
+"Cheaper than status()[1].  ( 0, 0 ) if the client has no queue.";
+
+static PyObject *
+alsaseq_queuetime(ClientObject *self, PyObject *args)
+{
+        snd_seq_queue_status_t *queue_status;
+        const snd_seq_real_time_t *current_time;
+
+	if (!PyArg_ParseTuple(args, "" ))
+		return NULL;
+        if ( !self->createqueue )
+            return Py_BuildValue( "(ii)", 0, 0 );
+
+        snd_seq_queue_status_alloca( &queue_status );
+        snd_seq_get_queue_status( self->seq_handle, self->queue_id, queue_status );
+        current_time = snd_seq_queue_status_get_real_time( queue_status );
+	return Py_BuildValue( "(ii)", current_time->tv_sec, current_time->tv_nsec );
+}
+
 //-------------------------------------------------
 static char alsaseq_output__doc__[] =
 "output( event ) --> None.\n\n"
+"event is an alsaseq.Event, or a tuple like input() returns.\n"
 "Send event to output port, scheduled if a queue exists,\n"
 "immediately if no queue was created in the client.\n\n"
 "If only one port exists, all events are sent to that port.\n"
@@ -242,11 +1196,18 @@ static char alsaseq_output__doc__[] =
 "Use status()[2] to know how many events are scheduled in the queue.";
 
 static PyObject *
-alsaseq_output(PyObject *self, PyObject *args)
+alsaseq_output(ClientObject *self, PyObject *args)
 {
   snd_seq_event_t ev;
   static PyObject * data;
-        
+
+        if ( PyTuple_GET_SIZE( args ) == 1 && Event_Check( PyTuple_GET_ITEM( args, 0 ) ) ) {
+            ev = ((EventObject *)PyTuple_GET_ITEM( args, 0 ))->ev;
+            tx_prepare(self,  &ev );
+            tx_direct(self,  &ev );
+            Py_INCREF(Py_None);
+            return Py_None;
+        }
 	if (!PyArg_ParseTuple(args, "(bbbb(ii)(bb)(bb)O)", &ev.type, &ev.flags, &ev.tag, &ev.queue, &ev.time.time.tv_sec, &ev.time.time.tv_nsec, &ev.source.client, &ev.source.port, &ev.dest.client, &ev.dest.port, &data ))
 		return NULL;
         /* printf ( "event.type: %d\n", ev.type ); */
@@ -278,17 +1239,87 @@ alsaseq_output(PyObject *self, PyObject *args)
             return NULL;
             break;
         }
-        /* If not a direct event, use the queue */
-        if ( ev.queue != SND_SEQ_QUEUE_DIRECT )
-            ev.queue = queue_id;
-        /* Modify source port if out of bounds */
-        if ( ev.source.port < firstoutputport ) 
-           snd_seq_ev_set_source(&ev, firstoutputport );
-        else if ( ev.source.port > lastoutputport )
-           snd_seq_ev_set_source(&ev, lastoutputport );
-        /* Use subscribed ports, except if ECHO event */
-        if ( ev.type != SND_SEQ_EVENT_ECHO ) snd_seq_ev_set_subs(&ev);
-        snd_seq_event_output_direct( seq_handle, &ev );
+        tx_prepare(self,  &ev );
+        tx_direct(self,  &ev );
+
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+//-------------------------------------------------
+static char alsaseq_output_many__doc__[] =
+"output_many( events ) --> None.\n\n"
+"Send several events together for immediate execution, they are queued\n"
+"up and go out with a single drain, so a burst(like a NRPN) arrives\n"
+"as one.  events is a sequence of inmidi() style tuples:\n"
+"    (type, channel, note/param, velocity/value)\n"
+"or alsaseq.Event objects, or a buffer packed like inmidi_many()\n"
+"returns(INMIDI_FIELDS native ints per event).";
+
+static PyObject *
+alsaseq_output_many(ClientObject *self, PyObject *args)
+{
+  PyObject *events, *fast;
+  snd_seq_event_t *evs;
+  int rec[INMIDI_FIELDS];
+  int n, nevents;
+  Py_buffer view;
+
+        if (!PyArg_ParseTuple(args, "O", &events ))
+            return NULL;
+
+        if ( PyObject_CheckBuffer( events ) && !Event_Check( events ) ) {
+            const int *recs;
+            if ( PyObject_GetBuffer( events, &view, PyBUF_SIMPLE ) < 0 )
+                return NULL;
+            if ( view.len % sizeof(rec) ) {
+                PyBuffer_Release( &view );
+                PyErr_SetString( PyExc_ValueError, "buffer is not whole INMIDI_FIELDS records" );
+                return NULL;
+            }
+            nevents = view.len / sizeof(rec);
+            evs = PyMem_New( snd_seq_event_t, nevents );
+            if ( evs == NULL ) {
+                PyBuffer_Release( &view );
+                return PyErr_NoMemory();
+            }
+            recs = (const int *)view.buf;
+            for ( n=0; n < nevents; n++ )
+                tx_record(self,  &evs[n], &recs[n * INMIDI_FIELDS] );
+            PyBuffer_Release( &view );
+        }
+        else {
+            fast = PySequence_Fast( events, "events must be a sequence or buffer" );
+            if ( fast == NULL )
+                return NULL;
+            nevents = PySequence_Fast_GET_SIZE( fast );
+            evs = PyMem_New( snd_seq_event_t, nevents );
+            if ( evs == NULL ) {
+                Py_DECREF( fast );
+                return PyErr_NoMemory();
+            }
+            for ( n=0; n < nevents; n++ ) {
+                PyObject *item = PySequence_Fast_GET_ITEM( fast, n );
+                if ( Event_Check( item ) ) {
+                    evs[n] = ((EventObject *)item)->ev;
+                    tx_prepare(self,  &evs[n] );
+                    continue;
+                }
+                if (!PyArg_ParseTuple( item,
+                       "iiii;event should be (type, channel, param, value)",
+                       &rec[0], &rec[1], &rec[2], &rec[3] )) {
+                    PyMem_Del( evs );
+                    Py_DECREF( fast );
+                    return NULL;
+                }
+                tx_record(self,  &evs[n], rec );
+            }
+            Py_DECREF( fast );
+        }
+
+        if ( nevents > 0 )
+            tx_burst(self,  evs, nevents );
+        PyMem_Del( evs );
 
 	Py_INCREF(Py_None);
 	return Py_None;
@@ -296,25 +1327,39 @@ alsaseq_output(PyObject *self, PyObject *args)
 
 //-------------------------------------------------
 static char alsaseq_outlast__doc__[] =
-"outlast( (b0,b1,b2,b3) ) --> None.\n\n"
+"outlast( (b0,b1,b2,b3) [, index[, port]] ) --> None.\n\n"
 "Send last rx event to output port, scheduled if a queue exists,\n"
 "Allow modification of some basic MIDI parameters,\n"
 " b0 is  tx_channel(0-15) | (mod_cnt << 4) ; tx_channel ignored if mod_cnt < 1\n"
 " b1 is  data[0] (note) if mod_cnt >= 2\n"
 " b2 is  data[1] (velocity) if mod_cnt >= 3\n"
 " b3 is  data[2] if mod_cnt >= 4\n"
-"immediately if no queue was created in the client.\n\n";
+"immediately if no queue was created in the client.\n\n"
+"index picks another recent rx event: 0 and up is the position in the\n"
+"last inmidi_many() batch, -1(default) is the newest, -2 the one before.\n"
+"port is the output port it goes from, -1(default) the first.\n";
 static PyObject *
-alsaseq_outlast(PyObject *self, PyObject *args)
+alsaseq_outlast(ClientObject *self, PyObject *args)
 {
-  snd_seq_event_t *ev = &rx_events[0]; // ptr to last one rx
+  snd_seq_event_t *ev, tx;
+  int index = -1, port = -1;
   //static PyObject * data;
   static unsigned char bdata[4];
 
         // quick and dirty allow a few modification parameters.        
-        if (!PyArg_ParseTuple(args, "(bbbb)",
-               &bdata[0], &bdata[1], &bdata[2], &bdata[3] ))
+        if (!PyArg_ParseTuple(args, "(bbbb)|ii",
+               &bdata[0], &bdata[1], &bdata[2], &bdata[3], &index, &port ))
            return NULL;
+        ev = rx_lookup(self, index);
+        if (ev == NULL) {
+            PyErr_SetString(PyExc_IndexError, "no such rx event");
+            return NULL;
+        }
+        if ( snd_seq_ev_is_variable( ev ) ) {
+            // the data went with the alsa input buffer
+            PyErr_SetString(PyExc_ValueError, "can't resend sysex, use outsysex()");
+            return NULL;
+        }
         switch (bdata[0] >> 4) {
             case 4:
                 ev->data.control.unused[2] = bdata[3];
@@ -331,20 +1376,11 @@ alsaseq_outlast(PyObject *self, PyObject *args)
             break;
         }
 
-        /* If not a direct event, use the queue */
-        if ( ev->queue != SND_SEQ_QUEUE_DIRECT )
-            ev->queue = queue_id;
-        /* Modify source port if out of bounds */
-        if ( ev->source.port < firstoutputport ) 
-           snd_seq_ev_set_source(ev, firstoutputport );
-        else if ( ev->source.port > lastoutputport )
-           snd_seq_ev_set_source(ev, lastoutputport );
-        /* Use subscribed ports, except if ECHO event */
-        if ( ev->type != SND_SEQ_EVENT_ECHO ) snd_seq_ev_set_subs(ev);
-        // kb - above sets dest.client(SUBSCRIBERS), .port to UNKNOWN..
-        // not sure if that is needed, maybe it's already set on rx.
-
-        snd_seq_event_output_direct( seq_handle, ev ); // send it.
+        tx = *ev; // ring copy may change once we let go of the GIL
+        // not the port it came in on, tx_prepare() would only clamp that
+        snd_seq_ev_set_source( &tx, port >= 0 ? port : self->firstoutputport );
+        tx_prepare(self,  &tx );
+        tx_direct(self,  &tx ); // send it.
 
 	Py_INCREF(Py_None);
 	return Py_None;
@@ -356,13 +1392,13 @@ static char alsaseq_id__doc__[] =
 ;
 
 static PyObject *
-alsaseq_id(PyObject *self, PyObject *args)
+alsaseq_id(ClientObject *self, PyObject *args)
 {
   int res = 0;
         
 	if (!PyArg_ParseTuple(args, "" ))
 		return NULL;
-        res = snd_seq_client_id( seq_handle );
+        res = snd_seq_client_id( self->seq_handle );
 
         return PyInt_FromLong( res );
 }
@@ -373,9 +1409,13 @@ static char alsaseq_syncoutput__doc__[] =
 ;
 
 static PyObject *
-alsaseq_syncoutput(PyObject *self, PyObject *args)
+alsaseq_syncoutput(ClientObject *self, PyObject *args)
 {
-        snd_seq_sync_output_queue( seq_handle );
+        seq_lock(self->out_lock);
+        Py_BEGIN_ALLOW_THREADS
+        snd_seq_sync_output_queue( self->seq_handle );
+        PyThread_release_lock(self->out_lock);
+        Py_END_ALLOW_THREADS
 
 	Py_INCREF(Py_None);
 	return Py_None;
@@ -390,13 +1430,13 @@ static char alsaseq_connectto__doc__[] =
 "connected to it using this function.";;
 
 static PyObject *
-alsaseq_connectto(PyObject *self, PyObject *args)
+alsaseq_connectto(ClientObject *self, PyObject *args)
 {
   int myport, dest_client, dest_port;
         
 	if (!PyArg_ParseTuple(args, "iii", &myport, &dest_client, &dest_port ))
 		return NULL;
-        snd_seq_connect_to( seq_handle, myport, dest_client, dest_port);
+        snd_seq_connect_to( self->seq_handle, myport, dest_client, dest_port);
 
 	Py_INCREF(Py_None);
 	return Py_None;
@@ -412,45 +1452,188 @@ static char alsaseq_connectfrom__doc__[] =
 "Events from each client can be distinguised by their source field.";
 
 static PyObject *
-alsaseq_connectfrom(PyObject *self, PyObject *args)
+alsaseq_connectfrom(ClientObject *self, PyObject *args)
 {
   int myport, dest_client, dest_port;
         
 	if (!PyArg_ParseTuple(args, "iii", &myport, &dest_client, &dest_port ))
 		return NULL;
-        snd_seq_connect_from( seq_handle, myport, dest_client, dest_port);
+        snd_seq_connect_from( self->seq_handle, myport, dest_client, dest_port);
 
 	Py_INCREF(Py_None);
 	return Py_None;
 }
 
-
 //-------------------------------------------------
-static char alsaseq_input__doc__[] =
-"input() --> event.\n\nWait for an ALSA event in any of the input ports and return it.\n\n"
-"ALSA events are returned as a tuple with 8 elements:\n"
-"    (type, flags, tag, queue, time stamp, source, destination, data)\n\n"
+static char alsaseq_announce__doc__[] =
+"announce( inputport=0 ) --> None.\n\n"
+"Connect the System Announce port(0:1) to inputport, so clients and\n"
+"ports coming and going show up as SND_SEQ_EVENT_CLIENT_* and\n"
+"SND_SEQ_EVENT_PORT_* events, see inmidi().";
+
+static PyObject *
+alsaseq_announce(ClientObject *self, PyObject *args)
+{
+  int myport = 0;
+
+	if (!PyArg_ParseTuple(args, "|i", &myport ))
+		return NULL;
+        if ( snd_seq_connect_from( self->seq_handle, myport, SND_SEQ_CLIENT_SYSTEM,
+                                   SND_SEQ_PORT_SYSTEM_ANNOUNCE ) < 0 ) {
+            PyErr_SetString( PyExc_IOError, "can't connect from System Announce" );
+            return NULL;
+        }
+
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+//-------------------------------------------------
+// [(client, port),] subscribed to addr.  SND_SEQ_QUERY_SUBS_READ for the
+// ports it sends to, SND_SEQ_QUERY_SUBS_WRITE for those sending to it.
+static PyObject *
+port_subs(ClientObject *self, const snd_seq_addr_t *addr, snd_seq_query_subs_type_t type)
+{
+  snd_seq_query_subscribe_t *subs;
+  PyObject *lst = PyList_New(0);
+
+  snd_seq_query_subscribe_alloca(&subs);
+  snd_seq_query_subscribe_set_root(subs, addr);
+  snd_seq_query_subscribe_set_type(subs, type);
+  snd_seq_query_subscribe_set_index(subs, 0);
+  while ( lst != NULL && snd_seq_query_port_subscribers( self->seq_handle, subs ) >= 0 ) {
+    const snd_seq_addr_t *a = snd_seq_query_subscribe_get_addr(subs);
+    PyObject *t = Py_BuildValue( "(ii)", a->client, a->port );
+    if ( t == NULL || PyList_Append( lst, t ) < 0 ) {
+      Py_XDECREF( t );
+      Py_CLEAR( lst );
+      break;
+    }
+    Py_DECREF( t );
+    snd_seq_query_subscribe_set_index(subs, snd_seq_query_subscribe_get_index(subs) + 1);
+  }
+  return lst;
+}
+
+// the ports()/portinfo() tuple for a port.
+static PyObject *
+port_tuple(ClientObject *self, snd_seq_client_info_t *client_info, snd_seq_port_info_t *port_info)
+{
+  const snd_seq_addr_t *addr = snd_seq_port_info_get_addr(port_info);
+
+  return Py_BuildValue( "(iissIINN)", addr->client, addr->port,
+            snd_seq_client_info_get_name(client_info),
+            snd_seq_port_info_get_name(port_info),
+            snd_seq_port_info_get_capability(port_info),
+            snd_seq_port_info_get_type(port_info),
+            port_subs( self, addr, SND_SEQ_QUERY_SUBS_READ ),
+            port_subs( self, addr, SND_SEQ_QUERY_SUBS_WRITE ) );
+}
+
+//-------------------------------------------------
+static char alsaseq_ports__doc__[] =
+"ports() --> list.\n\n"
+"List every alsa port, with all we know of it:\n"
+"  [(client_id, port_id, client_name, port_name, capability, type,\n"
+"    read_subs, write_subs),]\n"
+"capability is SND_SEQ_PORT_CAP_* bits, type SND_SEQ_PORT_TYPE_* bits.\n"
+"read_subs is [(client, port),] the port sends to, write_subs those\n"
+"sending to it.  Walks the whole sequencer, so keep the result, and\n"
+"use announce() events to keep it up to date.";
+
+static PyObject *
+alsaseq_ports(ClientObject *self, PyObject *args)
+{
+  snd_seq_client_info_t *client_info;
+  snd_seq_port_info_t *port_info;
+  PyObject *pyList, *pyobj;
+
+	if (!PyArg_ParseTuple(args, "" ))
+		return NULL;
+        snd_seq_client_info_alloca(&client_info);
+        snd_seq_port_info_alloca(&port_info);
+        snd_seq_client_info_set_client(client_info, -1);
+
+        pyList = PyList_New(0);
+        while ( pyList != NULL &&
+                snd_seq_query_next_client(self->seq_handle, client_info) == 0 ) {
+            snd_seq_port_info_set_client(port_info, snd_seq_client_info_get_client(client_info));
+            snd_seq_port_info_set_port(port_info, -1);
+            while ( snd_seq_query_next_port(self->seq_handle, port_info) == 0 ) {
+                pyobj = port_tuple( self, client_info, port_info );
+                if ( pyobj == NULL || PyList_Append( pyList, pyobj ) < 0 ) {
+                    Py_XDECREF( pyobj );
+                    Py_CLEAR( pyList );
+                    break;
+                }
+                Py_DECREF( pyobj );
+            }
+        }
+        return pyList;
+}
+
+//-------------------------------------------------
+static char alsaseq_portinfo__doc__[] =
+"portinfo( client, port ) --> tuple or None.\n\n"
+"Look up one port, as a ports() entry:\n"
+"  (client_id, port_id, client_name, port_name, capability, type,\n"
+"   read_subs, write_subs)\n"
+"None if the port is not there(any more).";
+
+static PyObject *
+alsaseq_portinfo(ClientObject *self, PyObject *args)
+{
+  int client_id, port_id;
+  snd_seq_client_info_t *client_info;
+  snd_seq_port_info_t *port_info;
+
+	if (!PyArg_ParseTuple(args, "ii", &client_id, &port_id ))
+		return NULL;
+        snd_seq_client_info_alloca(&client_info);
+        snd_seq_port_info_alloca(&port_info);
+        if ( snd_seq_get_any_client_info( self->seq_handle, client_id, client_info ) < 0 ||
+             snd_seq_get_any_port_info( self->seq_handle, client_id, port_id, port_info ) < 0 ) {
+            Py_INCREF(Py_None);
+            return Py_None;
+        }
+        return port_tuple( self, client_info, port_info );
+}
+
+
+//-------------------------------------------------
+static char alsaseq_input__doc__[] =
+"input() --> event.\n\nWait for an ALSA event in any of the input ports and return it.\n"
+"Other python threads keep running while we wait.\n"
+"None is returned if the events that came in were all handled by routes().\n\n"
+"ALSA events are returned as a tuple with 8 elements:\n"
+"    (type, flags, tag, queue, time stamp, source, destination, data)\n\n"
 "Some elements are also tuples:\n"
 "    time = (seconds, nanoseconds)\n"
 "    source, destination = (client, port)\n"
-"    data = ( varies depending on type )\n\n"
+"    data = ( varies depending on type )\n"
+"           ( bytes, ) of the data for a SYSEX.\n\n"
 "See DATA section below for event type constants.";
 
 static PyObject *
-alsaseq_input(PyObject *self, PyObject *args)
+alsaseq_input(ClientObject *self, PyObject *args)
 {
   snd_seq_event_t *ev;
         
 	if (!PyArg_ParseTuple(args, "" ))
 		return NULL;
-        snd_seq_event_input( seq_handle, &ev );
+        ev = rx_input(self); // copy kept for outlast()
+        if ( ev == NULL ) {
+            if ( PyErr_Occurred() )
+                return NULL;
+            Py_INCREF(Py_None); // all taken care of by routes()
+            return Py_None;
+        }
 
         switch( ev->type ) {
         case SND_SEQ_EVENT_NOTE:
         case SND_SEQ_EVENT_NOTEON:
         case SND_SEQ_EVENT_NOTEOFF:
         case SND_SEQ_EVENT_KEYPRESS:
-            rx_events[0] = *ev; // make copy, it's about 32 bytes roughly..
             return Py_BuildValue( "(bbbb(ii)(bb)(bb)(bbbbi))",
                   ev->type, ev->flags, ev->tag, ev->queue,
                   ev->time.time.tv_sec, ev->time.time.tv_nsec,
@@ -466,7 +1649,6 @@ alsaseq_input(PyObject *self, PyObject *args)
         case SND_SEQ_EVENT_PGMCHANGE:
         case SND_SEQ_EVENT_CHANPRESS:
         case SND_SEQ_EVENT_PITCHBEND:
-            rx_events[0] = *ev; // make copy, it's about 32 bytes roughly..
             return Py_BuildValue( "(bbbb(ii)(bb)(bb)(bbbbii))",
                   ev->type, ev->flags, ev->tag, ev->queue,
                   ev->time.time.tv_sec, ev->time.time.tv_nsec,
@@ -479,8 +1661,15 @@ alsaseq_input(PyObject *self, PyObject *args)
                   ev->data.control.value );
             break;
 
+        case SND_SEQ_EVENT_SYSEX:
+            return Py_BuildValue( "(bbbb(ii)(bb)(bb)(N))",
+                  ev->type, ev->flags, ev->tag, ev->queue,
+                  ev->time.time.tv_sec, ev->time.time.tv_nsec,
+                  ev->source.client, ev->source.port,
+                  ev->dest.client, ev->dest.port,
+                  PyBytes_FromStringAndSize( (char *)ev->data.ext.ptr, ev->data.ext.len ) );
+
         default:
-            rx_events[0] = *ev; // make copy, it's about 32 bytes roughly..
             return Py_BuildValue( "(bbbb(ii)(bb)(bb)(bbbbi))",
                   ev->type, ev->flags, ev->tag, ev->queue,
                   ev->time.time.tv_sec, ev->time.time.tv_nsec,
@@ -494,61 +1683,460 @@ alsaseq_input(PyObject *self, PyObject *args)
 
 }
 
+//-------------------------------------------------
+static char alsaseq_inevent__doc__[] =
+"inevent() --> Event.\n\n"
+"Wait for an ALSA event in any of the input ports and return it as\n"
+"an alsaseq.Event, one small object instead of the input() tuples.\n"
+"None is returned if the events that came in were all handled by routes().";
+
+static PyObject *
+alsaseq_inevent(ClientObject *self, PyObject *args)
+{
+  snd_seq_event_t *ev;
+
+	if (!PyArg_ParseTuple(args, "" ))
+		return NULL;
+        ev = rx_input(self); // copy kept for outlast()
+        if ( ev == NULL ) {
+            if ( PyErr_Occurred() )
+                return NULL;
+            Py_INCREF(Py_None); // all taken care of by routes()
+            return Py_None;
+        }
+        return Event_FromEvent( ev );
+}
+
+//-------------------------------------------------
+static char alsaseq_inevents__doc__[] =
+"inevents( [max] ) --> bytearray.\n\n"
+"Read all events pending, without waiting, as inmidi_many() does, and\n"
+"return them as raw snd_seq_event_t one after the other, EVENT_SIZE bytes\n"
+"each, up to max(default and limit 64, 0 for the limit).  One object for\n"
+"the batch, view it with memoryview or numpy.frombuffer() with a dtype\n"
+"of the struct, no copy and no object per event:\n"
+"    type u1, flags u1, tag u1, queue u1, time sec u4, nsec u4,\n"
+"    source client u1, port u1, dest client u1, port u1, then the data at\n"
+"    EVENT_DATA_OFFSET, note: channel, note, velocity u1, ..  control:\n"
+"    channel u1, 3 unused, param u4, value i4.\n"
+"Events handled by routes() are left out.  Sysex data isn't in it(its\n"
+"pointer is stale), use inbytes() for those.  Each event can be resent\n"
+"with outlast( mods, index ), index being its position in the batch.";
+
+static PyObject *
+alsaseq_inevents(ClientObject *self, PyObject *args)
+{
+  snd_seq_event_t *ev, evs[RX_RING];
+  int max = RX_RING, n = 0;
+
+        if (!PyArg_ParseTuple(args, "|i", &max ))
+            return NULL;
+        if ( max < 1 || max > RX_RING )
+            max = RX_RING;
+
+        seq_lock(self->in_lock);
+        self->rx_batch = self->rx_head;
+        if ( rx_pending(self) > 0 ) {
+            do {
+                if ( rx_read(self, &ev) < 0 )
+                    break;
+                if ( !rx_filtered(self, ev) && !rx_routed(self, ev) )
+                    evs[n++] = *rx_store(self, ev);
+            } while ( n < max && snd_seq_event_input_pending( self->seq_handle, 0 ) > 0 );
+        }
+        PyThread_release_lock(self->in_lock);
+
+        return PyByteArray_FromStringAndSize( (char *)evs, n * sizeof(evs[0]) );
+}
+
 //-------------------------------------------------
 static char alsaseq_inmidi__doc__[] =
 "input() --> event.\n\nWait for an ALSA event in any of the input ports and return it.\n\n"
 " ALSA events are returned as a tuple with 4 elements:\n"
 "    b0,b1,i3,i4 - type, channel, midi_data)...\n"
 "    where midi_data(i3,i4) are - note, velocity for NOTE type.\n"
-"      (i3,i4) are - param, value for CTRL type.\n\n";
+"      (i3,i4) are - param, value for CTRL type.\n"
+"    For CLIENT_* and PORT_* announce events(see announce()),\n"
+"      (b1,i3) are the client, port that started/exited/changed.\n"
+"      For PORT_(UN)SUBSCRIBED, (b1,i3) is the sender and i4 the\n"
+"      dest as client << 8 | port.\n"
+"    For SYSEX, i3 is the data length, see inbytes() for the data.\n\n"
+"inmidi( stamp=True ) adds the arrival time, seconds, nanoseconds on the\n"
+"queue.  Only stamped with createqueue = True in client(), and start().\n\n"
+"None is returned if the events that came in were all handled by routes().";
 
 static PyObject *
-alsaseq_inmidi(PyObject *self, PyObject *args)
+alsaseq_inmidi(ClientObject *self, PyObject *args)
 {
   snd_seq_event_t *ev;
+  int rec[INMIDI_FIELDS];
+  int stamp = 0;
   // this is a stripped down version of input() above, just info I need.
   // might be useful to return client src,dest info, but for now leave out.
         
-        if (!PyArg_ParseTuple(args, "" ))
+        if (!PyArg_ParseTuple(args, "|i", &stamp ))
             return NULL;
-        snd_seq_event_input( seq_handle, &ev );
+        ev = rx_input(self); // make copy, it's about 32 bytes roughly..
+        if ( ev == NULL ) {
+            if ( PyErr_Occurred() )
+                return NULL;
+            Py_INCREF(Py_None); // all taken care of by routes()
+            return Py_None;
+        }
 
-        switch( ev->type ) {
-        case SND_SEQ_EVENT_NOTE:
-        case SND_SEQ_EVENT_NOTEON:
-        case SND_SEQ_EVENT_NOTEOFF:
-        case SND_SEQ_EVENT_KEYPRESS:
-            rx_events[0] = *ev; // make copy
-            return Py_BuildValue( "(bbii)",
-                  ev->type,
-                  ev->data.note.channel,
-                  ev->data.note.note,
-                  ev->data.note.velocity);
-            break;
+        rx_record(ev, rec);
+        if ( stamp )
+            return Py_BuildValue( "(bbiiii)", rec[0], rec[1], rec[2], rec[3],
+                      ev->time.time.tv_sec, ev->time.time.tv_nsec );
+        return Py_BuildValue( "(bbii)", rec[0], rec[1], rec[2], rec[3] );
+}
 
-        case SND_SEQ_EVENT_CONTROLLER:
-        case SND_SEQ_EVENT_PGMCHANGE:
-        case SND_SEQ_EVENT_CHANPRESS:
-        case SND_SEQ_EVENT_PITCHBEND:
-            rx_events[0] = *ev; // make copy, it's about 32 bytes roughly..
-            return Py_BuildValue( "(bbii)",
-                  ev->type,
-                  ev->data.note.channel,
-                  ev->data.control.param,
-                  ev->data.control.value );
-            break;
+//-------------------------------------------------
+static char alsaseq_inmidi_many__doc__[] =
+"inmidi_many( [max[, stamp]] ) --> bytes.\n\n"
+"Read all events pending in the input ports with one call, without\n"
+"waiting.  Up to max(default and limit 64, 0 for the limit) events are\n"
+"returned packed\n"
+"in a bytes object of native ints, INMIDI_FIELDS per event:\n"
+"    type, channel, note/param, velocity/value\n"
+"same as the inmidi() tuple.  View it with array('i') or memoryview.\n"
+"Empty if nothing is pending.  Events handled by routes() are left out.\n"
+"With stamp true, each event is INMIDI_STAMPED_FIELDS ints, with the\n"
+"arrival time seconds, nanoseconds added as in inmidi( stamp ).\n"
+"Each event can be resent with\n"
+"outlast( mods, index ), index being its position in the batch.";
 
-        default:
-            rx_events[0] = *ev; // make copy, it's about 32 bytes roughly..
-            return Py_BuildValue( "(bbii)",
-                  ev->type,
-                  ev->data.note.channel,
-                  ev->data.control.param,
-                  ev->data.control.value );
+static PyObject *
+alsaseq_inmidi_many(ClientObject *self, PyObject *args)
+{
+  snd_seq_event_t *ev;
+  int recs[RX_RING * INMIDI_STAMPED_FIELDS];
+  int max = RX_RING, n = 0, stamp = 0, nf;
+
+        if (!PyArg_ParseTuple(args, "|ii", &max, &stamp ))
+            return NULL;
+        nf = stamp ? INMIDI_STAMPED_FIELDS : INMIDI_FIELDS;
+        if ( max < 1 || max > RX_RING )
+            max = RX_RING;
+
+        seq_lock(self->in_lock);
+        self->rx_batch = self->rx_head;
+        if ( rx_pending(self) > 0 ) {
+            do {
+                if ( rx_read(self, &ev) < 0 )
+                    break;
+                if ( !rx_filtered(self, ev) && !rx_routed(self, ev) ) {
+                    int *rec = &recs[n++ * nf];
+                    rx_record(rx_store(self, ev), rec);
+                    if ( stamp ) {
+                        rec[4] = ev->time.time.tv_sec;
+                        rec[5] = ev->time.time.tv_nsec;
+                    }
+                }
+            } while ( n < max && snd_seq_event_input_pending( self->seq_handle, 0 ) > 0 );
+        }
+        PyThread_release_lock(self->in_lock);
+
+        return PyBytes_FromStringAndSize( (char *)recs, n * nf * sizeof(recs[0]) );
+}
+
+
+//-------------------------------------------------
+static char alsaseq_outbytes__doc__[] =
+"outbytes( data[, port] ) --> number.\n\n"
+"Send raw MIDI bytes(bytes, bytearray, any buffer), for immediate\n"
+"execution.  They are made into events with snd_midi_event_encode(), and\n"
+"go out together as in output_many().  Running status is understood,\n"
+"a message cut off at the end is dropped.  They go from output port\n"
+"port, -1(default) the first.  Returns events sent.  Safe from several\n"
+"threads at once, each call encodes with a coder of its own.";
+
+#define TX_CHUNK 64  /* events sent per burst */
+
+static PyObject *
+alsaseq_outbytes(ClientObject *self, PyObject *args)
+{
+  PyObject *obj;
+  Py_buffer view;
+  snd_midi_event_t *coder;
+  snd_seq_event_t evs[TX_CHUNK];
+  const unsigned char *buf;
+  long pos = 0, r;
+  int n = 0, total = 0, port = -1;
+
+        if (!PyArg_ParseTuple(args, "O|i", &obj, &port ))
+            return NULL;
+        if ( PyObject_GetBuffer( obj, &view, PyBUF_SIMPLE ) < 0 )
+            return NULL;
+        buf = (const unsigned char *)view.buf;
+        // not one shared by the client, tx_burst() lets other threads in
+        if ( snd_midi_event_new( MIDI_CODER_BUF, &coder ) < 0 ) {
+            PyBuffer_Release( &view );
+            return PyErr_NoMemory();
         }
 
+        while ( pos < view.len ) {
+            snd_seq_ev_clear( &evs[n] );
+            r = snd_midi_event_encode( coder, buf + pos, view.len - pos, &evs[n] );
+            if ( r <= 0 )
+                break;
+            pos += r;
+            if ( evs[n].type == SND_SEQ_EVENT_NONE )
+                continue; // message not complete yet
+            snd_seq_ev_set_direct( &evs[n] );
+            if ( port >= 0 )
+                snd_seq_ev_set_source( &evs[n], port );
+            tx_prepare(self,  &evs[n] );
+            n++;
+            // a sysex points into the coder buffer, send before it's reused
+            if ( n == TX_CHUNK || snd_seq_ev_is_variable( &evs[n-1] ) ) {
+                tx_burst(self,  evs, n );
+                total += n;
+                n = 0;
+            }
+        }
+        if ( n > 0 )
+            tx_burst(self,  evs, n );
+        total += n;
+        snd_midi_event_free( coder );
+        PyBuffer_Release( &view );
+
+        return PyInt_FromLong( total );
 }
 
+//-------------------------------------------------
+static char alsaseq_nrpn__doc__[] =
+"nrpn( channel, msb, lsb, data_msb, value[, port] ) --> number of CCs sent.\n\n"
+"Send NRPN msb, lsb with data entry data_msb(CC 6) and value(CC 38), in\n"
+"one drain, from output port port(-1, default, the first).  The client\n"
+"keeps the NRPN address each output port and channel has\n"
+"selected, from all controllers it sends, and leaves out the 99, 98\n"
+"address CCs when they would not change it, so 2 or 4 CCs go out.\n"
+"After an RPN select or a failed send the address is sent again.\n"
+"See nrpnforget() for when a new synth gets connected.";
+
+static PyObject *
+alsaseq_nrpn(ClientObject *self, PyObject *args)
+{
+  int ch, msb, lsb, data_msb, value, port = -1;
+
+        if (!PyArg_ParseTuple(args, "iiiii|i", &ch, &msb, &lsb, &data_msb, &value, &port ))
+            return NULL;
+        if ( ch < 0 || ch > 15 ) {
+            PyErr_SetString( PyExc_ValueError, "channel must be 0-15" );
+            return NULL;
+        }
+        return PyInt_FromLong( tx_nrpn(self, port, ch, msb & 0x7f, lsb & 0x7f,
+                                       data_msb & 0x7f, value & 0x7f) );
+}
+
+//-------------------------------------------------
+static char alsaseq_nrpnforget__doc__[] =
+"nrpnforget( [channel[, port]] ) --> None.\n\n"
+"Forget the NRPN address selected on channel of output port port(-1 or\n"
+"not given for all of them), so the next nrpn() sends it in full.  For\n"
+"when an output gets connected to a synth that has not seen what we sent.";
+
+static PyObject *
+alsaseq_nrpnforget(ClientObject *self, PyObject *args)
+{
+  int ch = -1, port = -1, p, i;
+
+        if (!PyArg_ParseTuple(args, "|ii", &ch, &port ))
+            return NULL;
+        seq_lock(self->out_lock);
+        for ( p=0; p < maximum_nports; p++ ) {
+            if ( port >= 0 && p != tx_out_index(self, port) )
+                continue;
+            for ( i=0; i < 16; i++ ) {
+                if ( ch < 0 || ch == i )
+                    self->tx_nrpn[p][i][0] = self->tx_nrpn[p][i][1] = -1;
+            }
+        }
+        PyThread_release_lock(self->out_lock);
+
+	Py_INCREF(Py_None);
+	return Py_None;
+}
+
+//-------------------------------------------------
+static char alsaseq_inbytes__doc__[] =
+"inbytes( [max[, stamp[, ports]]] ) --> ( midi, sys, stamps, sysex, ends[, ports] ).\n\n"
+"Read all events pending as inmidi_many() does, made into raw MIDI with\n"
+"snd_midi_event_decode():\n"
+"  midi - bytes, the MIDI messages one after the other, each with its\n"
+"         status byte(no running status).\n"
+"  sys - events with no MIDI form(like announce() news), packed native\n"
+"        ints, INBYTES_SYS_FIELDS per event:\n"
+"          index, type, channel, param, value\n"
+"        SYSEX events are here too, with param, value the offset and\n"
+"        length of their data in sysex.\n"
+"  stamps - with stamp true, arrival seconds, nanoseconds native ints for\n"
+"           each event, else empty.\n"
+"  sysex - bytes, the data of the SYSEX events, slice it with a\n"
+"          memoryview to not copy it again.  A long dump comes as several\n"
+"          SYSEX events, the first starts with 0xf0, the last ends 0xf7.\n"
+"  ends - packed native ints, for each event where its MIDI ends in midi.\n"
+"         Most events are one message, CONTROL14 is 2 controllers and\n"
+"         NONREGPARAM, REGPARAM up to 4, a sys entry is none.\n"
+"Each event has an index(its position in the batch) for\n"
+"outlast( mods, index ), the messages from midi[ends[index-1]:ends[index]]\n"
+"and sys entries with that index.\n"
+"With ports true a sixth item, ports, is bytes with the input port each\n"
+"event came in on, by index.";
+
+#define INBYTES_SYS_FIELDS 5
+#define INBYTES_MIDI_MAX 12 // most one event decodes to, a 4 CC NRPN
+
+static PyObject *
+alsaseq_inbytes(ClientObject *self, PyObject *args)
+{
+  snd_seq_event_t *ev;
+  int sys[RX_RING][INBYTES_SYS_FIELDS];
+  int stamps[RX_RING][2];
+  int ends[RX_RING];
+  unsigned char midi[RX_RING * INBYTES_MIDI_MAX];
+  unsigned char inports[RX_RING];
+  unsigned char *sysex = NULL;
+  long len = 0, sxlen = 0, sxcap = 0, r;
+  int max = RX_RING, stamp = 0, ports = 0, n = 0, nsys = 0;
+  PyObject *res;
+
+        if (!PyArg_ParseTuple(args, "|iii", &max, &stamp, &ports ))
+            return NULL;
+        if ( max < 1 || max > RX_RING )
+            max = RX_RING;
+
+        seq_lock(self->in_lock);
+        self->rx_batch = self->rx_head;
+        snd_midi_event_reset_decode( self->rx_coder );
+        if ( rx_pending(self) > 0 ) {
+            do {
+                if ( rx_read(self, &ev) < 0 )
+                    break;
+                if ( rx_filtered(self, ev) || rx_routed(self, ev) )
+                    continue;
+                rx_store(self, ev);
+                inports[n] = ev->dest.port;
+                if ( stamp ) {
+                    stamps[n][0] = ev->time.time.tv_sec;
+                    stamps[n][1] = ev->time.time.tv_nsec;
+                }
+                if ( ev->type == SND_SEQ_EVENT_SYSEX ) {
+                    // data is only good until the next read, keep a copy
+                    if ( sxlen + (long)ev->data.ext.len > sxcap ) {
+                        unsigned char *bigger = sysex;
+                        sxcap = (sxlen + ev->data.ext.len) * 2;
+                        PyMem_Resize( bigger, unsigned char, sxcap );
+                        if ( bigger == NULL ) {
+                            PyThread_release_lock(self->in_lock);
+                            PyMem_Del( sysex );
+                            return PyErr_NoMemory();
+                        }
+                        sysex = bigger;
+                    }
+                    memcpy( sysex + sxlen, ev->data.ext.ptr, ev->data.ext.len );
+                    sys[nsys][0] = n;
+                    sys[nsys][1] = ev->type;
+                    sys[nsys][2] = 0;
+                    sys[nsys][3] = sxlen;
+                    sys[nsys][4] = ev->data.ext.len;
+                    sxlen += ev->data.ext.len;
+                    nsys++;
+                }
+                else if ( (r = snd_midi_event_decode( self->rx_coder, midi + len,
+                                                      sizeof(midi) - len, ev )) > 0 )
+                    len += r;
+                else if ( r == -ENOMEM )
+                    self->ndropped++; // can't be, midi has room for max
+                else {
+                    sys[nsys][0] = n;
+                    rx_record(ev, &sys[nsys][1]);
+                    nsys++;
+                }
+                ends[n] = len;
+                n++;
+            } while ( n < max && snd_seq_event_input_pending( self->seq_handle, 0 ) > 0 );
+        }
+        PyThread_release_lock(self->in_lock);
+
+        if ( ports )
+            res = Py_BuildValue( "(NNNNNN)",
+                  PyBytes_FromStringAndSize( (char *)midi, len ),
+                  PyBytes_FromStringAndSize( (char *)sys, nsys * sizeof(sys[0]) ),
+                  PyBytes_FromStringAndSize( (char *)stamps, stamp ? n * sizeof(stamps[0]) : 0 ),
+                  PyBytes_FromStringAndSize( (char *)sysex, sxlen ),
+                  PyBytes_FromStringAndSize( (char *)ends, n * sizeof(ends[0]) ),
+                  PyBytes_FromStringAndSize( (char *)inports, n ) );
+        else
+            res = Py_BuildValue( "(NNNNN)",
+                  PyBytes_FromStringAndSize( (char *)midi, len ),
+                  PyBytes_FromStringAndSize( (char *)sys, nsys * sizeof(sys[0]) ),
+                  PyBytes_FromStringAndSize( (char *)stamps, stamp ? n * sizeof(stamps[0]) : 0 ),
+                  PyBytes_FromStringAndSize( (char *)sysex, sxlen ),
+                  PyBytes_FromStringAndSize( (char *)ends, n * sizeof(ends[0]) ) );
+        PyMem_Del( sysex );
+        return res;
+}
+
+//-------------------------------------------------
+static char alsaseq_outsysex__doc__[] =
+"outsysex( data[, chunk[, port]] ) --> number.\n\n"
+"Send sysex data(bytes, bytearray, memoryview, any buffer) for\n"
+"immediate execution.  It goes out as SYSEX events of up to chunk(default\n"
+"256) bytes each, straight from the buffer, no copies made in python.\n"
+"Normally one whole 0xf0 ... 0xf7 dump, but pieces of one(as inbytes()\n"
+"hands them over) pass on fine too.  port is the output port, -1(default)\n"
+"the first.  Returns events sent.";
+
+#define SYSEX_CHUNK 256
+
+static PyObject *
+alsaseq_outsysex(ClientObject *self, PyObject *args)
+{
+  PyObject *obj;
+  Py_buffer view;
+  snd_seq_event_t ev;
+  int chunk = SYSEX_CHUNK, nevents = 0, err = 0, port = -1;
+  Py_ssize_t pos, n;
+
+        if (!PyArg_ParseTuple(args, "O|ii", &obj, &chunk, &port ))
+            return NULL;
+        if ( chunk < 1 ) {
+            PyErr_SetString( PyExc_ValueError, "chunk must be > 0" );
+            return NULL;
+        }
+        if ( PyObject_GetBuffer( obj, &view, PyBUF_SIMPLE ) < 0 )
+            return NULL;
+
+        // view holds the buffer still while we send without the GIL
+        seq_lock(self->out_lock);
+        Py_BEGIN_ALLOW_THREADS
+        for ( pos=0; pos < view.len && err >= 0; pos += n ) {
+            n = view.len - pos;
+            if ( n > chunk )
+                n = chunk;
+            snd_seq_ev_clear( &ev );
+            snd_seq_ev_set_sysex( &ev, n, (char *)view.buf + pos );
+            snd_seq_ev_set_direct( &ev );
+            if ( port >= 0 )
+                snd_seq_ev_set_source( &ev, port );
+            tx_prepare(self,  &ev );
+            if ( (err = tx_event(self, &ev, 0)) >= 0 )
+                nevents++;
+        }
+        if ( err >= 0 )
+            err = tx_drain(self);
+        PyThread_release_lock(self->out_lock);
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release( &view );
+
+        if ( err < 0 ) {
+            PyErr_Format( PyExc_IOError, "sysex send failed: %s", snd_strerror( err ) );
+            return NULL;
+        }
+        return PyInt_FromLong( nevents );
+}
 
 //-------------------------------------------------
 static char alsaseq_inputpending__doc__[] =
@@ -557,68 +2145,718 @@ static char alsaseq_inputpending__doc__[] =
 "Use before input() to know if events are ready to be read.";
 
 static PyObject *
-alsaseq_inputpending(PyObject *self, PyObject *args)
+alsaseq_inputpending(ClientObject *self, PyObject *args)
 {
   int res;
         
 	if (!PyArg_ParseTuple(args, "" ))
 		return NULL;
-        res = snd_seq_event_input_pending( seq_handle, 1 ); /* fetch_sequencer */
+        res = rx_pending(self); /* fetch_sequencer */
+        if ( res == -EAGAIN ) // nonblocking handle, nothing there
+            res = 0;
 
         return PyInt_FromLong( res );
 }
 
+//-------------------------------------------------
+static char alsaseq_stats__doc__[] =
+"stats( [reset] ) --> ( received, sent, overrun, dropped, blocked ).\n\n"
+"Event counts since the client was made or last reset:\n"
+"    received - events read from the sequencer, routes() ones included\n"
+"    sent     - events sent, routes() ones included\n"
+"    overrun  - times the kernel input queue overflowed and lost events\n"
+"    dropped  - events the kernel could not deliver to us, plus ones\n"
+"               we failed to send\n"
+"    blocked  - times sending waited for room in the kernel pool\n"
+"With reset true the counts start again from 0 after reading them.\n"
+"See client() for pool and buffer sizes.";
+
+static PyObject *
+alsaseq_stats(ClientObject *self, PyObject *args)
+{
+  snd_seq_client_info_t *info;
+  int reset = 0, lost = 0;
+  PyObject *res;
+
+        if (!PyArg_ParseTuple(args, "|i", &reset ))
+            return NULL;
+
+        snd_seq_client_info_alloca(&info);
+        if ( snd_seq_get_client_info( self->seq_handle, info ) >= 0 )
+            lost = snd_seq_client_info_get_event_lost( info );
+
+        seq_lock(self->in_lock);
+        seq_lock(self->out_lock);
+        res = Py_BuildValue( "(kkkkk)", self->nreceived, self->nsent, self->noverrun,
+                  self->ndropped + (unsigned long)(lost - self->lost_base), self->nblocked );
+        if ( reset ) {
+            self->nreceived = self->nsent = self->noverrun = 0;
+            self->ndropped = self->nblocked = 0;
+            self->lost_base = lost;
+        }
+        PyThread_release_lock(self->out_lock);
+        PyThread_release_lock(self->in_lock);
+
+        return res;
+}
+
 static char alsaseq_fd__doc__[] =
 "fd() --> number.\n\nReturn fileno of sequencer."
 ;
 
 static PyObject *
-alsaseq_fd(PyObject *self, PyObject *args)
+alsaseq_fd(ClientObject *self, PyObject *args)
 {
   int npfd;
   struct pollfd *pfd;
         
 	if (!PyArg_ParseTuple(args, "" ))
 		return NULL;
-  npfd = snd_seq_poll_descriptors_count(seq_handle, POLLIN);
+  npfd = snd_seq_poll_descriptors_count(self->seq_handle, POLLIN);
   pfd = (struct pollfd *)alloca(npfd * sizeof(struct pollfd));
-  snd_seq_poll_descriptors(seq_handle, pfd, npfd, POLLIN);
+  snd_seq_poll_descriptors(self->seq_handle, pfd, npfd, POLLIN);
 
         return PyInt_FromLong( pfd->fd );
 }
 
+//-------------------------------------------------
+static char alsaseq_fds__doc__[] =
+"fds() --> [ fd, ].\n\n"
+"All the file descriptors to watch for input, for an event loop like\n"
+"asyncio add_reader().  When one is readable, wait( 0 ) lets filter()\n"
+"and routes() deal with what python need not see, then read with\n"
+"inmidi_many() or inbytes() if it says midi_ready.";
 
-/* start python 2 & python 3 dual support for initialization */
+static PyObject *
+alsaseq_fds(ClientObject *self, PyObject *args)
+{
+  int npfd, n;
+  struct pollfd *pfd;
+  PyObject *res;
 
-struct module_state {
-    PyObject *error;
-};
+	if (!PyArg_ParseTuple(args, "" ))
+		return NULL;
+  npfd = snd_seq_poll_descriptors_count(self->seq_handle, POLLIN);
+  pfd = (struct pollfd *)alloca(npfd * sizeof(struct pollfd));
+  npfd = snd_seq_poll_descriptors(self->seq_handle, pfd, npfd, POLLIN);
+
+  res = PyList_New( npfd );
+  if ( res == NULL )
+    return NULL;
+  for ( n=0; n < npfd; n++ )
+    PyList_SET_ITEM( res, n, PyInt_FromLong( pfd[n].fd ) );
+  return res;
+}
 
-#if PY_MAJOR_VERSION >= 3
-#define GETSTATE(m) ((struct module_state*)PyModule_GetState(m))
-#else
-#define GETSTATE(m) (&_state)
-static struct module_state _state;
-#endif
+//-------------------------------------------------
+static char alsaseq_routes__doc__[] =
+"routes( rules[, inport[, outport]] ) --> number of rules.\n\n"
+"Load the routing table run on every event coming in on input port\n"
+"inport(-1, default, all of them), before it gets to python.  Rules send\n"
+"from output port outport(-1, default, the first).  Each input port has\n"
+"its own table, an event is looked up in just the one for its port.\n"
+"Events matching a rule are handled in C, only events with no rule show\n"
+"up in input(), inmidi() and inmidi_many().\n"
+"Each rule is a tuple:\n"
+"    (type, rx_channel, param, action [, tx_channel, arg0, arg1, arg2])\n"
+"type is a SND_SEQ_EVENT_ note, controller, pgmchange, chanpress or\n"
+"pitchbend constant.  param is the note or controller number.\n"
+"rx_channel, param or tx_channel of -1 match any / keep the rx one.\n"
+"action is one of:\n"
+"    ROUTE_DROP    - swallow the event\n"
+"    ROUTE_PASS    - send it on unchanged\n"
+"    ROUTE_CHANNEL - send it on, on tx_channel\n"
+"    ROUTE_CC      - send controller arg0 with the event value\n"
+"    ROUTE_NRPN    - send NRPN arg0(MSB), arg1(LSB) with data entry MSB\n"
+"                    arg2 and the event value as data entry LSB.  arg1 -1\n"
+"                    uses the LSB of the last NRPN a rule sent.  Like\n"
+"                    nrpn(), the address CCs go only when it changes\n"
+"    ROUTE_PYTHON  - hand it up to python anyway\n"
+"A rule for one channel/param wins over a -1 rule.  Rules later in the\n"
+"list replace earlier ones with the same key.  routes( [] ) clears.\n"
+"Numbers that go out(tx_channel, arg0-2) must be 0-15, 0-127, -1 only\n"
+"where it says, else ValueError and the table stays as it was.";
 
-/* List of methods defined in the module */
+static PyObject *
+alsaseq_routes(ClientObject *self, PyObject *args)
+{
+  PyObject *rules, *fast;
+  route_t newroutes[maximum_routes];
+  int type[maximum_routes], ch[maximum_routes], param[maximum_routes];
+  int n, nrules, slot, inport = -1, outport = -1, p;
+  route_table_t *t;
 
-static struct PyMethodDef alsaseq_methods[] = {
-	{"client",	(PyCFunction)alsaseq_client,	METH_VARARGS,	alsaseq_client__doc__},
+        if (!PyArg_ParseTuple(args, "O|ii", &rules, &inport, &outport ))
+            return NULL;
+        if ( inport >= self->ninputports ) {
+            PyErr_SetString( PyExc_ValueError, "no such input port" );
+            return NULL;
+        }
+        fast = PySequence_Fast( rules, "rules must be a sequence" );
+        if ( fast == NULL )
+            return NULL;
+        nrules = PySequence_Fast_GET_SIZE( fast );
+        if ( nrules > maximum_routes ) {
+            Py_DECREF( fast );
+            PyErr_Format( PyExc_ValueError, "only %d rules are allowed", maximum_routes );
+            return NULL;
+        }
+        for ( n=0; n < nrules; n++ ) {
+            route_t *r = &newroutes[n];
+            r->tx_channel = -1;
+            r->arg[0] = r->arg[1] = r->arg[2] = 0;
+            if (!PyArg_ParseTuple( PySequence_Fast_GET_ITEM( fast, n ),
+                   "iiii|iiii;rule should be (type, rx_channel, param, action [, tx_channel, arg0, arg1, arg2])",
+                   &type[n], &ch[n], &param[n], &r->action,
+                   &r->tx_channel, &r->arg[0], &r->arg[1], &r->arg[2] )) {
+                Py_DECREF( fast );
+                return NULL;
+            }
+            // what tx_cc()/tx_nrpn() put on the wire has to be 0-127
+            if ( route_slot(type[n]) < 0 || ch[n] < -1 || ch[n] > 15 ||
+                 param[n] < -1 || param[n] > 127 ||
+                 r->action < ROUTE_DROP || r->action > ROUTE_PYTHON ||
+                 r->tx_channel < -1 || r->tx_channel > 15 ||
+                 ( r->action == ROUTE_CC &&
+                   (r->arg[0] < 0 || r->arg[0] > 127) ) ||
+                 ( r->action == ROUTE_NRPN &&
+                   (r->arg[0] < 0 || r->arg[0] > 127 ||
+                    r->arg[1] < -1 || r->arg[1] > 127 ||
+                    r->arg[2] < 0 || r->arg[2] > 127) ) ) {
+                Py_DECREF( fast );
+                PyErr_Format( PyExc_ValueError, "bad route rule %d", n );
+                return NULL;
+            }
+            if ( ch[n] < 0 ) ch[n] = ROUTE_ANY_CH;
+            if ( param[n] < 0 ) param[n] = ROUTE_ANY_PARAM;
+        }
+        Py_DECREF( fast );
+
+        // all good, swap it in.  Input holds the GIL while routing.
+        for ( p=0; p < self->ninputports; p++ ) {
+            if ( inport >= 0 && p != inport )
+                continue;
+            t = &self->route_tables[p];
+            memset( t->index, 0, sizeof(t->index) );
+            for ( n=0; n < nrules; n++ ) {
+                t->routes[n] = newroutes[n];
+                slot = route_slot(type[n]);
+                t->index[slot][ch[n]][param[n]] = n + 1;
+            }
+            t->nroutes = nrules;
+            t->tx_port = outport;
+        }
+
+        return PyInt_FromLong( nrules );
+}
+
+//-------------------------------------------------
+static char alsaseq_routelsb__doc__[] =
+"routelsb( [inport[, lsb]] ) --> lsb.\n\n"
+"The NRPN LSB of the last NRPN a rule of inport's table(-1, default, the\n"
+"first) sent, what ROUTE_NRPN rules with arg1 -1 send.  With lsb 0-127\n"
+"set it first, of all the tables for inport -1.  Python sending those\n"
+"NRPNs itself keeps it here too, so it is the same which side routes.";
+
+static PyObject *
+alsaseq_routelsb(ClientObject *self, PyObject *args)
+{
+  int inport = -1, lsb = -1, p;
+
+        if (!PyArg_ParseTuple(args, "|ii", &inport, &lsb ))
+            return NULL;
+        if ( inport >= self->ninputports || lsb < -1 || lsb > 127 ) {
+            PyErr_SetString( PyExc_ValueError, "no such input port, or lsb not 0-127" );
+            return NULL;
+        }
+        if ( lsb >= 0 ) {
+            for ( p=0; p < self->ninputports; p++ ) {
+                if ( inport < 0 || p == inport )
+                    self->route_tables[p].nrpn_lsb = lsb;
+            }
+        }
+        return PyInt_FromLong( self->route_tables[inport < 0 ? 0 : inport].nrpn_lsb );
+}
+
+//-------------------------------------------------
+static char alsaseq_filter__doc__[] =
+"filter( rules ) --> number of rules.\n\n"
+"Drop incoming events before routes() or python see them, and without\n"
+"waking wait().  Each rule is an event type, like SND_SEQ_EVENT_SENSING\n"
+"or SND_SEQ_EVENT_CLOCK, dropped from anywhere, or a tuple\n"
+"    (type, client, port)\n"
+"dropped only when it comes from that source port.  -1 for type, client\n"
+"or port matches any.  An empty list drops nothing.\n"
+"filtered() counts what was dropped.";
+
+static PyObject *
+alsaseq_filter(ClientObject *self, PyObject *args)
+{
+  PyObject *rules, *fast, *item;
+  unsigned char mask[256];
+  filter_src_t srcs[maximum_filter_srcs];
+  int n, nrules, nsrcs = 0, type, t;
+
+        if (!PyArg_ParseTuple(args, "O", &rules ))
+            return NULL;
+        fast = PySequence_Fast( rules, "rules must be a sequence" );
+        if ( fast == NULL )
+            return NULL;
+        nrules = PySequence_Fast_GET_SIZE( fast );
+        memset( mask, 0, sizeof(mask) );
+        for ( n=0; n < nrules; n++ ) {
+            item = PySequence_Fast_GET_ITEM( fast, n );
+            if ( PyTuple_Check( item ) ) {
+                filter_src_t *f = &srcs[nsrcs];
+                if ( nsrcs >= maximum_filter_srcs ) {
+                    Py_DECREF( fast );
+                    PyErr_Format( PyExc_ValueError, "only %d source rules are allowed",
+                                  maximum_filter_srcs );
+                    return NULL;
+                }
+                if (!PyArg_ParseTuple( item, "iii;rule should be type or (type, client, port)",
+                                       &f->type, &f->client, &f->port )) {
+                    Py_DECREF( fast );
+                    return NULL;
+                }
+                type = f->type;
+                nsrcs++;
+            }
+            else {
+                type = PyLong_AsLong( item );
+                if ( type == -1 && PyErr_Occurred() ) {
+                    Py_DECREF( fast );
+                    return NULL;
+                }
+            }
+            if ( type < -1 || type > 255 ) {
+                Py_DECREF( fast );
+                PyErr_Format( PyExc_ValueError, "bad filter rule %d", n );
+                return NULL;
+            }
+            // type -1 goes on every type
+            for ( t = type < 0 ? 0 : type; t <= (type < 0 ? 255 : type); t++ )
+                mask[t] |= PyTuple_Check( item ) ? FILTER_SOURCE : FILTER_ANY;
+        }
+        Py_DECREF( fast );
+
+        // all good, swap it in.  Input holds the GIL while filtering.
+        memcpy( self->filter_mask, mask, sizeof(mask) );
+        memcpy( self->filter_src, srcs, nsrcs * sizeof(srcs[0]) );
+        self->nfilter_src = nsrcs;
+
+        return PyInt_FromLong( nrules );
+}
+
+//-------------------------------------------------
+static char alsaseq_filtered__doc__[] =
+"filtered( [reset] ) --> [ ( type, count ), ]\n\n"
+"Events filter() dropped, by type, for types with a count.\n"
+"With reset true the counts start again from 0 after reading them.";
+
+static PyObject *
+alsaseq_filtered(ClientObject *self, PyObject *args)
+{
+  PyObject *res, *item;
+  int reset = 0, n;
+
+        if (!PyArg_ParseTuple(args, "|i", &reset ))
+            return NULL;
+        res = PyList_New(0);
+        if ( res == NULL )
+            return NULL;
+        for ( n=0; n < 256; n++ ) {
+            if ( self->filtered[n] == 0 )
+                continue;
+            item = Py_BuildValue( "(ik)", n, self->filtered[n] );
+            if ( item == NULL || PyList_Append( res, item ) < 0 ) {
+                Py_XDECREF( item );
+                Py_DECREF( res );
+                return NULL;
+            }
+            Py_DECREF( item );
+        }
+        if ( reset )
+            memset( self->filtered, 0, sizeof(self->filtered) );
+
+        return res;
+}
+
+//-------------------------------------------------
+static char alsaseq_wait__doc__[] =
+"wait( [timeout_ms [, extra_fds]] ) --> ( midi_ready, ready_fds ).\n\n"
+"Sleep until an event arrives in the input ports, one of extra_fds\n"
+"(file descriptors, or objects with fileno() like sys.stdin) is\n"
+"readable, or timeout_ms passes.  timeout_ms < 0(default) waits\n"
+"forever.  Other python threads keep running while we wait.\n"
+"Events dropped by filter() or handled by routes() don't count as\n"
+"arriving, they are dealt with here and wait() goes on sleeping.\n\n"
+"midi_ready is True when input()/inmidi() would not block.\n"
+"ready_fds lists the extra_fds entries that are readable.";
+
+static PyObject *
+alsaseq_wait(ClientObject *self, PyObject *args, PyObject *kwds)
+{
+  static char *kwlist[] = { "timeout_ms", "extra_fds", NULL };
+  int timeout = -1, left, npfd, nextra = 0, n, res;
+  int midi_ready = 0, extra_ready;
+  unsigned short revents = 0;
+  PyObject *extra = NULL, *fast = NULL, *ready;
+  struct pollfd *pfd;
+  struct timespec t0, t;
+
+        if (!PyArg_ParseTupleAndKeywords(args, kwds, "|iO", kwlist, &timeout, &extra ))
+            return NULL;
+
+        if ( extra != NULL && extra != Py_None ) {
+            fast = PySequence_Fast( extra, "extra_fds must be a sequence" );
+            if ( fast == NULL )
+                return NULL;
+            nextra = PySequence_Fast_GET_SIZE( fast );
+        }
+
+        npfd = snd_seq_poll_descriptors_count(self->seq_handle, POLLIN);
+        pfd = (struct pollfd *)alloca((npfd + nextra) * sizeof(struct pollfd));
+        snd_seq_poll_descriptors(self->seq_handle, pfd, npfd, POLLIN);
+        for ( n=0; n < nextra; n++ ) {
+            int fd = PyObject_AsFileDescriptor( PySequence_Fast_GET_ITEM( fast, n ) );
+            if ( fd < 0 ) {
+                Py_DECREF( fast );
+                return NULL;
+            }
+            pfd[npfd + n].fd = fd;
+            pfd[npfd + n].events = POLLIN;
+            pfd[npfd + n].revents = 0;
+        }
+
+        // events already read in from the sequencer? then don't sleep.
+        if ( self->stashed || snd_seq_event_input_pending( self->seq_handle, 0 ) > 0 )
+            midi_ready = rx_wanted(self);
+        clock_gettime( CLOCK_MONOTONIC, &t0 );
+        left = timeout;
+
+        while ( midi_ready >= 0 ) {
+            Py_BEGIN_ALLOW_THREADS
+            res = poll( pfd, npfd + nextra, midi_ready ? 0 : left );
+            Py_END_ALLOW_THREADS
+
+            if ( res < 0 ) {
+                if ( errno != EINTR || PyErr_CheckSignals() ) {
+                    if ( !PyErr_Occurred() )
+                        PyErr_SetFromErrno( PyExc_OSError );
+                    Py_XDECREF( fast );
+                    return NULL;
+                }
+                res = 0; // interrupted, look like a timeout
+            }
+
+            revents = 0;
+            extra_ready = 0;
+            if ( res > 0 ) {
+                snd_seq_poll_descriptors_revents( self->seq_handle, pfd, npfd, &revents );
+                for ( n=0; n < nextra; n++ )
+                    extra_ready |= pfd[npfd + n].revents & (POLLIN | POLLHUP | POLLERR);
+            }
+            if ( !midi_ready && (revents & POLLIN) )
+                midi_ready = rx_wanted(self);
+            if ( midi_ready || extra_ready || res == 0 )
+                break;
+            if ( timeout >= 0 ) {
+                clock_gettime( CLOCK_MONOTONIC, &t );
+                left = timeout - ((t.tv_sec - t0.tv_sec) * 1000 +
+                                  (t.tv_nsec - t0.tv_nsec) / 1000000);
+                if ( left <= 0 )
+                    break;
+            }
+        }
+        if ( midi_ready < 0 ) {
+            Py_XDECREF( fast );
+            return NULL;
+        }
+
+        ready = PyList_New(0);
+        for ( n=0; res > 0 && n < nextra; n++ ) {
+            if ( pfd[npfd + n].revents & (POLLIN | POLLHUP | POLLERR) )
+                PyList_Append( ready, PySequence_Fast_GET_ITEM( fast, n ) );
+        }
+        Py_XDECREF( fast );
+
+        return Py_BuildValue( "(NN)", PyBool_FromLong( midi_ready ), ready );
+}
+
+
+//-------------------------------------------------
+static char alsaseq_encode__doc__[] =
+"encode( data ) --> bytes.\n\n"
+"Make raw MIDI bytes into events, returned packed like inmidi_many()\n"
+"(INMIDI_FIELDS native ints per event), ready for output_many().\n"
+"ValueError for sysex, send that with outbytes().";
+
+static PyObject *
+alsaseq_encode(PyObject *self /* Not used */, PyObject *args)
+{
+  PyObject *obj, *res = NULL;
+  Py_buffer view;
+  snd_midi_event_t *coder;
+  snd_seq_event_t ev;
+  int *recs;
+  long pos = 0, r;
+  int n = 0;
+
+        if (!PyArg_ParseTuple(args, "O", &obj ))
+            return NULL;
+        if ( PyObject_GetBuffer( obj, &view, PyBUF_SIMPLE ) < 0 )
+            return NULL;
+        // never more events than bytes
+        recs = PyMem_New( int, (view.len + 1) * INMIDI_FIELDS );
+        if ( recs == NULL || snd_midi_event_new( MIDI_CODER_BUF, &coder ) < 0 ) {
+            PyMem_Del( recs );
+            PyBuffer_Release( &view );
+            return PyErr_NoMemory();
+        }
+        while ( pos < view.len ) {
+            snd_seq_ev_clear( &ev );
+            r = snd_midi_event_encode( coder, (const unsigned char *)view.buf + pos,
+                                       view.len - pos, &ev );
+            if ( r <= 0 )
+                break;
+            pos += r;
+            if ( ev.type == SND_SEQ_EVENT_NONE )
+                continue;
+            if ( snd_seq_ev_is_variable( &ev ) ) {
+                PyErr_SetString( PyExc_ValueError, "can't encode sysex, use outbytes()" );
+                goto done;
+            }
+            rx_record( &ev, &recs[n++ * INMIDI_FIELDS] );
+        }
+        res = PyBytes_FromStringAndSize( (char *)recs, n * INMIDI_FIELDS * sizeof(int) );
+done:
+        snd_midi_event_free( coder );
+        PyMem_Del( recs );
+        PyBuffer_Release( &view );
+        return res;
+}
+
+//-------------------------------------------------
+static char alsaseq_decode__doc__[] =
+"decode( events ) --> bytes.\n\n"
+"Make events packed like inmidi_many() returns(INMIDI_FIELDS native\n"
+"ints per event) into raw MIDI bytes, each message with its status\n"
+"byte.  Events with no MIDI form are left out, IOError if one won't\n"
+"decode.";
+
+static PyObject *
+alsaseq_decode(PyObject *self /* Not used */, PyObject *args)
+{
+  PyObject *obj, *res;
+  Py_buffer view;
+  snd_midi_event_t *coder;
+  snd_seq_event_t ev;
+  const int *recs;
+  unsigned char *midi;
+  long len = 0, r;
+  int n, nevents;
+
+        if (!PyArg_ParseTuple(args, "O", &obj ))
+            return NULL;
+        if ( PyObject_GetBuffer( obj, &view, PyBUF_SIMPLE ) < 0 )
+            return NULL;
+        if ( view.len % (INMIDI_FIELDS * sizeof(int)) ) {
+            PyBuffer_Release( &view );
+            PyErr_SetString( PyExc_ValueError, "buffer is not whole INMIDI_FIELDS records" );
+            return NULL;
+        }
+        nevents = view.len / (INMIDI_FIELDS * sizeof(int));
+        recs = (const int *)view.buf;
+        // 12 most for a record, a 14 bit CC or NRPN as separate CCs
+        midi = PyMem_New( unsigned char, nevents * INBYTES_MIDI_MAX + 1 );
+        if ( midi == NULL || snd_midi_event_new( MIDI_CODER_BUF, &coder ) < 0 ) {
+            PyMem_Del( midi );
+            PyBuffer_Release( &view );
+            return PyErr_NoMemory();
+        }
+        snd_midi_event_no_status( coder, 1 );
+        for ( n=0; n < nevents; n++ ) {
+            snd_seq_ev_clear( &ev );
+            ev_set_record( &ev, &recs[n * INMIDI_FIELDS] );
+            r = snd_midi_event_decode( coder, midi + len,
+                                       nevents * INBYTES_MIDI_MAX + 1 - len, &ev );
+            if ( r > 0 )
+                len += r;
+            else if ( r < 0 && r != -ENOENT ) { // ENOENT, no MIDI form
+                PyErr_Format( PyExc_IOError, "event %d: %s", n, snd_strerror( r ) );
+                break;
+            }
+        }
+        res = NULL;
+        if ( n == nevents )
+            res = PyBytes_FromStringAndSize( (char *)midi, len );
+        snd_midi_event_free( coder );
+        PyMem_Del( midi );
+        PyBuffer_Release( &view );
+        return res;
+}
+
+DEFAULT_CLIENT(start)
+DEFAULT_CLIENT(stop)
+DEFAULT_CLIENT(status)
+DEFAULT_CLIENT(queuetime)
+DEFAULT_CLIENT(output)
+DEFAULT_CLIENT(output_many)
+DEFAULT_CLIENT(outlast)
+DEFAULT_CLIENT(syncoutput)
+DEFAULT_CLIENT(connectto)
+DEFAULT_CLIENT(connectfrom)
+DEFAULT_CLIENT(announce)
+DEFAULT_CLIENT(portinfo)
+DEFAULT_CLIENT(ports)
+DEFAULT_CLIENT(inputpending)
+DEFAULT_CLIENT(input)
+DEFAULT_CLIENT(inevent)
+DEFAULT_CLIENT(inevents)
+DEFAULT_CLIENT(inmidi)
+DEFAULT_CLIENT(inmidi_many)
+DEFAULT_CLIENT(outbytes)
+DEFAULT_CLIENT(inbytes)
+DEFAULT_CLIENT(outsysex)
+DEFAULT_CLIENT(nrpn)
+DEFAULT_CLIENT(nrpnforget)
+DEFAULT_CLIENT(stats)
+DEFAULT_CLIENT(filter)
+DEFAULT_CLIENT(filtered)
+DEFAULT_CLIENT(fd)
+DEFAULT_CLIENT(fds)
+DEFAULT_CLIENT(list)
+DEFAULT_CLIENT(routes)
+DEFAULT_CLIENT(routelsb)
+
+static PyObject *
+alsaseq_default_id(PyObject *self /* Not used */, PyObject *args)
+{
+  if ( default_client == NULL ) {
+    if (!PyArg_ParseTuple(args, "" ))
+      return NULL;
+    return PyInt_FromLong( 0 );
+  }
+  return alsaseq_id( default_client, args );
+}
+
+static PyObject *
+alsaseq_default_wait(PyObject *self /* Not used */, PyObject *args, PyObject *kwds)
+{
+  if ( default_client == NULL ) {
+    PyErr_SetString( PyExc_RuntimeError, "call client() first" );
+    return NULL;
+  }
+  return alsaseq_wait( default_client, args, kwds );
+}
+
+/* Methods of Client objects */
+
+static struct PyMethodDef Client_methods[] = {
  {"start",	(PyCFunction)alsaseq_start,	METH_VARARGS,	alsaseq_start__doc__},
  {"stop",	(PyCFunction)alsaseq_stop,	METH_VARARGS,	alsaseq_stop__doc__},
  {"status",	(PyCFunction)alsaseq_status,	METH_VARARGS,	alsaseq_status__doc__},
+ {"queuetime",	(PyCFunction)alsaseq_queuetime,	METH_VARARGS,	alsaseq_queuetime__doc__},
  {"output",	(PyCFunction)alsaseq_output,	METH_VARARGS,	alsaseq_output__doc__},
+ {"output_many",	(PyCFunction)alsaseq_output_many,	METH_VARARGS,	alsaseq_output_many__doc__},
  {"outlast",	(PyCFunction)alsaseq_outlast,	METH_VARARGS,	alsaseq_outlast__doc__},
  {"syncoutput",	(PyCFunction)alsaseq_syncoutput,	METH_VARARGS,	alsaseq_syncoutput__doc__},
  {"connectto",	(PyCFunction)alsaseq_connectto,	METH_VARARGS,	alsaseq_connectto__doc__},
  {"connectfrom",	(PyCFunction)alsaseq_connectfrom,	METH_VARARGS,	alsaseq_connectfrom__doc__},
+ {"announce",	(PyCFunction)alsaseq_announce,	METH_VARARGS,	alsaseq_announce__doc__},
+ {"portinfo",	(PyCFunction)alsaseq_portinfo,	METH_VARARGS,	alsaseq_portinfo__doc__},
+ {"ports",	(PyCFunction)alsaseq_ports,	METH_VARARGS,	alsaseq_ports__doc__},
  {"inputpending",	(PyCFunction)alsaseq_inputpending,	METH_VARARGS,	alsaseq_inputpending__doc__},
  {"id",	(PyCFunction)alsaseq_id,	METH_VARARGS,	alsaseq_id__doc__},
  {"input",	(PyCFunction)alsaseq_input,	METH_VARARGS,	alsaseq_input__doc__},
+ {"inevent",	(PyCFunction)alsaseq_inevent,	METH_VARARGS,	alsaseq_inevent__doc__},
+ {"inevents",	(PyCFunction)alsaseq_inevents,	METH_VARARGS,	alsaseq_inevents__doc__},
  {"inmidi",	(PyCFunction)alsaseq_inmidi,	METH_VARARGS,	alsaseq_inmidi__doc__},
+ {"inmidi_many",	(PyCFunction)alsaseq_inmidi_many,	METH_VARARGS,	alsaseq_inmidi_many__doc__},
+ {"outbytes",	(PyCFunction)alsaseq_outbytes,	METH_VARARGS,	alsaseq_outbytes__doc__},
+ {"nrpn",	(PyCFunction)alsaseq_nrpn,	METH_VARARGS,	alsaseq_nrpn__doc__},
+ {"nrpnforget",	(PyCFunction)alsaseq_nrpnforget,	METH_VARARGS,	alsaseq_nrpnforget__doc__},
+ {"inbytes",	(PyCFunction)alsaseq_inbytes,	METH_VARARGS,	alsaseq_inbytes__doc__},
+ {"outsysex",	(PyCFunction)alsaseq_outsysex,	METH_VARARGS,	alsaseq_outsysex__doc__},
+ {"stats",	(PyCFunction)alsaseq_stats,	METH_VARARGS,	alsaseq_stats__doc__},
+ {"filter",	(PyCFunction)alsaseq_filter,	METH_VARARGS,	alsaseq_filter__doc__},
+ {"filtered",	(PyCFunction)alsaseq_filtered,	METH_VARARGS,	alsaseq_filtered__doc__},
  {"fd",	(PyCFunction)alsaseq_fd,	METH_VARARGS,	alsaseq_fd__doc__},
+ {"fds",	(PyCFunction)alsaseq_fds,	METH_VARARGS,	alsaseq_fds__doc__},
  {"list",	(PyCFunction)alsaseq_list,	METH_VARARGS,	alsaseq_list__doc__},
+ {"routes",	(PyCFunction)alsaseq_routes,	METH_VARARGS,	alsaseq_routes__doc__},
+ {"routelsb",	(PyCFunction)alsaseq_routelsb,	METH_VARARGS,	alsaseq_routelsb__doc__},
+ {"wait",	(PyCFunction)alsaseq_wait,	METH_VARARGS | METH_KEYWORDS,	alsaseq_wait__doc__},
+
+	{NULL,	 (PyCFunction)NULL, 0, NULL}		/* sentinel */
+};
+
+static PyTypeObject Client_Type = {
+	PyVarObject_HEAD_INIT(NULL, 0)
+	.tp_name = "alsaseq.Client",
+	.tp_basicsize = sizeof(ClientObject),
+	.tp_dealloc = (destructor)Client_dealloc,
+	.tp_flags = Py_TPFLAGS_DEFAULT,
+	.tp_doc = alsaseq_client__doc__,
+	.tp_methods = Client_methods,
+	.tp_init = (initproc)Client_init,
+	.tp_new = PyType_GenericNew,
+};
+
+/* start python 2 & python 3 dual support for initialization */
+
+struct module_state {
+    PyObject *error;
+};
+
+#if PY_MAJOR_VERSION >= 3
+#define GETSTATE(m) ((struct module_state*)PyModule_GetState(m))
+#else
+#define GETSTATE(m) (&_state)
+static struct module_state _state;
+#endif
+
+/* List of methods defined in the module */
+
+static struct PyMethodDef alsaseq_methods[] = {
+	{"client",	(PyCFunction)alsaseq_client,	METH_VARARGS | METH_KEYWORDS,	alsaseq_client__doc__},
+ {"start",	(PyCFunction)alsaseq_default_start,	METH_VARARGS,	alsaseq_start__doc__},
+ {"stop",	(PyCFunction)alsaseq_default_stop,	METH_VARARGS,	alsaseq_stop__doc__},
+ {"status",	(PyCFunction)alsaseq_default_status,	METH_VARARGS,	alsaseq_status__doc__},
+ {"queuetime",	(PyCFunction)alsaseq_default_queuetime,	METH_VARARGS,	alsaseq_queuetime__doc__},
+ {"output",	(PyCFunction)alsaseq_default_output,	METH_VARARGS,	alsaseq_output__doc__},
+ {"output_many",	(PyCFunction)alsaseq_default_output_many,	METH_VARARGS,	alsaseq_output_many__doc__},
+ {"outlast",	(PyCFunction)alsaseq_default_outlast,	METH_VARARGS,	alsaseq_outlast__doc__},
+ {"syncoutput",	(PyCFunction)alsaseq_default_syncoutput,	METH_VARARGS,	alsaseq_syncoutput__doc__},
+ {"connectto",	(PyCFunction)alsaseq_default_connectto,	METH_VARARGS,	alsaseq_connectto__doc__},
+ {"connectfrom",	(PyCFunction)alsaseq_default_connectfrom,	METH_VARARGS,	alsaseq_connectfrom__doc__},
+ {"announce",	(PyCFunction)alsaseq_default_announce,	METH_VARARGS,	alsaseq_announce__doc__},
+ {"portinfo",	(PyCFunction)alsaseq_default_portinfo,	METH_VARARGS,	alsaseq_portinfo__doc__},
+ {"ports",	(PyCFunction)alsaseq_default_ports,	METH_VARARGS,	alsaseq_ports__doc__},
+ {"inputpending",	(PyCFunction)alsaseq_default_inputpending,	METH_VARARGS,	alsaseq_inputpending__doc__},
+ {"id",	(PyCFunction)alsaseq_default_id,	METH_VARARGS,	alsaseq_id__doc__},
+ {"input",	(PyCFunction)alsaseq_default_input,	METH_VARARGS,	alsaseq_input__doc__},
+ {"inevent",	(PyCFunction)alsaseq_default_inevent,	METH_VARARGS,	alsaseq_inevent__doc__},
+ {"inevents",	(PyCFunction)alsaseq_default_inevents,	METH_VARARGS,	alsaseq_inevents__doc__},
+ {"inmidi",	(PyCFunction)alsaseq_default_inmidi,	METH_VARARGS,	alsaseq_inmidi__doc__},
+ {"inmidi_many",	(PyCFunction)alsaseq_default_inmidi_many,	METH_VARARGS,	alsaseq_inmidi_many__doc__},
+ {"outbytes",	(PyCFunction)alsaseq_default_outbytes,	METH_VARARGS,	alsaseq_outbytes__doc__},
+ {"nrpn",	(PyCFunction)alsaseq_default_nrpn,	METH_VARARGS,	alsaseq_nrpn__doc__},
+ {"nrpnforget",	(PyCFunction)alsaseq_default_nrpnforget,	METH_VARARGS,	alsaseq_nrpnforget__doc__},
+ {"inbytes",	(PyCFunction)alsaseq_default_inbytes,	METH_VARARGS,	alsaseq_inbytes__doc__},
+ {"outsysex",	(PyCFunction)alsaseq_default_outsysex,	METH_VARARGS,	alsaseq_outsysex__doc__},
+ {"stats",	(PyCFunction)alsaseq_default_stats,	METH_VARARGS,	alsaseq_stats__doc__},
+ {"filter",	(PyCFunction)alsaseq_default_filter,	METH_VARARGS,	alsaseq_filter__doc__},
+ {"filtered",	(PyCFunction)alsaseq_default_filtered,	METH_VARARGS,	alsaseq_filtered__doc__},
+ {"encode",	(PyCFunction)alsaseq_encode,	METH_VARARGS,	alsaseq_encode__doc__},
+ {"decode",	(PyCFunction)alsaseq_decode,	METH_VARARGS,	alsaseq_decode__doc__},
+ {"fd",	(PyCFunction)alsaseq_default_fd,	METH_VARARGS,	alsaseq_fd__doc__},
+ {"fds",	(PyCFunction)alsaseq_default_fds,	METH_VARARGS,	alsaseq_fds__doc__},
+ {"list",	(PyCFunction)alsaseq_default_list,	METH_VARARGS,	alsaseq_list__doc__},
+ {"routes",	(PyCFunction)alsaseq_default_routes,	METH_VARARGS,	alsaseq_routes__doc__},
+ {"routelsb",	(PyCFunction)alsaseq_default_routelsb,	METH_VARARGS,	alsaseq_routelsb__doc__},
+ {"wait",	(PyCFunction)alsaseq_default_wait,	METH_VARARGS | METH_KEYWORDS,	alsaseq_wait__doc__},
  
 	{NULL,	 (PyCFunction)NULL, 0, NULL}		/* sentinel */
 };
@@ -682,6 +2920,19 @@ initalsaseq(void)
     if (m == NULL)
         INITERROR;
 
+    if (PyType_Ready(&Client_Type) < 0) {
+        Py_DECREF(m);
+        INITERROR;
+    }
+    Py_INCREF(&Client_Type);
+    PyModule_AddObject(m, "Client", (PyObject *)&Client_Type);
+    if (PyType_Ready(&Event_Type) < 0) {
+        Py_DECREF(m);
+        INITERROR;
+    }
+    Py_INCREF(&Event_Type);
+    PyModule_AddObject(m, "Event", (PyObject *)&Event_Type);
+
     /* Add exception */
     struct module_state *st = GETSTATE(m);
     st->error = PyErr_NewException("alsaseq.Error", NULL, NULL);
@@ -698,6 +2949,29 @@ initalsaseq(void)
 
 	/* XXXX Add constants here */
 	#include "constants.c"
+	PyModule_AddIntConstant( m, "INMIDI_FIELDS", INMIDI_FIELDS );
+	PyModule_AddIntConstant( m, "INMIDI_STAMPED_FIELDS", INMIDI_STAMPED_FIELDS );
+	PyModule_AddIntConstant( m, "INBYTES_SYS_FIELDS", INBYTES_SYS_FIELDS );
+	PyModule_AddIntConstant( m, "EVENT_SIZE", sizeof(snd_seq_event_t) );
+	PyModule_AddIntConstant( m, "EVENT_DATA_OFFSET", offsetof(snd_seq_event_t, data) );
+	PyModule_AddIntConstant( m, "ROUTE_DROP", ROUTE_DROP );
+	PyModule_AddIntConstant( m, "ROUTE_PASS", ROUTE_PASS );
+	PyModule_AddIntConstant( m, "ROUTE_CHANNEL", ROUTE_CHANNEL );
+	PyModule_AddIntConstant( m, "ROUTE_CC", ROUTE_CC );
+	PyModule_AddIntConstant( m, "ROUTE_NRPN", ROUTE_NRPN );
+	PyModule_AddIntConstant( m, "ROUTE_PYTHON", ROUTE_PYTHON );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_CAP_READ", SND_SEQ_PORT_CAP_READ );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_CAP_WRITE", SND_SEQ_PORT_CAP_WRITE );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_CAP_SUBS_READ", SND_SEQ_PORT_CAP_SUBS_READ );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_CAP_SUBS_WRITE", SND_SEQ_PORT_CAP_SUBS_WRITE );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_CAP_NO_EXPORT", SND_SEQ_PORT_CAP_NO_EXPORT );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_TYPE_MIDI_GENERIC", SND_SEQ_PORT_TYPE_MIDI_GENERIC );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_TYPE_SYNTH", SND_SEQ_PORT_TYPE_SYNTH );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_TYPE_HARDWARE", SND_SEQ_PORT_TYPE_HARDWARE );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_TYPE_SOFTWARE", SND_SEQ_PORT_TYPE_SOFTWARE );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_TYPE_SYNTHESIZER", SND_SEQ_PORT_TYPE_SYNTHESIZER );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_TYPE_PORT", SND_SEQ_PORT_TYPE_PORT );
+	PyModule_AddIntConstant( m, "SND_SEQ_PORT_TYPE_APPLICATION", SND_SEQ_PORT_TYPE_APPLICATION );
         
 	/* Check for errors */
 	if (PyErr_Occurred())
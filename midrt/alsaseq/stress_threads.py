@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# stress_threads.py - check alsaseq lets other threads run while it waits.
+#  Needs a running ALSA sequencer, it makes its own client and loops our
+#  output port back into our input port, no other midi gear needed.
+#
+#  A reader thread sits in alsaseq.inmidi() (blocking) while a sender
+#  stamps and sends notes to it.  Run it once quiet, then again with a
+#  background CPU thread(zlib, drops the GIL like bank scanning file io
+#  would).  Routing latency should stay about the same, and the background
+#  thread should keep making progress while the reader is blocked.  With
+#  the old alsaseq, the blocked reader holds the GIL and nothing else runs.
+#
+#  usage: python stress_threads.py [num_notes]
+# kbongosmusic at gmail_com - GPLv2
+from __future__ import print_function
+import sys
+import time
+import threading
+import zlib
+
+import alsaseq, alsamidi
+
+#-------------------------------------------
+class Reader(threading.Thread):
+    ' wait for our looped back notes, note the latency of each '
+    def __init__(self, num, sent):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.num = num
+        self.sent = sent # note number -> time sent
+        self.lat = []
+
+    def run(self):
+        while len(self.lat) < self.num:
+            (mtype, ch, note, vel) = alsaseq.inmidi() # blocks, no GIL
+            if mtype != alsaseq.SND_SEQ_EVENT_NOTEON:
+                continue
+            t = self.sent.get(note)
+            if t != None:
+                self.lat.append(time.time() - t)
+
+#-------------------------------------------
+class Burner(threading.Thread):
+    ' background cpu load, count how much work it gets done '
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.count = 0
+        self.running = True
+
+    def run(self):
+        blob = b'midiroute' * 20000
+        while self.running:
+            zlib.compress(blob, 9)
+            self.count += 1
+
+#-------------------------------------------
+def RunPass(num, burn):
+    sent = {}
+    rd = Reader(num, sent)
+    rd.start()
+    bg = None
+    if burn:
+        bg = Burner()
+        bg.start()
+    time.sleep(0.2) # let reader block in inmidi()
+    t0 = time.time()
+    for i in range(num):
+        note = i % 128
+        sent[note] = time.time()
+        alsaseq.output(alsamidi.noteonevent(0, note, 100))
+        time.sleep(0.002) # ~500 notes/sec, keep one in flight
+    rd.join(5.0)
+    secs = time.time() - t0
+    work = 0
+    if bg != None:
+        bg.running = False
+        work = bg.count
+    lat = sorted(rd.lat)
+    if not lat:
+        print('no notes came back, loopback connect failed?')
+        return
+    p50 = lat[len(lat) // 2] * 1e6
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1e6
+    print('%-10s notes:%4d p50:%7.0fus p99:%7.0fus  bg work/sec:%.1f' % (
+        'cpu-load' if burn else 'quiet', len(lat), p50, p99, work / secs))
+
+#-------------------------------------------
+def main():
+    num = 1000
+    if len(sys.argv) > 1:
+        num = int(sys.argv[1])
+    alsaseq.client('stress_threads', 1, 1, False)
+    myid = alsaseq.id()
+    alsaseq.connectto(1, myid, 0) # our output port 1 -> our input port 0
+    RunPass(num, False)
+    RunPass(num, True)
+
+if __name__ == '__main__':
+    main()
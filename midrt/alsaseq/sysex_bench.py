@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# sysex_bench.py - push big sysex dumps through alsaseq and time them.
+#  Needs a running ALSA sequencer, it makes its own client and loops our
+#  output port back into our input port, no other midi gear needed.
+#
+#  outsysex() sends a dump in chunks straight from the caller's buffer,
+#  a reader thread picks the chunks up with inbytes() and puts them back
+#  together from memoryview slices.  Each dump is checked byte for byte
+#  against what was sent, then the rate is printed per dump size.
+#
+#  usage: python sysex_bench.py [dumps_per_size]
+# kbongosmusic at gmail_com - GPLv2
+from __future__ import print_function
+import sys
+import time
+import threading
+import array
+
+import alsaseq
+
+SIZES = (256, 1024, 4096, 16384, 65536)
+
+#-------------------------------------------
+def MakeDump(size, seed):
+    ' f0, size-2 bytes of 7 bit data, f7 '
+    body = bytearray([(seed + i) & 0x7f for i in range(size - 2)])
+    return bytes(bytearray([0xf0]) + body + bytearray([0xf7]))
+
+#-------------------------------------------
+class Reader(threading.Thread):
+    ' put the looped back sysex dumps together, keep them in order '
+    def __init__(self, num):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.num = num
+        self.dumps = []
+        self.chunks = 0
+
+    def run(self):
+        nsf = alsaseq.INBYTES_SYS_FIELDS
+        dump = None
+        while len(self.dumps) < self.num:
+            alsaseq.wait(1000)
+            (midi, sysbuf, stamps, sysex, ends) = alsaseq.inbytes()
+            recs = array.array('i')
+            if hasattr(recs, 'frombytes'):
+                recs.frombytes(sysbuf)
+            else:
+                recs.fromstring(sysbuf)
+            view = memoryview(sysex)
+            for si in range(0, len(recs), nsf):
+                if recs[si+1] != alsaseq.SND_SEQ_EVENT_SYSEX:
+                    continue
+                off = recs[si+3]
+                chunk = view[off:off+recs[si+4]]
+                self.chunks += 1
+                if chunk[0:1].tobytes() == b'\xf0':
+                    dump = bytearray()
+                if dump == None:
+                    continue
+                dump += chunk
+                if chunk[len(chunk)-1:].tobytes() == b'\xf7':
+                    self.dumps.append(bytes(dump))
+                    dump = None
+
+#-------------------------------------------
+def RunSize(size, num):
+    sent = [MakeDump(size, i) for i in range(num)]
+    rd = Reader(num)
+    rd.start()
+    time.sleep(0.1) # let reader block in wait()
+    t0 = time.time()
+    events = 0
+    for dump in sent:
+        events += alsaseq.outsysex(dump)
+    rd.join(10.0)
+    secs = time.time() - t0
+    bad = 0
+    for i in range(len(rd.dumps)):
+        if rd.dumps[i] != sent[i]:
+            bad += 1
+    got = len(rd.dumps) * size
+    print('%6d bytes x%3d  events:%5d chunks in:%5d  bad:%d  %7.2f MB/s' % (
+        size, num, events, rd.chunks, bad + num - len(rd.dumps),
+        got / secs / 1e6))
+
+#-------------------------------------------
+def main():
+    num = 20
+    if len(sys.argv) > 1:
+        num = int(sys.argv[1])
+    alsaseq.client('sysex_bench', 1, 1, False)
+    myid = alsaseq.id()
+    alsaseq.connectto(1, myid, 0) # our output port 1 -> our input port 0
+    for size in SIZES:
+        RunSize(size, num)
+
+if __name__ == '__main__':
+    main()
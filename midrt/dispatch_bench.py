@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# dispatch_bench.py - time the router's per pkt work, the dispatch table
+#  Main.BuildDispatch() makes against the if/elif chain it replaced.
+#  No sequencer or midi gear is needed, output goes to a device that
+#  just counts what it is given.  The built alsaseq is used if there is
+#  one, else fakeseq(as in router_bench), the table and chain only take
+#  its constants and Event so it times the same.
+#
+#  The pkt mix is like a busy keyboard: mostly notes, knob turns, other
+#  CCs and pitch bend.  Both ways run the same pkts on the same Main,
+#  and their output counts are checked to match.  Each is run ROUNDS
+#  times, the best round counts(the others had the machine busy).
+#
+#  usage: python dispatch_bench.py [num_pkts]
+# kbongosmusic at gmail_com - GPLv2
+from __future__ import print_function
+import os
+import sys
+import time
+
+clock = getattr(time, 'perf_counter', time.time)
+ROUNDS = 5
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alsaseq'))
+try:
+    import alsaseq
+    alsaseq.SND_SEQ_EVENT_SENSING # not just the alsaseq/ source dir
+except (ImportError, AttributeError): # not built
+    import fakeseq as alsaseq
+    sys.modules['alsaseq'] = alsaseq # before midiroute imports it
+import midiroute
+from midiroute import pr, MODWHEEL_BANKPROG_KEY_FEATURE, MODWHEEL_TO_PITCH_FEATURE
+from midiroute import KNOB0_CC, KNOB1_CC, KNOB2_CC, KNOB3_CC
+from midiroute import KNOB4_CC, KNOB5_CC, KNOB6_CC, KNOB7_CC
+
+#-------------------------------------------
+class CountDev:
+    ' stands in for MidiDevice, count the writes '
+    def __init__(self):
+        self.count = 0
+        self.lsb = 1
+
+    def Write(self, pkt):
+        self.count += 1
+
+    def WriteMany(self, pkts):
+        self.count += len(pkts)
+
+    def WriteLast(self, mods):
+        self.count += 1
+
+    def WriteNRPN(self, tx_ch, msb, lsb, data_msb, value):
+        self.count += 1
+
+    def EffectLsb(self, lsb=-1):
+        if lsb >= 0:
+            self.lsb = lsb
+        return self.lsb
+
+    def WriteAlsaEvent(self, event):
+        self.count += 1
+
+    def SummaryCC_Desc(self, cc, value):
+        return ''
+
+#-------------------------------------------
+def OldEvent(self, pkt):
+    ' the if/elif chain MidimanToYoshiRouter_Event() was, frozen as is '
+    m_b0 = pkt[0] # rx_ch | midi_ctrl
+    m_b1 = 0
+    m_b2 = 0
+    if len(pkt) > 1:
+        m_b1 = pkt[1] # note or param
+    if len(pkt) > 2:
+        m_b2 = pkt[2] # velocity or value
+
+    rx_ch = m_b0 & 0xf        # The channel in lower first nibble
+    tx_ch = self.mChannel # send channel, send on channel we select
+
+    if (m_b0 & 0xf0) == 0xb0: # CC control message upper nibble
+
+        idxEffectKnob = -1
+        if m_b1 == KNOB0_CC: idxEffectKnob = 0
+        if m_b1 == KNOB1_CC: idxEffectKnob = 1
+        if m_b1 == KNOB2_CC: idxEffectKnob = 2
+        if m_b1 == KNOB3_CC: idxEffectKnob = 3
+        if idxEffectKnob >= 0: # knob 0-3 change CC event?
+            # map them to the 4 yoshi system effects 0 level control
+            effect_num  = 4 # system effect(4=system, 8=insert)
+            effect_index = idxEffectKnob # effect index
+            self.last_sys_effect = effect_index
+            if self.verbose & 1:
+                map_desc = 'system effect level(%d)= %d' % (effect_index+1, m_b2)
+            msb_effect_ctrl = 0 # level(volume, dry/wet)
+            cc_data = m_b2 # route CC data value to new use
+            self.Send_NRPN(tx_ch, effect_num, effect_index,
+                           msb_effect_ctrl, cc_data)
+            if self.verbose & 1:
+                print('map CC %d %d to: ' % (m_b1, m_b2) + map_desc)
+        elif m_b1 == KNOB4_CC:
+            if self.verbose & 1:
+                map_desc = ' master PAN CC-10= %d' % (m_b2)
+            self.mDev.Write([0xb0 | tx_ch, 10, m_b2]) # route to CC-10 PAN(master)
+            if self.verbose & 1:
+                print('map CC-%d %d to PAN CC-10:' % (m_b1, m_b2) + map_desc)
+        elif m_b1 == KNOB5_CC:
+            # this one routes pan based on last first 4 knobs used.
+            # routes pan to that system effect.
+            effect_num  = 4 # system effect(4=system, 8=insert)
+            effect_index = self.last_sys_effect # effect index, last vol chged above
+            if self.verbose & 1:
+                map_desc = ' Effect Pan, System(%d)= %d' % (effect_index+1, m_b2)
+            msb_effect_ctrl = 1 # Pan
+            cc_data = m_b2 # route CC data value to new use
+            self.Send_NRPN(tx_ch, effect_num, effect_index,
+                           msb_effect_ctrl, cc_data)
+            if self.verbose & 1:
+                print('map CC %d %d to: ' % (m_b1, m_b2) + map_desc)
+        elif m_b1 == KNOB6_CC:
+            if self.verbose & 1:
+                map_desc = 'master Yoshi-Portamento CC-65= %d' % (m_b2)
+            # This is digital on/off, > 64 is on, less off
+            self.mDev.Write([0xb0 | tx_ch, 65, m_b2]) # route to CC-65 Yoshi portamento
+            if self.verbose & 1:
+                print('map CC-%d %d to: ' % (m_b1, m_b2) + map_desc)
+        elif m_b1 == KNOB7_CC:
+            # yoshi expression cc-11, seems like same as master volume?
+            #map_desc = 'master Yoshi-Expression CC-11= %d' % (m_b2)
+            #mOut.Write([0xb0 | tx_ch, 11, m_b2]) # route to CC-11 Yoshi portamento
+            if self.verbose & 1:
+                map_desc = 'master Yoshi-Sustain CC-64= %d' % (m_b2)
+            self.mDev.Write([0xb0 | tx_ch, 64, m_b2]) # route to CC-11 Yoshi sustain?
+            if self.verbose & 1:
+                print('map CC-%d %d to: ' % (m_b1, m_b2) + map_desc)
+        else:
+            if m_b1 == 1: # mod wheel
+                if MODWHEEL_BANKPROG_KEY_FEATURE:
+                # mod wheel escape for setting bank/prog selection.
+                # we save last mod value to try out using to set
+                # bank/prog as escape sequence - push mod up > 100
+                # then press a key, then pull mod down < 100
+                # kludgy, don't think I like it very much, but..
+                    was_up = self.last_modwheel > 100
+                    self.last_modwheel = m_b2
+                    if was_up != (self.last_modwheel > 100):
+                        self.UpdateRoutes() # notes to us while up
+                    if self.last_modwheel > 100:
+                        if self.verbose & 2:
+                            pr('Filter Mod-Wheel %d' % (self.last_modwheel))
+                        return True # processed, filter out
+                if MODWHEEL_TO_PITCH_FEATURE:
+                    # mod wheel convert to differential pitch modulation
+                    # make it do what pitch wheel does, but without dead middle spot
+                    diff_mod = m_b2 - self.last_modwheel
+                    self.last_modwheel = m_b2
+                    # pitch value see from -8192 to 8191
+                    self.virtual_pitchval += (diff_mod * 64)
+                    if self.virtual_pitchval > 8191: self.virtual_pitchval = 8191
+                    if self.virtual_pitchval < -8192: self.virtual_pitchval = -8192
+                    ev = alsaseq.Event(alsaseq.SND_SEQ_EVENT_PITCHBEND,
+                                       tx_ch, 0, self.virtual_pitchval)
+                    if self.verbose & 4:
+                        print('made:')
+                        print(ev)
+                    #self.mDev.Write(ev) # send out as pitch wheel control
+                    self.mDev.WriteAlsaEvent(ev)
+                    # put out a pitch wheel change based on mod wheel change
+                    if self.verbose & 2:
+                        pr('Filter Mod-Wheel %d, to pitch %d bend' % (self.last_modwheel, self.virtual_pitchval))
+                    return True # processed, filter out
+
+            if self.pass_thru:
+                if self.verbose & 2:
+                    desc = self.mDev.SummaryCC_Desc(m_b1, m_b2)
+                    print('pass thru CC event:' + desc)
+                #self.mDev.WriteAlsaEvent(alsa_event)
+                self.mDev.WriteLast((tx_ch | 0x10, 0,0,0)) # modify first(channel)
+
+    elif (m_b0 & 0xf0) == 0x80:
+        if self.verbose & 2:
+            print('ch:%d NoteOff:%d Vel:%d' % (rx_ch, m_b1, m_b2))
+        self.mDev.Write([0x80 | tx_ch, m_b1, m_b2])
+    elif (m_b0 & 0xf0) == 0x90:
+        if self.verbose & 2:
+            print('ch:%d NoteOn:%d Vel:%d' % (rx_ch, m_b1, m_b2))
+
+        if MODWHEEL_BANKPROG_KEY_FEATURE:
+            if self.last_modwheel > 100:
+            # using top of modwheel to set program(12 choices)
+                if m_b2 != 0: # velocity: off (only do when key on)
+                    self.key_select = m_b1 % 12 # C-B, 12 choices, any octave
+                    self.ProgBankListSelect(self.key_select)
+                if self.verbose & 2:
+                    pr('Filter Prog Key')
+                return True # processed, don't pass thru, filter
+
+        if MODWHEEL_TO_PITCH_FEATURE:
+            if self.virtual_pitchval != 0:
+                self.virtual_pitchval = 0 # reset it and send out
+                ev = alsaseq.Event(alsaseq.SND_SEQ_EVENT_PITCHBEND,
+                                   tx_ch, 0, self.virtual_pitchval)
+                #self.mDev.Write(ev) # send out as pitch wheel control
+                self.mDev.WriteAlsaEvent(ev)
+                #alsaseq.output(ev)
+                # put out a pitch wheel change based on mod wheel change
+                if self.verbose & 2:
+                    pr('RESET Filter Mod-Wheel %d, to pitch %d bend' % (self.last_modwheel, self.virtual_pitchval))
+
+        if self.pass_thru:
+            if self.verbose & 2:
+                print('pass thru noteon')
+            self.mDev.WriteLast((tx_ch | 0x10, 0,0,0)) # modify first(channel)
+    else:
+        if self.verbose & 1:
+            print('Unhandled event ch:%d Cmd:%d Vel:%d' % (rx_ch, m_b1, m_b2))
+        if self.pass_thru:
+            if self.verbose & 2:
+                print('pass thru event')
+            #self.mDev.WriteAlsaEvent(alsa_event)
+            #self.mDev.Write([0x90 | tx_ch, m_b1, m_b2])
+            self.mDev.WriteLast((tx_ch | 0x10, 0,0,0)) # modify first(channel)
+    return True # processed something
+
+#-------------------------------------------
+def MakePkts(num):
+    ' a busy keyboard, notes, knobs, other CCs, bend.  No mod wheel up. '
+    knobs = (KNOB0_CC, KNOB1_CC, KNOB2_CC, KNOB3_CC,
+             KNOB4_CC, KNOB5_CC, KNOB6_CC, KNOB7_CC)
+    mix = []
+    for i in range(num):
+        n = i % 10
+        if n < 4:
+            mix.append(bytearray([0x90, 36 + i % 48, 100]))
+        elif n < 6:
+            mix.append(bytearray([0x80, 36 + i % 48, 0]))
+        elif n < 8:
+            mix.append(bytearray([0xb0, knobs[i % 8], i % 128]))
+        elif n < 9:
+            mix.append(bytearray([0xb0, 7 + i % 3, i % 128])) # vol, bal, pan
+        else:
+            mix.append(bytearray([0xe0, 0, 64 + i % 8]))
+    return mix
+
+#-------------------------------------------
+def RunPass(name, func, main, pkts):
+    ' func(main, pkt) for each pkt, best of ROUNDS '
+    best = None
+    for r in range(ROUNDS):
+        main.mDev.count = 0
+        t0 = clock()
+        for pkt in pkts:
+            func(main, pkt)
+        secs = clock() - t0
+        if best == None or secs < best:
+            best = secs
+    print('%-6s pkts:%7d  %6.3f sec  %6.2f usec/pkt  out:%d' % (
+          name, len(pkts), best, best * 1e6 / len(pkts), main.mDev.count))
+    return main.mDev.count
+
+#-------------------------------------------
+def main():
+    num = 200000
+    if len(sys.argv) > 1:
+        num = int(sys.argv[1])
+    main = midiroute.Main()
+    main.mDev = CountDev()
+    main.last_sys_effect = 1 # the chain kept it in Main, see EffectLsb()
+    main.BuildDispatch()
+    pkts = MakePkts(num)
+    for i in range(2): # second round is warmed up
+        old = RunPass('chain', OldEvent, main, pkts)
+        new = RunPass('table', midiroute.Main.MidimanToYoshiRouter_Event, main, pkts)
+    if old != new:
+        print('output counts differ!')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,532 @@
+#!/usr/bin/env python
+# fakeseq.py - pure python stand-in for the alsaseq module, no ALSA needed.
+#  Same names as alsaseq for what midiroute uses(Client, client(), inbytes,
+#  inmidi, inputpending, outlast, outbytes, nrpn, output, list, connectto,
+#  connectfrom, wait, ...) and the constants it reads.  Input comes from
+#  Feed() or a recorded stream(Load()), output is kept in Client.sent.
+#
+#  Put it in place of the real one before importing midiroute:
+#     import sys, fakeseq
+#     sys.modules['alsaseq'] = fakeseq
+#
+#  Recorded streams are text, one MIDI message per line:
+#     <seconds> <hex bytes>      e.g.  0.125000 90 3c 64
+#  Save() writes them, Load() reads them back.
+#
+#  routes() rules are run on what is fed as alsaseq runs them, so a Main
+#  with c_routes gives the same Client.sent as one routing all in python.
+#  filter() by event type is run.
+# kbongosmusic at gmail_com - GPLv2
+from __future__ import print_function
+import array
+import collections
+import time
+
+# same values as alsa/seq_event.h
+SND_SEQ_EVENT_SYSTEM = 0
+SND_SEQ_EVENT_RESULT = 1
+SND_SEQ_EVENT_NOTE = 5
+SND_SEQ_EVENT_NOTEON = 6
+SND_SEQ_EVENT_NOTEOFF = 7
+SND_SEQ_EVENT_KEYPRESS = 8
+SND_SEQ_EVENT_CONTROLLER = 10
+SND_SEQ_EVENT_PGMCHANGE = 11
+SND_SEQ_EVENT_CHANPRESS = 12
+SND_SEQ_EVENT_PITCHBEND = 13
+SND_SEQ_EVENT_SONGPOS = 20
+SND_SEQ_EVENT_SONGSEL = 21
+SND_SEQ_EVENT_QFRAME = 22
+SND_SEQ_EVENT_START = 30
+SND_SEQ_EVENT_CONTINUE = 31
+SND_SEQ_EVENT_STOP = 32
+SND_SEQ_EVENT_CLOCK = 36
+SND_SEQ_EVENT_TICK = 37
+SND_SEQ_EVENT_TUNE_REQUEST = 40
+SND_SEQ_EVENT_RESET = 41
+SND_SEQ_EVENT_SENSING = 42
+SND_SEQ_EVENT_CLIENT_START = 60
+SND_SEQ_EVENT_CLIENT_EXIT = 61
+SND_SEQ_EVENT_CLIENT_CHANGE = 62
+SND_SEQ_EVENT_PORT_START = 63
+SND_SEQ_EVENT_PORT_EXIT = 64
+SND_SEQ_EVENT_PORT_CHANGE = 65
+SND_SEQ_EVENT_PORT_SUBSCRIBED = 66
+SND_SEQ_EVENT_PORT_UNSUBSCRIBED = 67
+SND_SEQ_EVENT_SYSEX = 130
+SND_SEQ_EVENT_NONE = 255
+
+SND_SEQ_TIME_STAMP_TICK = 0
+SND_SEQ_TIME_STAMP_REAL = 1 << 0
+SND_SEQ_TIME_MODE_ABS = 0
+SND_SEQ_TIME_MODE_REL = 1 << 1
+
+SND_SEQ_PORT_CAP_READ = 1 << 0
+SND_SEQ_PORT_CAP_WRITE = 1 << 1
+SND_SEQ_PORT_CAP_SUBS_READ = 1 << 5
+SND_SEQ_PORT_CAP_SUBS_WRITE = 1 << 6
+SND_SEQ_PORT_CAP_NO_EXPORT = 1 << 7
+SND_SEQ_PORT_TYPE_MIDI_GENERIC = 1 << 1
+SND_SEQ_PORT_TYPE_APPLICATION = 1 << 20
+
+INMIDI_FIELDS = 4
+INMIDI_STAMPED_FIELDS = 6
+INBYTES_SYS_FIELDS = 5
+
+ROUTE_DROP = 0
+ROUTE_PASS = 1
+ROUTE_CHANNEL = 2
+ROUTE_CC = 3
+ROUTE_NRPN = 4
+ROUTE_PYTHON = 5
+
+RX_RING = 64 # most events one inbytes() hands out
+
+# status byte upper nibble -> event type
+CHANNEL_TYPES = {0x80: SND_SEQ_EVENT_NOTEOFF, 0x90: SND_SEQ_EVENT_NOTEON,
+                 0xa0: SND_SEQ_EVENT_KEYPRESS, 0xb0: SND_SEQ_EVENT_CONTROLLER,
+                 0xc0: SND_SEQ_EVENT_PGMCHANGE, 0xd0: SND_SEQ_EVENT_CHANPRESS,
+                 0xe0: SND_SEQ_EVENT_PITCHBEND}
+SYSTEM_TYPES = {0xf2: SND_SEQ_EVENT_SONGPOS, 0xf3: SND_SEQ_EVENT_SONGSEL,
+                0xf1: SND_SEQ_EVENT_QFRAME, 0xf6: SND_SEQ_EVENT_TUNE_REQUEST,
+                0xf8: SND_SEQ_EVENT_CLOCK, 0xf9: SND_SEQ_EVENT_TICK,
+                0xfa: SND_SEQ_EVENT_START, 0xfb: SND_SEQ_EVENT_CONTINUE,
+                0xfc: SND_SEQ_EVENT_STOP, 0xfe: SND_SEQ_EVENT_SENSING,
+                0xff: SND_SEQ_EVENT_RESET, 0xf0: SND_SEQ_EVENT_SYSEX}
+
+now = getattr(time, 'monotonic', time.time)
+
+#-------------------------------------------
+def PktType(pkt):
+    ' alsa event type of a raw MIDI message '
+    if pkt[0] < 0xf0:
+        return CHANNEL_TYPES.get(pkt[0] & 0xf0, SND_SEQ_EVENT_NONE)
+    return SYSTEM_TYPES.get(pkt[0], SND_SEQ_EVENT_NONE)
+
+#-------------------------------------------
+def SplitPkts(data):
+    ' raw MIDI bytes, one message each, to a list of bytearrays '
+    data = bytearray(data)
+    pkts = []
+    pos = 0
+    while pos < len(data):
+        b0 = data[pos]
+        n = 1
+        if b0 == 0xf0:
+            end = data.find(b'\xf7', pos)
+            n = len(data) - pos
+            if end >= 0:
+                n = end + 1 - pos
+        elif b0 < 0xf0:
+            n = (3, 3, 3, 3, 2, 2, 3)[(b0 >> 4) - 8]
+        elif b0 in (0xf1, 0xf3):
+            n = 2
+        elif b0 == 0xf2:
+            n = 3
+        pkts.append(data[pos:pos+n])
+        pos += n
+    return pkts
+
+#-------------------------------------------
+def PktRecord(pkt):
+    ' (type, channel, param, value) of a raw MIDI message, as inmidi() '
+    mtype = PktType(pkt)
+    n = len(pkt)
+    b1 = n > 1 and pkt[1] or 0
+    b2 = n > 2 and pkt[2] or 0
+    ch = pkt[0] & 0xf
+    if pkt[0] >= 0xf0:
+        return (mtype, 0, b1, b2)
+    if mtype == SND_SEQ_EVENT_PITCHBEND:
+        return (mtype, ch, 0, (b2 << 7 | b1) - 8192)
+    if mtype in (SND_SEQ_EVENT_PGMCHANGE, SND_SEQ_EVENT_CHANPRESS):
+        return (mtype, ch, 0, b1)
+    return (mtype, ch, b1, b2)
+
+#-------------------------------------------
+def Save(path, events):
+    ' write [(seconds, pkt),] as a recorded stream '
+    f = open(path, 'w')
+    for (secs, pkt) in events:
+        f.write('%.6f %s\n' % (secs, ' '.join(['%02x' % b for b in bytearray(pkt)])))
+    f.close()
+
+#-------------------------------------------
+def Load(path):
+    ' read a recorded stream, [(seconds, pkt bytearray),] '
+    events = []
+    for line in open(path):
+        words = line.split()
+        if not words or words[0].startswith('#'):
+            continue
+        events.append((float(words[0]), bytearray([int(w, 16) for w in words[1:]])))
+    return events
+
+#-------------------------------------------
+class Event:
+    ' like alsaseq.Event, just keeps what it was made with '
+    def __init__(self, type=SND_SEQ_EVENT_NONE, channel=0, param=0, value=0):
+        self.type = type
+        self.channel = channel
+        self.param = param
+        self.value = value
+
+    def __repr__(self):
+        return 'fakeseq.Event(%d, %d, %d, %d)' % (self.type, self.channel,
+                                                  self.param, self.value)
+
+#-------------------------------------------
+class Client:
+    ''' a sequencer client with no sequencer.  Feed() it pkts, read them
+        back with inbytes()/inmidi(), what is sent piles up in sent. '''
+    def __init__(self, name, ninputports, noutputports, createqueue,
+                 pool=0, inpool=0, inbuf=0, outbuf=0):
+        self.name = name
+        self.ninputports = ninputports
+        self.noutputports = noutputports
+        self.t0 = now()
+        self.rx = collections.deque() # (arrival secs, pkt, our input port)
+        self.batch = []   # pkts of the last inbytes() batch, for outlast()
+        self.last = None  # newest pkt handed out
+        self.sent = []    # what went out, pkts or Events
+        self.keep_sent = True # False to only count, for long runs
+        self.nsent = 0    # events, so an outbytes() of 4 CCs counts 4
+        self.nsent_port = {} # 0 for our first output port and up -> nsent
+        self.nreceived = 0
+        self.tx_nrpn = {} # (output port, channel) -> [msb, lsb], see nrpn()
+        self.batch_ports = bytearray() # input port of each batch pkt
+        self.drop = set() # filter() event types
+        self.nfiltered = {}
+        self.route_tables = {} # input port -> ({(type, ch, param): rule}, tx port)
+        self.nrpn_lsb = {} # input port -> routelsb()
+        self.connections = []
+
+    #-------------------------------------------
+    # feeding
+    def Feed(self, pkt, secs=None, port=0):
+        ' an event arrives on our input port, secs is its stamp(now if None) '
+        if secs == None:
+            secs = now() - self.t0
+        self.rx.append((secs, bytearray(pkt), port))
+
+    def FeedMany(self, events, port=0):
+        ' [(secs, pkt),] as from Load(), all on one input port '
+        for (secs, pkt) in events:
+            self.rx.append((secs, bytearray(pkt), port))
+
+    def Tx(self, what, n=1, port=-1):
+        self.nsent += n
+        i = self.OutIndex(port)
+        self.nsent_port[i] = self.nsent_port.get(i, 0) + n
+        if self.keep_sent:
+            self.sent.append(what)
+
+    def OutIndex(self, port):
+        ' 0 for our first output port and up, as alsaseq tx_out_index() '
+        port = min(max(port, self.ninputports), self.ninputports + self.noutputports - 1)
+        return port - self.ninputports
+
+    def TrackCC(self, pkt, port):
+        ' NRPN address a sent pkt selects, as alsaseq tx_nrpn_track() '
+        if len(pkt) < 3 or (pkt[0] & 0xf0) != 0xb0:
+            return
+        sel = self.tx_nrpn.setdefault((self.OutIndex(port), pkt[0] & 0xf), [-1, -1])
+        if pkt[1] in (98, 99):
+            sel[pkt[1] == 98] = pkt[2]
+        elif pkt[1] in (100, 101):
+            sel[0] = sel[1] = -1
+
+    def Next(self):
+        ' next unfiltered (secs, pkt), or None '
+        while self.rx:
+            (secs, pkt, port) = self.rx.popleft()
+            self.nreceived += 1
+            mtype = PktType(pkt)
+            if mtype in self.drop:
+                self.nfiltered[mtype] = self.nfiltered.get(mtype, 0) + 1
+                continue
+            if self.Routed(pkt, port):
+                continue
+            self.last = pkt
+            return (secs, pkt, port)
+        return None
+
+    #-------------------------------------------
+    # alsaseq.Client methods
+    def id(self):
+        return 128
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def queuetime(self):
+        t = now() - self.t0
+        return (int(t), int((t - int(t)) * 1e9))
+
+    def connectto(self, myport, client, port):
+        self.connections.append((myport, client, port))
+
+    def connectfrom(self, myport, client, port):
+        self.connections.append((myport, client, port))
+
+    def announce(self, port=0):
+        pass
+
+    def list(self, outflag):
+        return []
+
+    def ports(self):
+        return []
+
+    def portinfo(self, client, port):
+        return None
+
+    def routes(self, rules, inport=-1, outport=-1):
+        ''' as alsaseq, the same checks.  A rule is kept as (action,
+            tx_channel, arg0, arg1, arg2) by (type, channel, param) '''
+        if inport >= self.ninputports:
+            raise ValueError('no such input port')
+        table = {}
+        for n in range(len(rules)):
+            rule = tuple(rules[n])
+            if len(rule) < 4 or len(rule) > 8:
+                raise TypeError('rule should be (type, rx_channel, param, action [, tx_channel, arg0, arg1, arg2])')
+            (mtype, ch, param, action, tx_ch, a0, a1, a2) = rule + (-1, 0, 0, 0)[len(rule) - 4:]
+            if mtype not in CHANNEL_TYPES.values() or not -1 <= ch <= 15 or \
+               not -1 <= param <= 127 or not ROUTE_DROP <= action <= ROUTE_PYTHON or \
+               not -1 <= tx_ch <= 15 or \
+               (action == ROUTE_CC and not 0 <= a0 <= 127) or \
+               (action == ROUTE_NRPN and not (0 <= a0 <= 127 and -1 <= a1 <= 127 and
+                                              0 <= a2 <= 127)):
+                raise ValueError('bad route rule %d' % (n))
+            table[(mtype, ch, param)] = (action, tx_ch, a0, a1, a2)
+        for p in range(self.ninputports):
+            if inport < 0 or p == inport:
+                self.route_tables[p] = (table, outport)
+        return len(rules)
+
+    def Routed(self, pkt, port):
+        ''' run the routes() table of port on a rx pkt, as alsaseq
+            rx_routed().  True if a rule took care of it '''
+        (table, tx_port) = self.route_tables.get(port, (None, -1))
+        if not table or len(pkt) > 3 or pkt[0] >= 0xf0: # 2+ CCs is a REGPARAM
+            return False
+        (mtype, ch, param, value) = PktRecord(pkt)
+        rule = table.get((mtype, ch, param)) or table.get((mtype, ch, -1)) or \
+               table.get((mtype, -1, param)) or table.get((mtype, -1, -1))
+        if rule == None or rule[0] == ROUTE_PYTHON:
+            return False
+        (action, tx_ch, a0, a1, a2) = rule
+        if tx_ch >= 0:
+            ch = tx_ch
+        if action in (ROUTE_PASS, ROUTE_CHANNEL):
+            pkt = bytearray(pkt)
+            if action == ROUTE_CHANNEL:
+                pkt[0] = (pkt[0] & 0xf0) | ch
+            self.TrackCC(pkt, tx_port)
+            self.Tx(bytes(pkt), 1, tx_port)
+        elif action == ROUTE_CC:
+            pkt = bytearray([0xb0 | ch, a0, value])
+            self.TrackCC(pkt, tx_port)
+            self.Tx(bytes(pkt), 1, tx_port)
+        elif action == ROUTE_NRPN:
+            if a1 >= 0:
+                self.nrpn_lsb[port] = a1
+            self.nrpn(ch, a0, self.nrpn_lsb.get(port, 0), a2, value, tx_port)
+        return True # ROUTE_DROP too
+
+    def routelsb(self, inport=-1, lsb=-1):
+        if lsb >= 0:
+            for p in range(self.ninputports):
+                if inport < 0 or p == inport:
+                    self.nrpn_lsb[p] = lsb
+        return self.nrpn_lsb.get(max(inport, 0), 0)
+
+    def filter(self, rules):
+        self.drop = set([r for r in rules if not isinstance(r, tuple)])
+        return len(rules)
+
+    def filtered(self, reset=0):
+        res = sorted(self.nfiltered.items())
+        if reset:
+            self.nfiltered = {}
+        return res
+
+    def stats(self, reset=0):
+        res = (self.nreceived, self.nsent, 0, 0, 0)
+        if reset:
+            self.nreceived = self.nsent = 0
+        return res
+
+    def fd(self):
+        return -1
+
+    def fds(self):
+        return []
+
+    def wait(self, timeout_ms=-1, extra_fds=None):
+        ' never sleeps, a replay is fed up front '
+        return (len(self.rx) > 0, [])
+
+    def inputpending(self):
+        return len(self.rx)
+
+    def input(self):
+        e = self.Next()
+        if e == None:
+            return None
+        (mtype, ch, param, value) = PktRecord(e[1])
+        return (mtype, 0, 0, 0, (0, 0), (0, 0), (0, 0), (ch, param, value))
+
+    def inmidi(self, stamp=0):
+        e = self.Next()
+        if e == None:
+            return (SND_SEQ_EVENT_NONE, 0, 0, 0)
+        rec = PktRecord(e[1])
+        if stamp:
+            return rec + (int(e[0]), int((e[0] - int(e[0])) * 1e9))
+        return rec
+
+    def inbytes(self, max=0, stamp=0, ports=0):
+        ''' up to max events as (midi, sys, stamps, sysex, ends[, ports]),
+            like alsaseq.  Only MIDI pkts are fed, so sys and sysex stay
+            empty.  A pkt fed is one event, several messages(an NRPN's 4
+            CCs) make one like a REGPARAM does. '''
+        if max < 1 or max > RX_RING:
+            max = RX_RING
+        self.batch = []
+        self.batch_ports = bytearray()
+        midi = bytearray()
+        stamps = array.array('i')
+        ends = array.array('i')
+        while len(self.batch) < max:
+            e = self.Next()
+            if e == None:
+                break
+            (secs, pkt, port) = e
+            self.batch.append(pkt)
+            self.batch_ports.append(port)
+            midi.extend(pkt)
+            ends.append(len(midi))
+            if stamp:
+                stamps.append(int(secs))
+                stamps.append(int((secs - int(secs)) * 1e9))
+        if hasattr(stamps, 'tobytes'):
+            (stamps, ends) = (stamps.tobytes(), ends.tobytes())
+        else:
+            (stamps, ends) = (stamps.tostring(), ends.tostring())
+        if ports:
+            return (bytes(midi), b'', stamps, b'', ends, bytes(self.batch_ports))
+        return (bytes(midi), b'', stamps, b'', ends)
+
+    def output(self, event):
+        self.Tx(event)
+
+    def outbytes(self, data, port=-1):
+        pkts = SplitPkts(data)
+        for pkt in pkts:
+            self.TrackCC(pkt, port)
+        self.Tx(bytes(bytearray(data)), len(pkts), port)
+        return len(pkts)
+
+    def nrpn(self, channel, msb, lsb, data_msb, value, port=-1):
+        ' address CCs only when they change, as alsaseq '
+        sel = self.tx_nrpn.get((self.OutIndex(port), channel), [-1, -1])
+        pkts = []
+        if sel[0] != msb or sel[1] != lsb:
+            pkts.append(bytearray([0xb0 | channel, 99, msb]))
+            pkts.append(bytearray([0xb0 | channel, 98, lsb]))
+        pkts.append(bytearray([0xb0 | channel, 6, data_msb]))
+        pkts.append(bytearray([0xb0 | channel, 38, value]))
+        data = bytearray()
+        for pkt in pkts:
+            self.TrackCC(pkt, port)
+            data.extend(pkt)
+        self.Tx(bytes(data), len(pkts), port)
+        return len(pkts)
+
+    def nrpnforget(self, channel=-1, port=-1):
+        for key in [k for k in self.tx_nrpn]: # list() is ours, see the end
+            if (channel < 0 or channel == key[1]) and \
+               (port < 0 or self.OutIndex(port) == key[0]):
+                del self.tx_nrpn[key]
+
+    def outsysex(self, data, chunk=256, port=-1):
+        n = (len(data) + chunk - 1) // chunk
+        self.Tx(bytes(bytearray(data)), n, port)
+        return n
+
+    def outlast(self, mods, index=-1, port=-1):
+        ' resend a rx pkt, mods as alsaseq outlast() '
+        if index < 0:
+            pkt = self.last
+        elif index < len(self.batch):
+            pkt = self.batch[index]
+        else:
+            return
+        if pkt == None:
+            return
+        pkt = bytearray(pkt)
+        nmods = mods[0] >> 4
+        if nmods >= 1 and pkt[0] < 0xf0:
+            pkt[0] = (pkt[0] & 0xf0) | (mods[0] & 0xf)
+        for i in range(1, min(nmods, len(pkt))):
+            pkt[i] = mods[i]
+        self.TrackCC(pkt, port)
+        self.Tx(bytes(pkt), 1, port)
+
+#-------------------------------------------
+# module level, on the client made by client(), like alsaseq
+default_client = None
+
+def client(name, ninputports, noutputports, createqueue, **sizes):
+    global default_client
+    default_client = Client(name, ninputports, noutputports, createqueue, **sizes)
+    return default_client
+
+def inputpending():
+    return default_client.inputpending()
+
+def inmidi(stamp=0):
+    return default_client.inmidi(stamp)
+
+def output(event):
+    return default_client.output(event)
+
+def outlast(mods, index=-1, port=-1):
+    return default_client.outlast(mods, index, port)
+
+def outbytes(data, port=-1):
+    return default_client.outbytes(data, port)
+
+def nrpn(channel, msb, lsb, data_msb, value, port=-1):
+    return default_client.nrpn(channel, msb, lsb, data_msb, value, port)
+
+def nrpnforget(channel=-1, port=-1):
+    return default_client.nrpnforget(channel, port)
+
+def routelsb(inport=-1, lsb=-1):
+    return default_client.routelsb(inport, lsb)
+
+def connectto(myport, client, port):
+    return default_client.connectto(myport, client, port)
+
+def connectfrom(myport, client, port):
+    return default_client.connectfrom(myport, client, port)
+
+#-------------------------------------------
+# id(), input() and list() as plain defs would hide the builtins from every
+# function above, they go in the module dict last, as alsaseq has them.
+# They still hide them at run time, nothing in here calls those bare.
+def ClientId():
+    return default_client.id()
+
+def ClientInput():
+    return default_client.input()
+
+def ClientList(outflag):
+    return default_client.list(outflag)
+
+globals().update({'id': ClientId, 'input': ClientInput, 'list': ClientList})
@@ -22,13 +22,24 @@ from __future__ import print_function
 import os,sys
 import gzip
 #import re
-#import array
+import array
 import time
 import copy
 import atexit
+import functools
 import termios
 import select
 import subprocess
+import threading
+import collections
+import traceback
+import heapq
+import json
+import numbers
+try:
+    import asyncio # -e1 event loop runner, python3
+except ImportError:
+    asyncio = None
 
 import alsaseq, alsamidi
 
@@ -73,6 +84,21 @@ SLIDER5_CC = 85
 SLIDER6_CC = 86
 SLIDER7_CC = 87
 
+# Main.knobs to start with, a -c config "knobs" can move them
+KNOBS = (KNOB0_CC, KNOB1_CC, KNOB2_CC, KNOB3_CC,
+         KNOB4_CC, KNOB5_CC, KNOB6_CC, KNOB7_CC)
+SLIDERS = (SLIDER0_CC, SLIDER1_CC, SLIDER2_CC, SLIDER3_CC,
+           SLIDER4_CC, SLIDER5_CC, SLIDER6_CC, SLIDER7_CC)
+
+# what -d# thins, see Thinner and Main.ThinControllers().  128 is pitch bend.
+THIN_CCS = (1,) + KNOBS + SLIDERS + (128,)
+
+# auto connect, client name substrings ourAlsaIn()/ourAlsaOut() look for.
+#  'idimon', 'onitor', 'midisnoop' are midi monitors, 'fluidSynth' a guess,
+#  'Through Port-0' would take Midi Through too.
+IN_MATCH = ['Keystation', 'Axiom']
+OUT_MATCH = ['yoshimi', 'FLUID', 'idimon', 'onitor', 'midisnoop', 'fluidSynth']
+
 #------------------------
 def runproc(exe_str):
     # run an external program,collect output string
@@ -128,9 +154,15 @@ class Globals:
     # using threads.
     def PollWork(self):
         g = gl()
+        if self.mMain.router != None:
+            # -j1, RouterThread routes, just sleep until a key comes
+            select.select([self.mKeys.fd], [], [])
+            return
         while (self.mMain.MidimanToYoshiRouter_Poll()):
             pass
-        time.sleep(0.001) # sleep 1ms, play nice
+        # sleep until more midi, a key for our_input(), or something due
+        self.mMain.mDev.seq.wait(self.mMain.sched.TimeoutMs(), [self.mKeys.fd])
+        self.mMain.sched.RunDue()
 
 #---------------------------------------
 def KeyExit():
@@ -156,14 +188,11 @@ def ourAlsaIn(alsa_midi_io):
     if a.client_name.find('midiroute') >=0: # it's us!
         return 0 # no
 
-    if a.client_name.find('Keystation') >=0:
-        if verbose & 4:
-            print('Found Keystation Midi to connect as input')
-        return 1 # yes
-    if a.client_name.find('Axiom') >=0:
-        if verbose & 4:
-            print('Found Axiom Midi to connect as input')
-        return 1 # yes
+    for match in IN_MATCH:
+        if a.client_name.find(match) >=0:
+            if verbose & 4:
+                print('Found %s Midi to connect as input' % (match))
+            return 1 # yes
 
     return 0 # no
 
@@ -176,28 +205,11 @@ def ourAlsaOut(alsa_midi_io):
     if a.client_name.find('midiroute') >=0: # it's us!
         return 0 # no
 
-    if a.client_name.find('yoshimi') >=0:
-        if verbose & 4:
-            print('Found Yoshimi to connect as output')
-        return 1 # yes
-    if a.client_name.find('FLUID') >=0:
-        if verbose & 4:
-            print('Found Fluid synth to connect as output')
-        return 1 # yes
-    if (a.client_name.find('idimon') >=0 or
-        a.client_name.find('onitor') >=0 or
-        a.client_name.find('midisnoop') >=0):
-        if verbose & 4:
-            print('Found a Midi Monitor to connect as output')
-        return 1 # yes
-    #if a.client_name.find('Through Port-0') >=0:
-    #    if verbose & 4:
-    #        print('Found a Midi Through to connect as output')
-    #    return 1 # yes
-    if a.client_name.find('fluidSynth') >=0: # guess
-        if verbose & 4:
-            print('Found FluidSynth to connect as output')
-        return 1 # yes
+    for match in OUT_MATCH:
+        if a.client_name.find(match) >=0:
+            if verbose & 4:
+                print('Found %s to connect as output' % (match))
+            return 1 # yes
 
     return 0 # no
 
@@ -207,17 +219,657 @@ class Empty:
     def __init__(self):
         pass
 
+# dropped inside alsaseq by filter(), they never wake us.  -k1 keeps clock.
+NOISE_EVENTS = (alsaseq.SND_SEQ_EVENT_SENSING,
+                alsaseq.SND_SEQ_EVENT_CLOCK, alsaseq.SND_SEQ_EVENT_TICK)
+
+#-------------------------------------------
+class Lane:
+    ''' A pair of our ports, an input and an output, with its own route map
+        and channel, so a keyboard and a synth can be wired up on their own
+        without cross-talk with the rest(-m).  Lane 0 is the one the Main
+        router works, the others pass what comes in on to their output,
+        on their channel, in the alsaseq routes() table for their input
+        port. '''
+    def __init__(self, in_match, out_match, channel=-1):
+        self.in_match = in_match   # string in the client name of inputs
+        self.out_match = out_match # and outputs, to auto connect
+        self.channel = channel # tx channel, -1 keeps the rx one
+        self.mods = (0, 0, 0, 0) # outlast() mods, see Main.LaneEvent()
+        if channel >= 0:
+            self.mods = (channel | 0x10, 0, 0, 0)
+        self.in_port = 0  # our port numbers, set in MidiDevice.Open()
+        self.out_port = 0
+
+    def MatchIn(self, m):
+        return m.client_name.find(self.in_match) >= 0
+
+    def MatchOut(self, m):
+        return m.client_name.find(self.out_match) >= 0
+
+    def RouteRules(self):
+        ' routes() rules for the input port, all of it goes on '
+        action = alsaseq.ROUTE_CHANNEL
+        if self.channel < 0:
+            action = alsaseq.ROUTE_PASS
+        return [(mtype, -1, -1, action, self.channel)
+                for mtype in (alsaseq.SND_SEQ_EVENT_NOTEON,
+                              alsaseq.SND_SEQ_EVENT_NOTEOFF,
+                              alsaseq.SND_SEQ_EVENT_KEYPRESS,
+                              alsaseq.SND_SEQ_EVENT_CONTROLLER,
+                              alsaseq.SND_SEQ_EVENT_PGMCHANGE,
+                              alsaseq.SND_SEQ_EVENT_CHANPRESS,
+                              alsaseq.SND_SEQ_EVENT_PITCHBEND)]
+
+#-------------------------------------------
+class PortTable:
+    ''' Live table of all alsa ports, walked once at startup with
+        alsaseq ports(), then kept up to date from System Announce
+        events(see alsaseq announce()).  Listing and matching ports is a
+        look in our dict, not a sequencer walk.  With auto_conn we also
+        connect to matching clients as they come and go(yoshimi restart,
+        keyboard replug). '''
+    # announce event types we follow, see Announce()
+    EVENTS = (alsaseq.SND_SEQ_EVENT_PORT_START,
+              alsaseq.SND_SEQ_EVENT_PORT_EXIT,
+              alsaseq.SND_SEQ_EVENT_PORT_CHANGE,
+              alsaseq.SND_SEQ_EVENT_PORT_SUBSCRIBED,
+              alsaseq.SND_SEQ_EVENT_PORT_UNSUBSCRIBED)
+    RD = alsaseq.SND_SEQ_PORT_CAP_READ | alsaseq.SND_SEQ_PORT_CAP_SUBS_READ
+    WR = alsaseq.SND_SEQ_PORT_CAP_WRITE | alsaseq.SND_SEQ_PORT_CAP_SUBS_WRITE
+
+    def __init__(self, seq, auto_conn, lanes):
+        self.seq = seq
+        self.auto_conn = auto_conn
+        self.lanes = lanes # [Lane], what of ours to connect things to
+        self.ports = {} # (client_id, port_id) -> Empty with port info
+        self.my_id = seq.id()
+
+    #-------------------------------------------
+    def Scan(self):
+        ' pick up the ports already there, once at startup '
+        for info in self.seq.ports():
+            self.Add(info)
+
+    #-------------------------------------------
+    def Add(self, info):
+        ''' keep a ports()/portinfo() entry, returns the Empty made
+            for it '''
+        m = Empty()
+        (m.client_id, m.port_id, m.client_name, m.port_name, m.caps,
+         m.type, m.read_subs, m.write_subs) = info
+        is_new = (m.client_id, m.port_id) not in self.ports
+        self.ports[(m.client_id, m.port_id)] = m
+        if is_new and self.auto_conn:
+            self.Connect(m)
+        return m
+
+    #-------------------------------------------
+    def Refresh(self, client_id, port_id):
+        ' port came or changed, re-read it '
+        info = self.seq.portinfo(client_id, port_id)
+        if info == None:
+            self.ports.pop((client_id, port_id), None) # gone again already
+            return
+        self.Add(info)
+
+    #-------------------------------------------
+    def Connect(self, m):
+        ''' connect to port m if it is one of ours, to the first -m lane
+            that matches it, else lane 0 by ourAlsaIn()/ourAlsaOut() '''
+        if m.client_id == self.my_id:
+            return
+        if m.caps & alsaseq.SND_SEQ_PORT_CAP_NO_EXPORT:
+            return
+        lanes = self.lanes[1:]
+        if (m.caps & self.RD) == self.RD:
+            lane = None
+            for l in lanes:
+                if l.MatchIn(m):
+                    lane = l
+                    break
+            if lane == None and ourAlsaIn(m):
+                lane = self.lanes[0]
+            if lane != None:
+                print('connect input client %3d %-26s port %d %s' % (m.client_id,m.client_name, m.port_id,m.port_name))
+                self.seq.connectfrom(lane.in_port, # our port
+                                     m.client_id, # 28 for example
+                                     m.port_id) # 0 for example
+        if (m.caps & self.WR) == self.WR:
+            lane = None
+            for l in lanes:
+                if l.MatchOut(m):
+                    lane = l
+                    break
+            if lane == None and ourAlsaOut(m):
+                lane = self.lanes[0]
+            if lane != None:
+                print('connect output client %3d %-26s port %d %s' % (m.client_id,m.client_name, m.port_id,m.port_name))
+                self.seq.connectto(lane.out_port, # our port
+                                   m.client_id, # 28 for example
+                                   m.port_id)   # 0 for example
+
+    #-------------------------------------------
+    def Announce(self, mtype, client_id, port_id, dest):
+        ' follow an announce event, args as from alsaseq inmidi() '
+        if mtype == alsaseq.SND_SEQ_EVENT_PORT_EXIT:
+            m = self.ports.pop((client_id, port_id), None)
+            if m != None and verbose & 2:
+                print('port gone client %3d %-26s port %d %s' % (m.client_id,m.client_name, m.port_id,m.port_name))
+        elif mtype in (alsaseq.SND_SEQ_EVENT_PORT_SUBSCRIBED,
+                       alsaseq.SND_SEQ_EVENT_PORT_UNSUBSCRIBED):
+            # both ends have new subscriptions
+            self.Refresh(client_id, port_id)
+            self.Refresh(dest >> 8, dest & 0xff)
+            if mtype == alsaseq.SND_SEQ_EVENT_PORT_SUBSCRIBED and \
+               client_id == self.my_id:
+                self.seq.nrpnforget(-1, port_id) # new synth, send NRPN address in full
+        else: # PORT_START, PORT_CHANGE
+            self.Refresh(client_id, port_id)
+
+    #-------------------------------------------
+    def List(self, inout):
+        ''' like alsaseq list(), ports we can get input(0) from or output(1)
+            to, as a sorted list of our Empty port entries '''
+        flags = (self.RD, self.WR)[inout]
+        lst = []
+        for key in sorted(self.ports.keys()):
+            m = self.ports[key]
+            if (m.caps & flags) == flags and \
+               not (m.caps & alsaseq.SND_SEQ_PORT_CAP_NO_EXPORT):
+                lst.append(m)
+        return lst
+
+#-------------------------------------------
+# MIDI message length by status byte, see MidiMsgLen()
+MIDI_MSG_LEN = (3, 3, 3, 3, 2, 2, 3) # 0x80 to 0xe0, by upper nibble
+SYS_MSG_LEN = {0xf1: 2, 0xf2: 3, 0xf3: 2} # rest of 0xf1-0xff are 1
+
+def MidiMsgLen(data, pos):
+    ''' length of the MIDI message at data[pos], data a bytearray with no
+        running status(as alsaseq inbytes() gives us) '''
+    b0 = data[pos]
+    if b0 < 0x80:
+        return 1 # lost data byte
+    if b0 < 0xf0:
+        return MIDI_MSG_LEN[(b0 >> 4) - 8]
+    if b0 == 0xf0: # sysex, up to the 0xf7
+        end = data.find(b'\xf7', pos)
+        if end < 0:
+            return len(data) - pos
+        return end - pos + 1
+    return SYS_MSG_LEN.get(b0, 1)
+
+#-------------------------------------------
+def IntArray(buf):
+    ' array of native ints from packed bytes, like alsaseq hands back '
+    a = array.array('i')
+    if hasattr(a, 'frombytes'):
+        a.frombytes(buf)
+    else:
+        a.fromstring(buf) # python 2
+    return a
+
+# monotonic clock for Scheduler, time.time() on python2
+now = getattr(time, 'monotonic', time.time)
+
 #-------------------------------------------
-def AlsaSeq_List(inout):
-    ''' return a list of Alsa IO, either input(0) or output(1) '''
-    ret_list = []
-    # this gets a list of (client_id, port_id, client_name, port_name)
-    lst = alsaseq.list(inout) # 0=inputs, 1=outputs
-    for io_list_entry in lst: # 0=inputs, 1=outputs
-        l = Empty()
-        l.client_id, l.port_id, l.client_name, l.port_name = io_list_entry
-        ret_list.append(l)
-    return ret_list
+class Scheduler:
+    ''' Things to do later(note-offs, delayed program changes, NRPN follow
+        ups), kept in a heap by due time so lots pending stay cheap.  The
+        router loops wait() no longer than TimeoutMs(), then RunDue().
+        Only touched from the routing thread, no lock. '''
+    def __init__(self):
+        self.heap = [] # [due, seq, func, args], func None when cancelled
+        self.seq = 0   # keeps same due time entries in order
+
+    def After(self, secs, func, *args):
+        ' func(*args) secs from now.  Returns an entry for Cancel() '
+        self.seq += 1
+        entry = [now() + secs, self.seq, func, args]
+        heapq.heappush(self.heap, entry)
+        return entry
+
+    def Cancel(self, entry):
+        entry[2] = None # dropped when it comes up
+
+    def TimeoutMs(self):
+        ' ms to the next due entry for wait(), -1 for nothing pending '
+        if not self.heap:
+            return -1
+        return max(0, int((self.heap[0][0] - now()) * 1000.0 + 0.999))
+
+    def RunDue(self):
+        t = now()
+        while self.heap and self.heap[0][0] <= t:
+            (due, seq, func, args) = heapq.heappop(self.heap)
+            if func != None:
+                func(*args)
+
+#-------------------------------------------
+class ThinSlot:
+    ' Thinner state of one channel, controller '
+    def __init__(self, interval, delta):
+        self.interval = interval # min secs between sends
+        self.delta = delta       # min move from the last value sent
+        self.sent = -1e9         # time last sent
+        self.value = None        # value last sent
+        self.held = None         # (pkt, value, handler) suppressed, newest
+        self.moved = 0.0         # time of the last pkt in
+        self.flushing = False    # Flush() is on the Scheduler
+        self.suppressed = 0
+
+#-------------------------------------------
+class Thinner:
+    ''' Thins dense controllers(mod wheel, knobs, sliders, pitch bend)
+        before the router handles them, yoshimi redoes its parameters on
+        each one.  A (channel, controller) with a rule passes at most rate
+        per sec, and only moves of delta or more.  The rest are counted
+        and the newest held, it goes out once the controller has been
+        still a while, so where a gesture ends is exact.  Routing thread
+        only, like the Scheduler the flushes go on. '''
+    BEND = 128 # controller number for pitch bend
+    GAP = 0.03 # secs still that ends a gesture(or the interval if longer)
+
+    def __init__(self, sched, send):
+        self.sched = sched
+        self.send = send # send(handler, pkt) for a held pkt
+        self.rules = {}  # (channel or -1, controller) -> (interval, delta)
+        self.slots = {}  # (channel, controller) -> ThinSlot
+
+    def Set(self, ch, cc, rate, delta):
+        ''' thin controller cc(BEND for pitch bend) on ch(-1 any) to rate
+            per sec(0 no limit), moves of delta(bend in steps of 128) '''
+        interval = 0.0
+        if rate > 0:
+            interval = 1.0 / rate
+        if cc == self.BEND:
+            delta <<= 7
+        self.rules[(ch, cc)] = (interval, delta)
+        self.slots = {} # made again from the rules as pkts come
+
+    def Controllers(self):
+        return set([cc for (ch, cc) in self.rules])
+
+    def Check(self, pkt, cc, value, handler):
+        ' True to handle pkt now, False if it is held or dropped '
+        key = (pkt[0] & 0xf, cc)
+        slot = self.slots.get(key)
+        if slot == None:
+            rule = self.rules.get(key) or self.rules.get((-1, cc))
+            if rule == None:
+                return True
+            slot = self.slots[key] = ThinSlot(*rule)
+        t = now()
+        slot.moved = t
+        if t - slot.sent >= slot.interval and \
+           (slot.value == None or abs(value - slot.value) >= slot.delta):
+            slot.sent = t
+            slot.value = value
+            slot.held = None
+            return True
+        slot.held = (pkt, value, handler)
+        slot.suppressed += 1
+        if not slot.flushing:
+            slot.flushing = True
+            self.sched.After(max(slot.interval, self.GAP), self.Flush, slot)
+        return False
+
+    def Flush(self, slot):
+        ' Scheduler, send the held pkt once the controller is still '
+        wait = max(slot.interval, self.GAP) - (now() - slot.moved)
+        if wait > 0: # still moving, look again later
+            self.sched.After(wait, self.Flush, slot)
+            return
+        slot.flushing = False
+        if slot.held == None:
+            return
+        (pkt, value, handler) = slot.held
+        slot.held = None
+        if value != slot.value:
+            slot.sent = now()
+            slot.value = value
+            self.send(handler, pkt)
+
+    def Text(self, reset=0):
+        ' held back counts, to print, routing thread only like Check() '
+        lines = []
+        for key in sorted(self.slots):
+            slot = self.slots[key]
+            if slot.suppressed:
+                name = 'bend'
+                if key[1] != self.BEND:
+                    name = 'CC-%d' % (key[1])
+                lines.append('  thinned ch:%-2d %-6s %d' % (key[0] + 1, name, slot.suppressed))
+            if reset:
+                slot.suppressed = 0
+        return '\n'.join(lines)
+
+#-------------------------------------------
+# velocity curves for Zone, out = 127 * (vel / 127) ** gamma
+VEL_CURVES = {'lin': 1.0, 'soft': 0.6, 'hard': 1.6}
+
+class Zone:
+    ''' A key range, velocity range of the keyboard played on channels,
+        transposed and with a velocity curve(-z).  Zones that overlap
+        layer, ones side by side split.  Main.BuildDispatch() compiles
+        them into a per key table, see Ev_Zone().  ValueError if out of
+        range, channels 0-15 or -1. '''
+    def __init__(self, lo=0, hi=127, channels=(-1,), transpose=0,
+                 vel_lo=1, vel_hi=127, curve='lin'):
+        if not (0 <= lo <= hi <= 127 and 1 <= vel_lo <= vel_hi <= 127) or \
+           abs(transpose) > 127 or not channels or \
+           min(channels) < -1 or max(channels) > 15:
+            raise ValueError('zone out of range')
+        self.lo = lo
+        self.hi = hi
+        self.channels = channels # -1 for Main.mChannel
+        self.transpose = transpose
+        self.vel_lo = vel_lo
+        self.vel_hi = vel_hi
+        self.curve = curve # VEL_CURVES name, or a gamma number
+        gamma = VEL_CURVES.get(curve, None)
+        if gamma == None:
+            gamma = float(curve)
+        self.vel_map = bytearray(128)
+        for v in range(1, 128):
+            # never 0, that would make it a note off
+            self.vel_map[v] = max(1, min(127, int(127.0 * (v / 127.0) ** gamma + 0.5)))
+
+#-------------------------------------------
+def ParseZone(spec):
+    ''' -z LO-HI:CH[,CH..][:TRANSPOSE[:VLO-VHI[:CURVE]]] to a Zone,
+        channels 1-16, 0 for the one selected.  ValueError if it isn't '''
+    words = spec.split(':')
+    transpose = 0
+    vel_lo = 1
+    vel_hi = 127
+    curve = 'lin'
+    try:
+        (lo, hi) = [int(n) for n in words[0].split('-')]
+        channels = tuple([int(n) - 1 for n in words[1].split(',')])
+        if len(words) > 2 and words[2]:
+            transpose = int(words[2])
+        if len(words) > 3 and words[3]:
+            (vel_lo, vel_hi) = [int(n) for n in words[3].split('-')]
+        if len(words) > 4 and words[4]:
+            curve = words[4]
+        return Zone(lo, hi, channels, transpose, vel_lo, vel_hi, curve)
+    except (ValueError, IndexError):
+        raise ValueError('bad zone %r' % (spec))
+
+#-------------------------------------------
+def CfgInt(value, lo, hi, what):
+    ' a config setting that must be an int lo to hi '
+    if isinstance(value, bool) or not isinstance(value, numbers.Integral) \
+       or value < lo or value > hi:
+        raise ValueError('%s: want a number %d to %d, not %r' % (what, lo, hi, value))
+    return int(value)
+
+#-------------------------------------------
+def CfgList(value, what, size=-1):
+    ' a config setting that must be a list, of size items if given '
+    if not isinstance(value, list) or (size >= 0 and len(value) != size):
+        if size >= 0:
+            raise ValueError('%s: want a list of %d, not %r' % (what, size, value))
+        raise ValueError('%s: want a list, not %r' % (what, value))
+    return value
+
+#-------------------------------------------
+def CfgStr(value, what):
+    if not isinstance(value, (type(''), type(u''))) or not value:
+        raise ValueError('%s: want a string, not %r' % (what, value))
+    return value
+
+#-------------------------------------------
+class RouterConfig:
+    ''' The -c config file, a JSON object of the settings below, any left
+        out stay as they are.  Load() reads and checks it all and compiles
+        it to what Main keeps(tuples, Zones, secs) in settings, so taking it
+        on is just assignments, see Main.ApplyConfig().  Anything wrong and
+        Load() raises ValueError, the settings we had stand.
+          knobs       8 CCs, knob 0-3 effect levels, 4 pan, 5 effect pan,
+                      6 portamento, 7 sustain
+          prog_table  12 [bank, bank name, prog, prog name], key C to B
+                      picks with the mod wheel up
+          inputs, outputs  client name substrings to auto connect to
+          modwheel_bankprog, modwheel_to_pitch  true/false, the MODWHEEL_
+                      features
+          zones       -z specs, [] for none
+          thin        -d [rate, delta], null for none
+          nrpn_window -n ms '''
+    KEYS = ('knobs', 'prog_table', 'inputs', 'outputs', 'modwheel_bankprog',
+            'modwheel_to_pitch', 'zones', 'thin', 'nrpn_window')
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None # (mtime, size) of the file we last read
+        self.settings = {} # key -> compiled value, keys the file gives
+
+    def Stamp(self):
+        ' (mtime, size) of the file, None if it is not there '
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def Load(self):
+        self.stamp = self.Stamp()
+        try:
+            f = open(self.path)
+            try:
+                doc = json.load(f) # ValueError if it doesn't parse
+            finally:
+                f.close()
+        except (IOError, OSError) as e:
+            raise ValueError(str(e))
+        if not isinstance(doc, dict):
+            raise ValueError('want a {} of settings')
+        for key in doc:
+            if key not in self.KEYS:
+                raise ValueError('unknown setting %r' % (key))
+        settings = {}
+        if 'knobs' in doc:
+            knobs = CfgList(doc['knobs'], 'knobs', 8)
+            knobs = tuple([CfgInt(cc, 0, 127, 'knobs') for cc in knobs])
+            if len(set(knobs)) != 8 or 1 in knobs:
+                raise ValueError('knobs: want 8 different CCs, not the mod wheel(1)')
+            settings['knobs'] = knobs
+        if 'prog_table' in doc:
+            table = []
+            for prog in CfgList(doc['prog_table'], 'prog_table', 12):
+                (bn, bs, pn, ps) = CfgList(prog, 'prog_table', 4)
+                table.append((CfgInt(bn, 0, 16383, 'prog_table bank'),
+                              CfgStr(bs, 'prog_table bank name'),
+                              CfgInt(pn, 0, 16383, 'prog_table prog'),
+                              CfgStr(ps, 'prog_table prog name')))
+            settings['prog_table'] = tuple(table)
+        for key in ('inputs', 'outputs'):
+            if key in doc:
+                settings[key] = [CfgStr(match, key) for match in CfgList(doc[key], key)]
+        for key in ('modwheel_bankprog', 'modwheel_to_pitch'):
+            if key in doc:
+                if not isinstance(doc[key], bool):
+                    raise ValueError('%s: want true or false, not %r' % (key, doc[key]))
+                settings[key] = doc[key]
+        if 'zones' in doc:
+            zones = []
+            for spec in CfgList(doc['zones'], 'zones'):
+                zones.append(ParseZone(CfgStr(spec, 'zones')))
+            settings['zones'] = zones
+        if 'thin' in doc:
+            thin = doc['thin']
+            if thin != None:
+                (rate, delta) = CfgList(thin, 'thin', 2)
+                thin = (CfgInt(rate, 0, 100000, 'thin rate'),
+                        CfgInt(delta, 0, 127, 'thin delta'))
+            settings['thin'] = thin
+        if 'nrpn_window' in doc:
+            settings['nrpn_window'] = CfgInt(doc['nrpn_window'], 0, 10000, 'nrpn_window') / 1000.0
+        self.settings = settings
+
+#-------------------------------------------
+class ConfigWatcher(threading.Thread):
+    ''' -c, look at the config file every PERIOD secs.  When it changes
+        Load() it here, off the routing thread, and queue it for
+        Main.CheckConfig() to swap in between pkts.  One that doesn't load
+        is printed and dropped, routing goes on with the last good one. '''
+    PERIOD = 0.5
+
+    def __init__(self, config, main):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.config = config # the RouterConfig last read
+        self.main = main
+
+    def run(self):
+        while 1:
+            time.sleep(self.PERIOD)
+            stamp = self.config.Stamp()
+            if stamp == None or stamp == self.config.stamp:
+                continue # not there(being saved?) or no change
+            cfg = RouterConfig(self.config.path)
+            try:
+                cfg.Load()
+            except ValueError as e:
+                print('config %s not loaded, %s' % (cfg.path, e))
+                self.config.stamp = cfg.stamp # not again till it changes
+                continue
+            self.config = cfg
+            self.main.new_configs.append(cfg) # deque, atomic
+
+# TraceRing record kinds, and the -v bit that has the flusher print them
+T_RX, T_TX, T_MAP, T_PASS, T_DROP, T_PROG = range(6)
+T_NAMES = ('rx', 'tx', 'map', 'pass', 'drop', 'prog')
+T_VERBOSE = (4, 4, 1, 2, 2, 2)
+
+#-------------------------------------------
+class TraceRing:
+    ''' Trace of the MIDI path without print()s on it.  Add() fills the next
+        of a fixed number of preallocated records(time, kind, status,
+        param, value, arg), overwriting the oldest.  A TraceFlusher thread
+        formats and prints new ones for -v, the x key Dump()s the last few.
+        One writer(the routing thread), readers just skip what it lapped. '''
+    def __init__(self, size=4096):
+        self.size = size
+        self.times = array.array('d', [0.0]) * size
+        self.recs = array.array('i', [0]) * (size * 5) # kind, b0, b1, b2, arg
+        self.head = 0    # records ever added, next goes at head % size
+        self.flushed = 0 # head the flusher printed up to
+        self.lost = 0    # records lapped before the flusher got to them
+
+    def Add(self, kind, b0, b1=0, b2=0, arg=0):
+        i = self.head % self.size
+        self.times[i] = now()
+        r = i * 5
+        self.recs[r] = kind
+        self.recs[r+1] = b0
+        self.recs[r+2] = b1
+        self.recs[r+3] = b2
+        self.recs[r+4] = arg
+        self.head += 1
+
+    def AddPkt(self, kind, pkt):
+        ' a MIDI pkt, status byte first '
+        n = len(pkt)
+        self.Add(kind, pkt[0], n > 1 and pkt[1] or 0, n > 2 and pkt[2] or 0)
+
+    def Format(self, n):
+        ' record n(a head count) as a line of text '
+        i = n % self.size
+        r = i * 5
+        (kind, b0, b1, b2, arg) = self.recs[r:r+5]
+        line = '%12.6f %-4s ch:%-2d %02x %3d %3d' % (self.times[i], T_NAMES[kind],
+               (b0 & 0xf) + 1, b0, b1, b2)
+        if kind == T_MAP or kind == T_PROG:
+            line += ' -> %d' % (arg)
+        return line
+
+    def Flush(self, verbose):
+        ' print records added since the last Flush(), those -v asks for '
+        head = self.head
+        if head - self.flushed > self.size:
+            self.lost += head - self.flushed - self.size
+            self.flushed = head - self.size
+        lines = []
+        for n in range(self.flushed, head):
+            if verbose & T_VERBOSE[self.recs[(n % self.size) * 5]]:
+                lines.append(self.Format(n))
+        self.flushed = head
+        if lines:
+            print('\n'.join(lines))
+
+    def Dump(self, count=32):
+        ' print the last count records '
+        head = self.head
+        for n in range(max(0, head - min(count, self.size)), head):
+            print(self.Format(n))
+        print('trace: %d records, %d lost to the flusher' % (head, self.lost))
+
+#-------------------------------------------
+class TraceFlusher(threading.Thread):
+    ' print a TraceRing every so often, off the routing thread '
+    def __init__(self, ring, verbose, period=0.1):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.ring = ring
+        self.verbose = verbose
+        self.period = period
+
+    def run(self):
+        while 1:
+            time.sleep(self.period)
+            self.ring.Flush(self.verbose)
+
+#-------------------------------------------
+class LatencyStats:
+    ''' Histogram of arrival to sent latency(-t1 mode), per MIDI message
+        type.  Bucket b counts latencies under 2**b microseconds, the last
+        one takes everything longer. '''
+    NBUCKETS = 17 # up to 65ms
+    NAMES = {0x80: 'noteoff', 0x90: 'noteon', 0xa0: 'keypress', 0xb0: 'cc',
+             0xc0: 'progchg', 0xd0: 'chanpress', 0xe0: 'pitchbend'}
+
+    def __init__(self):
+        self.Clear()
+
+    def Clear(self):
+        self.hist = {} # MIDI status(no channel) -> [count per bucket]
+        self.worst = {} # MIDI status -> worst latency, usec
+
+    #-------------------------------------------
+    def Record(self, mtype, secs):
+        us = int(secs * 1e6)
+        if us < 0:
+            us = 0
+        h = self.hist.get(mtype)
+        if h == None:
+            h = self.hist[mtype] = [0] * self.NBUCKETS
+            self.worst[mtype] = 0
+        h[min(us.bit_length(), self.NBUCKETS - 1)] += 1
+        if us > self.worst[mtype]:
+            self.worst[mtype] = us
+
+    #-------------------------------------------
+    def Text(self):
+        ' the histograms, to print '
+        if not self.hist:
+            return 'no latency stats, run with -t1'
+        lines = []
+        for mtype in sorted(self.hist.keys()):
+            h = self.hist[mtype]
+            total = sum(h)
+            lines.append('%s: %d events, worst %dus' % (
+                self.NAMES.get(mtype, 'status %02x' % (mtype)), total, self.worst[mtype]))
+            for b in range(self.NBUCKETS):
+                if h[b]:
+                    if b < self.NBUCKETS - 1:
+                        label = '<%dus' % (1 << b)
+                    else:
+                        label = '>=%dus' % (1 << (b - 1))
+                    lines.append('  %9s %6d %s' % (label, h[b], '#' * (1 + h[b] * 40 // total)))
+        return '\n'.join(lines)
 
 #-------------------------------------------
 def usage():
@@ -229,11 +881,53 @@ def usage():
           -p0    turn off pass thru(series) device(notes, some CC's)
           -v#    verbose level flags, 0=off, 1=min, 3=more, 7=lots
           -a0    turn off auto connect base on string matches
+          -r0    route everything in python, no alsaseq routes() table
+                 (slower, but -v1 shows every knob mapping)
+          -t1    time stamp midi in, and keep latency stats of the python
+                 hop, see t key
+          -e1    run on an asyncio event loop(python3), not our own wait()
+          -x#    keep a trace of the last # pkts in and out(4096), see x
+                 key.  -v prints it from a background thread
+          -j1    route on its own thread, the console can't hold up notes
+          -k1    keep MIDI clock, pass it thru(dropped in alsaseq by default)
+          -d#,#  thin mod wheel, knobs, sliders and pitch bend to # per sec
+                 and moves of # or more, the last value still goes out.
+                 See s key for how many were held back
+          -mIN:OUT[:#]  another lane, an input, output port pair of our own
+                 that clients named with IN connect to, and OUT ones from.
+                 All of it goes on, on channel #(1-16, default as is).
+                 Say -mAxiom:FLUID:1 and the Axiom plays FluidSynth, the
+                 rest still go to yoshimi.  Up to 3
+          -zLO-HI:CH[,CH][:TRANSPOSE[:VLO-VHI[:CURVE]]]  a keyboard zone,
+                 keys LO to HI play on channels CH(1-16, 0 the selected
+                 one), TRANSPOSE semitones, for velocities VLO to VHI,
+                 thru CURVE lin, soft, hard or a gamma number.  Give
+                 several, side by side they split, on top they layer.
+                 -z0-59:2:12 -z60-127:0 -z60-127:3::100-127
+          -n#    send each knob NRPN at most once per # ms, the latest value
+                 wins(those knobs then go thru python)
+          -cFILE config file, JSON, knobs, favorite programs, auto connect
+                 names, features, zones, thin, see RouterConfig.  Saved
+                 changes are taken on while running, a bad one is printed
+                 and ignored.  midiroute.json has the defaults
+          -b#,#,#,#  sequencer pool, inpool(events), inbuf, outbuf(bytes)
+                 sizes, 0 for the ALSA default.  See s key for overruns
 
   ''')
     sys.exit(1)
 
 #-------------------------------------------
+#-------------------------------------------
+def ArgInts(s, lo, hi, n_min=1, n_max=1):
+    ' option value, n_min to n_max #,# numbers lo to hi, else usage() '
+    try:
+        nums = [int(nstr) for nstr in s.split(',')]
+    except ValueError:
+        usage()
+    if len(nums) < n_min or len(nums) > n_max or min(nums) < lo or max(nums) > hi:
+        usage()
+    return nums
+
 #-------------------------------------------
 class KeyInput:
     def __init__(self):
@@ -316,6 +1010,119 @@ class KeyInput:
         print() # cr
         return instr
 
+#-------------------------------------------
+class RouterThread(threading.Thread):
+    ''' -j1, the MIDI path on its own thread, which owns the sequencer input.
+        The console Post()s commands, (func, args), that run here between
+        pkts, so nothing it does(menus, disk scans, prompts) holds up a
+        note.  deque append()/popleft() are atomic, no lock needed, and a
+        byte down a pipe wakes us out of wait(). '''
+    def __init__(self, main):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.main = main
+        self.cmds = collections.deque()
+        (self.wake_r, self.wake_w) = os.pipe()
+        self.running = True
+
+    def Post(self, func, *args):
+        ' run func(*args) on the router thread '
+        self.cmds.append((func, args))
+        os.write(self.wake_w, b'x')
+
+    def Ask(self, func, *args):
+        ' Post() func(*args) and wait for what it returns '
+        done = threading.Event()
+        res = []
+        def Answer():
+            try:
+                res.append(func(*args))
+            finally:
+                done.set()
+        self.Post(Answer)
+        done.wait(2.0)
+        if not res:
+            return 'no answer from the router thread'
+        return res[0]
+
+    def Stop(self):
+        self.Post(self.Quit)
+        self.join(1.0)
+
+    def Quit(self):
+        self.running = False
+
+    def run(self):
+        m = self.main
+        while self.running:
+            midi_ready, woke = m.mDev.seq.wait(m.sched.TimeoutMs(), [self.wake_r])
+            m.sched.RunDue()
+            if woke:
+                os.read(self.wake_r, 512)
+            while self.cmds:
+                (func, args) = self.cmds.popleft()
+                try:
+                    func(*args)
+                except Exception:
+                    traceback.print_exc() # keep routing
+            while (m.MidimanToYoshiRouter_Poll()):
+                pass
+
+#-------------------------------------------
+class AsyncRunner:
+    ''' -e1, run Main on an asyncio loop instead of MidimanToYoshiRouter_Loop().
+        The sequencer fds and stdin are add_reader()s, so routing, keys and
+        anything else put on self.loop(call_later() timers, network control)
+        share one loop, all woken by the kernel, nothing polled.
+        our_input() prompts still sit in Globals.PollWork() till answered. '''
+    def __init__(self, main):
+        self.main = main
+        self.loop = None
+        self.fds = [] # what we add_reader()ed, to take back off
+        self.timer = None # loop call_later() for the next Scheduler entry
+
+    def Run(self):
+        m = self.main
+        k = gl().mKeys
+        k.kb_raw() # so we have k.fd to watch
+        self.loop = asyncio.new_event_loop()
+        self.fds = m.mDev.seq.fds() + [k.fd]
+        for fd in self.fds[:-1]:
+            self.loop.add_reader(fd, self.MidiReady)
+        self.loop.add_reader(k.fd, self.KeyReady)
+        self.MidiReady() # anything that came before the readers
+        try:
+            self.loop.run_forever()
+        finally:
+            for fd in self.fds:
+                self.loop.remove_reader(fd)
+            self.loop.close()
+
+    def MidiReady(self):
+        ' sequencer readable.  wait(0) has filter() and routes() go first '
+        m = self.main
+        midi_ready, ready = m.mDev.seq.wait(0)
+        if midi_ready:
+            while (m.MidimanToYoshiRouter_Poll()):
+                pass
+        self.Tick()
+
+    def KeyReady(self):
+        if not self.main.HandleKey():
+            self.loop.stop()
+        self.Tick()
+
+    def Tick(self):
+        ' run what is due on the Scheduler, and be back for the next one '
+        sched = self.main.sched
+        sched.RunDue()
+        if self.timer != None:
+            self.timer.cancel()
+            self.timer = None
+        ms = sched.TimeoutMs()
+        if ms >= 0:
+            self.timer = self.loop.call_later(ms / 1000.0, self.Tick)
+
 #-------------------------------------------
 #-------------------------------------------
 class MidiDevice:
@@ -323,8 +1130,26 @@ class MidiDevice:
         self.mChannel = 0 # raw channel, displayed is +1
         self.mBank = 5
         self.mProg = 1
-        self.last_alsaseq_pkt = None # hack, for output event making
+        self.seq = None    # our alsaseq.Client, made in Open()
+        self.ports = None  # PortTable, made in Open()
+        self.stamp = 0     # -t1, time stamp rx events, for latency stats
+        self.sizes = []    # -b, pool, inpool, inbuf, outbuf for alsaseq.Client
+        self.keep_clock = 0 # -k1, don't filter() out MIDI clock
+        self.rx_type = 0   # MIDI status(no channel) of the last pkt read
+        self.rx_time = 0.0 # queue time it arrived, when stamping
+        self.latency = LatencyStats()
+        self.sysex = None  # bytearray, sysex dump being put together
+        self.sysex_dump = None # function(dump) for each whole sysex dump in
+        self.rx_index = -1 # alsaseq rx event last read, see WriteLast()
+        self.replay = None # pkt WriteLast() sends, for ones no longer in
+                           # the alsaseq rx ring(Thinner held it) or one
+                           # of several an rx event made(REGPARAM)
+        self.rx_rest = None # ReadMidiMany() batch ReadMidi() is handing out
+        self.lanes = [Lane(None, None)] # lane 0, Main's, then any -m ones
+        self.rx_port = 0   # our input port the last pkt came in on, the
+                           # lanes index
         self.verbose = 0   # -v1 basic, -v3 loud, -v7 louder
+        self.trace = None  # TraceRing, -x or -v, pkts in and out go in it
         self.pass_thru = 1 # true to act as a router of everything else
                            # like notes, and CC's we don't act on
         self.auto_midi_conn = 1 # true to connect based on string match
@@ -336,64 +1161,65 @@ class MidiDevice:
         dest_list is a list of dest ports to connect to.  From -o#,#,
         '''
         print('opening alsaseq client')
-        junk_None = alsaseq.client(
-           'midiroute', # name of virtual client
-           1, #num in ports
-           1, #num out ports
-           False) # create_queue Y/N - rx buf?
+        sizes = dict(zip(('pool', 'inpool', 'inbuf', 'outbuf'), self.sizes))
+        nlanes = len(self.lanes)
+        for i in range(nlanes): # inputs are ports 0.., outputs after them
+            self.lanes[i].in_port = i
+            self.lanes[i].out_port = nlanes + i
+        try:
+            self.seq = alsaseq.Client(
+               'midiroute', # name of virtual client
+               nlanes, #num in ports
+               nlanes, #num out ports
+               bool(self.stamp), # create_queue Y/N - rx time stamps
+               **sizes)
+        except (IOError, ValueError) as e:
+            print('fail! %s' % (str(e)))
+            return False # no open
+        if self.stamp:
+            self.seq.start() # queue time starts now
+        self.EffectLsb(1) # knob 5 pans system effect 1 till knob 0-3 move
 
         # there is also connectto(), connectfrom() funcs...
         # these appear to be for connecting client() to other ports
 
-        # following input port, output port appear to be 0 for input,
-        # 1 for output.
+        # -i, -o go to lane 0, our input port 0 and first output port
         for src_i in src_list:
             print('in:%d' % (src_i))
-            alsaseq.connectfrom(0, # input port
+            self.seq.connectfrom(self.lanes[0].in_port, # input port
                                 src_i, # src client
                                 0) # src port
 
         for dest_i in dest_list:
             print('out:%d' % (dest_i))
-            alsaseq.connectto(1, # output port(first one of ours?)
+            self.seq.connectto(self.lanes[0].out_port, # output port
                               dest_i, # dest client
                               0) # dest port
 
         # connect ins and outs based on string comparisons:
         # see ourAlsaIn()/Out() above for setting your string connect matches
         #if len(src_list) == 0 and len(dest_list) == 0:
-        if self.auto_midi_conn: # -a[0|1] option, default 1 on
-            print('scanning Alsa Midi Inputs')
-            lst = AlsaSeq_List(0) # list inputs(Midi Keys for ex)
-            for m in lst:
-                if ourAlsaIn(m):
-                    print('connect input client %3d %-26s port %d %s' % (m.client_id,m.client_name, m.port_id,m.port_name))
-                    alsaseq.connectfrom(m.port_id, # our port, first input is 0
-                                        m.client_id, # 28 for example
-                                        m.port_id) # 0 for example
-            print('scanning Alsa Midi Outputs')
-            lst = AlsaSeq_List(1) # list outputs(synth ex)
-            for m in lst:
-                if ourAlsaOut(m):
-                    print('connect output client %3d %-26s port %d %s' % (m.client_id,m.client_name, m.port_id,m.port_name))
-                    alsaseq.connectto(1, # our first output port is 1 now
-                                        m.client_id, # 28 for example
-                                        m.port_id)   # 0 for example
-
-        # how do we tell if successful?  This is returning None?
-        #   it calls exit(1) if fails, I guess client is not expected
-        #   to fail...
+        # after the first scan, we hear of port changes on our input port,
+        # and connect to new ones then.
+        self.ports = PortTable(self.seq,
+                               self.auto_midi_conn, # -a[0|1] option, default 1 on
+                               self.lanes)
+        self.seq.announce() # before Scan(), so no port slips by
+        if self.keep_clock:
+            self.seq.filter([alsaseq.SND_SEQ_EVENT_SENSING])
+        else:
+            self.seq.filter(NOISE_EVENTS)
+        print('scanning Alsa Midi Inputs and Outputs')
+        self.ports.Scan()
+
         self.mDevIn = True
-        if self.mDevIn != None:
-            return True # ok
-        print('fail!')
-        return False # no open
+        return True # ok
 
     #-------------------------------------------
     # Read a single alsa event, reconstruct to MIDI where approriate
     def JUNK_OLD_Read(self):
         # read the alsa event
-        ev = alsaseq.input()
+        ev = self.seq.input()
         (mtype, flags, tag, queue, m_time, src, dest, mdata) = ev
 
         if mtype == alsaseq.SND_SEQ_EVENT_SENSING: #42: # tick?  get about 3 per second
@@ -412,13 +1238,13 @@ class MidiDevice:
                 print('noteon unexpected len:%d' % (len(mdata)))
             if self.verbose & 2:
                 print('ch:%d noteon:%d vel:%d' % (b0, b1, b2))
-            return (ev, b0 | 0x80, b1, b2, b3)
+            return (ev, b0 | 0x90, b1, b2, b3)
         elif mtype == alsaseq.SND_SEQ_EVENT_NOTEOFF: #7:
             if len(mdata) != 5:
                 print('noteoff unexpected len:%d' % (len(mdata)))
             if self.verbose & 2:
                 print('ch:%d noteoff:%d vel:%d' % (b0, b1, b2))
-            return (ev, b0 | 0x90, b1, b2, b3)
+            return (ev, b0 | 0x80, b1, b2, b3)
         elif mtype == alsaseq.SND_SEQ_EVENT_CONTROLLER: #10:
             if len(mdata) != 6:
                 print('cc unexpected len:%d' % (len(mdata)))
@@ -455,106 +1281,191 @@ class MidiDevice:
 
     #-------------------------------------------
     def ReadMidi(self):
-        ''' Read a single alsa event, reconstruct to MIDI where approriate
-            modified alsaseq input to just get info we need '''
-        # read the alsa event
-        ev = alsaseq.inmidi() # 
-        (mtype, rx_ch, note_param, vel_ctrl) = ev
+        ''' The next MIDI pkt, None if there is none, it doesn't wait.  A
+            batch is read as in ReadMidiMany() and the pkts after this one
+            kept for the next calls, so don't mix the two. '''
+        if self.rx_rest != None:
+            for pkt in self.rx_rest:
+                return pkt
+        self.rx_rest = self.ReadMidiMany()
+        for pkt in self.rx_rest:
+            return pkt
+        self.rx_rest = None
+        return None
 
-        if mtype == alsaseq.SND_SEQ_EVENT_SENSING: #42: # tick?  get about 3 per second
-            return None # ignore for now, filter these out quitely.
+    #-------------------------------------------
+    def ReadMidiMany(self, max=0):
+        ''' Drain all pending alsa events in one alsaseq call(up to max, 0
+            for as many as it can), and yield them as raw MIDI pkts,
+            bytearrays with status byte first.  Sysex goes to SysexIn(),
+            other events with no MIDI form to SysEvent(), active sensing is
+            skipped. '''
+        multi = len(self.lanes) > 1
+        res = self.seq.inbytes(max, self.stamp, multi)
+        (midi, sysbuf, stampbuf, sysex, endbuf) = res[:5]
+        if multi:
+            inports = bytearray(res[5])
+        midi = bytearray(midi)
+        sys_recs = IntArray(sysbuf)
+        stamps = IntArray(stampbuf)
+        ends = IntArray(endbuf) # where each event's MIDI ends in midi
+        nsf = alsaseq.INBYTES_SYS_FIELDS
+        si = 0 # next sys_recs entry
+        pos = 0
+        for index in range(len(ends)): # position in batch, for WriteLast()
+            if multi:
+                self.rx_port = inports[index]
+            if si < len(sys_recs) and sys_recs[si] == index:
+                if sys_recs[si+1] == alsaseq.SND_SEQ_EVENT_SYSEX:
+                    off = sys_recs[si+3]
+                    self.SysexIn(memoryview(sysex)[off:off+sys_recs[si+4]])
+                else:
+                    self.SysEvent(sys_recs[si+1], sys_recs[si+2], sys_recs[si+3], sys_recs[si+4])
+                si += nsf
+                continue
+            # mostly one message, a CONTROL14 or (NON)REGPARAM event is 2-4
+            # CCs, WriteLast() sends those on as the pkt, not the event again
+            split = ends[index] - pos > MidiMsgLen(midi, pos)
+            while pos < ends[index]:
+                n = MidiMsgLen(midi, pos)
+                pkt = midi[pos:pos+n]
+                pos += n
+                self.rx_index = index
+                self.replay = None
+                if split:
+                    self.replay = pkt
+                if pkt[0] == 0xfe: # active sensing, filter() should have it
+                    continue # filter these out quitely.
+                self.rx_type = pkt[0]
+                if pkt[0] < 0xf0:
+                    self.rx_type = pkt[0] & 0xf0
+                if self.stamp:
+                    self.rx_time = stamps[2*index] + stamps[2*index+1] * 1e-9
+                if self.trace != None:
+                    self.trace.AddPkt(T_RX, pkt)
+                yield pkt
+        self.replay = None
 
-        if self.verbose & 4:
-            print(mtype, rx_ch, note_param, vel_ctrl)
-            # need to debug,understand, print it.
-        # there is just a NOTE ev, why?  would I see this ever?
-        if mtype == alsaseq.SND_SEQ_EVENT_NOTEON: #6:
-            if self.verbose & 2:
-                print('ch:%d noteon:%d vel:%d' % (rx_ch, note_param, vel_ctrl))
-            return (rx_ch | 0x80, note_param, vel_ctrl)
-        elif mtype == alsaseq.SND_SEQ_EVENT_NOTEOFF: #7:
-            if self.verbose & 2:
-                print('UNEXPECTED: ch:%d noteoff:%d vel:%d' % (rx_ch, note_param, vel_ctrl))
-            return (rx_ch | 0x90, note_param, vel_ctrl)
-        elif mtype == alsaseq.SND_SEQ_EVENT_CONTROLLER: #10:
-            if self.verbose & 2:
-                print('ch:%d cc:%d val:%d' % (rx_ch, note_param, vel_ctrl))
-            return (rx_ch | 0xb0, note_param, vel_ctrl)
-        elif mtype == alsaseq.SND_SEQ_EVENT_PGMCHANGE: #?:
-            if self.verbose & 2:
-                print('ch:%d progchg:%d val:%d' % (rx_ch, note_param, vel_ctrl))
-            return (rx_ch | 0xc0, note_param, vel_ctrl)
+    #-------------------------------------------
+    def StatsText(self, reset=0):
+        ' alsaseq event counts, see -b to size things if overruns show up '
+        (rx, tx, overrun, dropped, blocked) = self.seq.stats(reset)
+        lines = ['events in:%d out:%d  overrun:%d dropped:%d blocked:%d' % (
+                 rx, tx, overrun, dropped, blocked)]
+        names = dict([(getattr(alsaseq, k), k[14:]) for k in dir(alsaseq)
+                      if k.startswith('SND_SEQ_EVENT_')])
+        for (mtype, count) in self.seq.filtered(reset):
+            lines.append('  filtered %-10s %d' % (names.get(mtype, mtype), count))
+        return '\n'.join(lines)
 
-        elif mtype == alsaseq.SND_SEQ_EVENT_PITCHBEND: # 13:
-            if self.verbose & 2:
-                print('ch:%d pitch_chg:%d val:%d' % (rx_ch, note_param, vel_ctrl))
-            return (rx_ch | 0xe0, note_param, vel_ctrl)
-        else:
-            if self.verbose & 2:
-                print('Unhandled alsaseq pkt type:%d' % (mtype))
-            if self.verbose & 2:
-                print('ch:%d note_param:%d val:%d' % (rx_ch, note_param, vel_ctrl))
-            return (rx_ch | 0xf0, note_param, vel_ctrl)
-        return None
+    #-------------------------------------------
+    def SysexIn(self, data):
+        ''' a piece of sysex, data a memoryview on what alsaseq read.  With
+            pass_thru it goes straight back out, no copy.  The pieces are
+            put together into whole dumps for sysex_dump(), if set. '''
+        if self.pass_thru: # out the lane it came in on
+            self.seq.outsysex(data, 256, self.lanes[self.rx_port].out_port)
+        if self.sysex_dump == None or len(data) == 0:
+            return
+        if data[0:1].tobytes() == b'\xf0': # start of a dump
+            self.sysex = bytearray()
+        if self.sysex == None:
+            return # missed the start of this one
+        self.sysex += data
+        if data[len(data)-1:].tobytes() == b'\xf7': # end of it
+            dump = self.sysex
+            self.sysex = None
+            self.sysex_dump(dump)
+
+    #-------------------------------------------
+    def SysEvent(self, mtype, rx_ch, param, value):
+        ' an alsa event with no MIDI form, args as from alsaseq inmidi() '
+        if mtype in PortTable.EVENTS:
+            self.ports.Announce(mtype, rx_ch, param, value)
+        elif self.verbose & 2:
+            print('Unhandled alsaseq event type:%d ch:%d param:%d val:%d' % (mtype, rx_ch, param, value))
+
+    #-------------------------------------------
+    def RecordLatency(self):
+        ''' -t1 mode, we are done with the last event read, note how long
+            since it arrived '''
+        (sec, nsec) = self.seq.queuetime()
+        self.latency.Record(self.rx_type, sec + nsec * 1e-9 - self.rx_time)
 
     #-------------------------------------------
     def WriteAlsaEvent(self, event):
-        ''' write raw alsa event '''
+        ''' write raw alsa event, an alsaseq.Event or input() tuple '''
         # swap out and send on our selected channel
         #event[7][0] = (event[7][0] & 0xf0) | self.mChannel
         #nope, it's a tuple... can't modify
-        alsaseq.output(event)
+        self.seq.output(event)
 
     #-------------------------------------------
-    def Write(self, pkt):
-        # work in progress, alsa event handling is very complex...
-        # there are helper functions in alsaseq - alsamidi module.
-        if self.last_alsaseq_pkt:
-            # just copy from last in pkt, reverse src,dest
-            # this is just a quick hack workaround.
-            dest = self.last_alsaseq_pkt[5] # src
-            src = self.last_alsaseq_pkt[6] # dest
-        else:
-            # otherwise punt, try setting them to (0,0).
-            src = (0,0)
-            dest = (0,0)
-
-        if (pkt[0] & 0xf0) == 0x80: # NoteOn
-            alsa_pkt = (alsaseq.SND_SEQ_EVENT_NOTEON, # mtype
-              0, 0, 253, # flags, tag, queue
-              (0,0), # m_time
-              src, # src
-              dest, # dest
-              (pkt[0] & 0xf, pkt[1], pkt[2], 0, 100)) # mdata
-            alsaseq.output(alsa_pkt)
-            if self.verbose & 4:
-                print('tried sending alsa note on')
-        elif (pkt[0] & 0xf0) == 0xb0: # CC
-            alsa_pkt = (alsaseq.SND_SEQ_EVENT_CONTROLLER, # mtype
-              0, 0, 253, # flags, tag, queue
-              (0,0), # m_time
-              src, # src
-              dest, # dest
-              (pkt[0] & 0xf, 0, 0, 0, pkt[1], pkt[2])) # mdata: ? ? ? ctrl-num, value
-                #(1, 0, 0, 0, pkt[1], pkt[2])) # mdata: ? ? ? ctrl-num, value
-            alsaseq.output(alsa_pkt)
-            if self.verbose & 4:
-                print('tried sendin alsa cc %02x %02x' % (pkt[1], pkt[2]))
-        elif (pkt[0] & 0xf0) == 0xc0: # program change
-            alsa_pkt = (alsaseq.SND_SEQ_EVENT_PGMCHANGE, # mtype
-              0, 0, 253, # flags, tag, queue
-              (0,0), # m_time
-              src, # src
-              dest, # dest
-              (pkt[0] & 0xf, 0, 0, 0, 0, pkt[1])) # mdata: ? ? ? ctrl-num, value
-                #(1, 0, 0, 0, 0, pkt[1])) # mdata: ? ? ? ctrl-num, value
-            alsaseq.output(alsa_pkt)
-            if self.verbose & 4:
-                print('tried sendin alsa prog %02x' % (pkt[1]))
-        else:
-            print('todo: send alsaseq')
-            print(pkt)
-            return False
+    def SetRoutes(self, rules, lanes=True):
+        ''' load alsaseq routes() table of lane 0, events matching a rule
+            are routed inside alsaseq and we never see them.  The -m lanes
+            get theirs too, with lanes true, or come up to Main.LaneEvent() '''
+        lane = self.lanes[0]
+        n = self.seq.routes(rules, lane.in_port, lane.out_port)
+        for lane in self.lanes[1:]:
+            lane_rules = []
+            if lanes:
+                lane_rules = lane.RouteRules()
+            self.seq.routes(lane_rules, lane.in_port, lane.out_port)
+        if self.verbose & 2:
+            print('loaded %d alsaseq routes' % (n))
+
+    #-------------------------------------------
+    def EffectLsb(self, lsb=-1):
+        ''' the system effect knob 5 pans, the last of knob 0-3 moved.  Kept
+            in alsaseq(routelsb()), the routes() rules and python routing
+            the knobs share it.  lsb 0-127 sets it. '''
+        return self.seq.routelsb(-1, lsb)
+
+    #-------------------------------------------
+    def WriteLast(self, mods, port=-1):
+        ''' resend the rx event last handed out by ReadMidi()/ReadMidiMany(),
+            mods as in self.seq.outlast(), from our output port(-1 lane 0's).
+            With replay set, that pkt is sent instead. '''
+        if self.replay != None:
+            pkt = bytearray(self.replay)
+            nmods = mods[0] >> 4
+            if nmods >= 1 and pkt[0] < 0xf0:
+                pkt[0] = (pkt[0] & 0xf0) | (mods[0] & 0xf)
+            for i in range(1, min(nmods, len(pkt))):
+                pkt[i] = mods[i]
+            return self.Write(pkt, port)
+        self.seq.outlast(mods, self.rx_index, port)
+
+    #-------------------------------------------
+    def Write(self, pkt, port=-1):
+        ' send a MIDI pkt '
+        return self.WriteMany([pkt], port)
+
+    #-------------------------------------------
+    def WriteMany(self, pkts, port=-1):
+        ''' send several MIDI pkts in one go, they get to the synth
+            together(one drain in alsaseq).  port as in WriteLast() '''
+        data = bytearray()
+        for pkt in pkts:
+            data.extend(pkt)
+            if self.trace != None:
+                self.trace.AddPkt(T_TX, pkt)
+        self.seq.outbytes(data, port)
+        return True
+
+    #-------------------------------------------
+    def WriteNRPN(self, tx_ch, msb, lsb, data_msb, value):
+        ''' send a NRPN, alsaseq leaves out the 99, 98 address CCs when
+            tx_ch has that address selected already '''
+        n = self.seq.nrpn(tx_ch, msb, lsb, data_msb, value)
+        if self.trace != None:
+            if n == 4:
+                self.trace.Add(T_TX, 0xb0 | tx_ch, 99, msb)
+                self.trace.Add(T_TX, 0xb0 | tx_ch, 98, lsb)
+            self.trace.Add(T_TX, 0xb0 | tx_ch, 6, data_msb)
+            self.trace.Add(T_TX, 0xb0 | tx_ch, 38, value)
+        return True
 
     #-------------------------------------------
     # Return a summary description short string of CC control bytes
@@ -616,7 +1527,7 @@ class MidiDevice:
     #-------------------------------------------
     def Poll(self):
         ' returns True if input event pending, otherwise False if nothing '
-        return alsaseq.inputpending()
+        return self.seq.inputpending()
         # future: returns true on note on's or ctrl msgs we care about
         #return alsaseq.in_note_ctrl()
 
@@ -630,13 +1541,39 @@ class Main:
         self.pass_thru = 1
         self.yoshiBank = None
         self.auto_midi_conn = 1
-        self.last_sys_effect = 1 # remember last changed system effect(first 4 knob)
-                                 # and route knob 5(pan) to this effect
+        self.c_routes = 1 # use alsaseq routes() table for fixed mappings
+        self.stamp = 0 # -t1 latency stats
+        self.sizes = [] # -b sequencer pool, buffer sizes
+        self.keep_clock = 0 # -k1 pass MIDI clock thru
+        self.aio = 0 # -e1 run on an asyncio loop, see AsyncRunner
+        self.threaded = 0 # -j1 route on a RouterThread
+        self.router = None # the RouterThread, with -j1
+        self.sched = Scheduler() # things to do later, on the routing thread
+        self.trace_size = 0 # -x# trace records to keep
+        self.trace = None # TraceRing, with -x or -v, see x key
+        self.nrpn_window = 0.0 # -n# secs, one NRPN per address per window
+        self.nrpn_sent = {}    # (tx_ch, msb, lsb, data_msb) -> time last sent
+        self.nrpn_pending = {} # same key -> value waiting out the window
+        self.nrpn_coalesced = 0 # values replaced by a newer one, see s key
+        self.thin = Thinner(self.sched, self.ThinSend) # -d rules
+        self.thin_args = None # -d (rate, delta), see SetThin()
+        self.lanes = [] # -m Lanes, more input/output port pairs
+        self.zones = [] # -z Zones, splits and layers of the notes
+        self.zone_keys = None # [key] -> zone entries, BuildDispatch()
+        self.zone_on = {} # rx channel, key -> note offs its note on needs
+        self.knobs = KNOBS # the 8 knob CCs
+        self.modwheel_bankprog = MODWHEEL_BANKPROG_KEY_FEATURE
+        self.modwheel_pitch = MODWHEEL_TO_PITCH_FEATURE
+        self.config_path = None # -c config file
+        self.config = None # the RouterConfig we route by
+        self.new_configs = collections.deque() # from ConfigWatcher, see CheckConfig()
         self.last_modwheel = 0 # used to escape the keyboard, use keys
                                  # for controls under certain conditions
 
         self.virtual_pitchval = 0 # +- our virtual pitchwheel value
         self.key_select = -1 # last bank/prog select from list
+        self.dispatch = None # [status >> 4][param] -> handler, BuildDispatch()
+        self.pass_mods = (0x10, 0,0,0) # WriteLast() mods, BuildDispatch()
 
         self.cmdargs = ''
         self.options = '' # -oSTRING
@@ -678,6 +1615,37 @@ class Main:
             print('setting yosh ctrl channel to:%d' % (self.mChannel))
             y.mChannel = self.mChannel # set, this is set to last event channel seen
 
+    #---------------------------------------------------
+    def Do(self, func, *args):
+        ' func(*args) from the console, on the RouterThread when -j1 '
+        if self.router != None:
+            self.router.Post(func, *args)
+        else:
+            func(*args)
+
+    #---------------------------------------------------
+    def Ask(self, func, *args):
+        ''' Do() and wait for what func returns, for the console to read
+            (and reset) what the router owns, the text of it to print '''
+        if self.router != None:
+            return self.router.Ask(func, *args)
+        return func(*args)
+
+    #---------------------------------------------------
+    def PlayNote(self, note_num, velocity, duration):
+        ' note on now, note off duration secs later off the Scheduler '
+        self.mDev.Write([0x90 | self.mChannel, note_num, velocity])
+        self.sched.After(duration, self.mDev.Write,
+                         [0x80 | self.mChannel, note_num, 0])
+
+    #---------------------------------------------------
+    def SetChannel(self, ch):
+        self.mChannel = ch
+        self.yoshiBank.mChannel = self.mChannel
+        pr('change to channel:%d' % (self.mChannel+1))
+        self.UpdateRoutes()
+        self.BuildDispatch() # pass_mods, zones on the selected channel follow
+
     #---------------------------------------------------
     def keymenu(self, c):
         g = gl()
@@ -698,14 +1666,12 @@ class Main:
                 num = yoshibanks.GetNum(s)
                 if num >= 0:
                     num = int(s)
-                    self.yoshiBank.setBank(num)
+                    self.Do(self.yoshiBank.setBank, num)
         elif c == 'c':
             s = k.our_input('Select a channel(1-16):')
             if s:
                 num = yoshibanks.GetNum(s)
-                self.mChannel = num-1 # use zero indexing for channel
-                self.yoshiBank.mChannel = self.mChannel
-                pr('change to channel:%d' % (self.mChannel+1))
+                self.Do(self.SetChannel, num-1) # use zero indexing for channel
         elif c >= 'd' and c <= 'e':
             # select next/prev bank/prog from list
             if c == 'd':
@@ -716,7 +1682,7 @@ class Main:
                self.key_select += 1
                if self.key_select > 11:
                  self.key_select = 0
-            self.ProgBankListSelect(self.key_select)
+            self.Do(self.ProgBankListSelect, self.key_select)
             self.yoshiBank.PrintChanSettings() # show bank/prog selection
         elif c == 'l':
             # list alsa midi ins/outs
@@ -725,15 +1691,16 @@ class Main:
                 os.system('aconnect -i')
                 print('******* aconnect -o OUTPUTS:')
                 os.system('aconnect -o')
-            print('** alsaseq INPUTS:')
-            lst = alsaseq.list(0)
-            for (client_id, port_id, client_name, port_name) in lst:
-                print('client %3d %-26s port %d %s' % (client_id,client_name, port_id,port_name))
-            print('** alsaseq OUTPUTS:')
-            lst = alsaseq.list(1)
-            #print(lst)
-            for (client_id, port_id, client_name, port_name) in lst:
-                print('client %3d %-26s port %d %s' % (client_id,client_name, port_id,port_name))
+            print(self.Ask(self.PortsText))
+        elif c == 't':
+            print(self.Ask(self.LatencyText))
+        elif c == 's':
+            print(self.Ask(self.StatsText))
+        elif c == 'x':
+            if self.trace != None:
+                self.trace.Dump()
+            else:
+                print('no trace, run with -x or -v')
         elif c == 'p':
             self.readYoshiBankInfo()
             self.yoshiBank.PrintProgSelection()
@@ -742,15 +1709,13 @@ class Main:
                 num = yoshibanks.GetNum(s)
                 if num >= 0:
                     num = int(s)
-                    self.yoshiBank.setProg(num)
+                    self.Do(self.yoshiBank.setProg, num)
 
         elif c >= '0' and c <= '9':
             num = ord(c) - ord('0')
             if num == 0:
                 num = 10 # typically drums are channel 10
-            self.mChannel = num-1 # use zero indexing for channel
-            self.yoshiBank.mChannel = self.mChannel
-            pr('change to channel:%d' % (self.mChannel+1))
+            self.Do(self.SetChannel, num-1) # use zero indexing for channel
         elif c == 'd':
             s = k.our_input('Enter a num:')
             if s:
@@ -760,17 +1725,10 @@ class Main:
             # do a cheap keyboard with these capital chars
             note_num = 45 + ord(c) - ord('A') # 45 is A(3?)
             velocity = 100
-            duration = 0.01
+            duration = 0.5
             if verbose & 1:
                 pr('playing ch:%d note:%d vel:%d %0.1f sec' % (self.mChannel+1, note_num, velocity, duration))
-            pkt = [0x80 | self.mChannel, # NoteOn Midi(0x80)
-                   note_num,
-                   velocity # velocity(0-127)
-                  ]
-            self.mDev.Write(pkt)
-            time.sleep(duration) # quick and simple, play note for 1 second
-            pkt[2] = 0 # velocity, note-off when 0
-            self.mDev.Write(pkt)
+            self.Do(self.PlayNote, note_num, velocity, duration)
         elif c == 'z':
             # this is going away, for newer state-machine method(b,p)
             self.readYoshiBankInfo()
@@ -780,6 +1738,40 @@ class Main:
             k.kb_raw()
 
 
+    #---------------------------------------------------
+    def PortsText(self):
+        ' l key, the PortTable, what Announce() keeps it up to date with '
+        lines = ['** alsaseq INPUTS:']
+        for m in self.mDev.ports.List(0):
+            lines.append('client %3d %-26s port %d %s' % (m.client_id,m.client_name, m.port_id,m.port_name))
+            for (client_id, port_id) in m.read_subs:
+                lines.append('    -> %d:%d' % (client_id, port_id))
+        lines.append('** alsaseq OUTPUTS:')
+        for m in self.mDev.ports.List(1):
+            lines.append('client %3d %-26s port %d %s' % (m.client_id,m.client_name, m.port_id,m.port_name))
+            for (client_id, port_id) in m.write_subs:
+                lines.append('    <- %d:%d' % (client_id, port_id))
+        return '\n'.join(lines)
+
+    #---------------------------------------------------
+    def LatencyText(self):
+        ' t key, and start over, next t shows what came since '
+        text = self.mDev.latency.Text()
+        self.mDev.latency.Clear()
+        return text
+
+    #---------------------------------------------------
+    def StatsText(self):
+        ' s key, counts since the last s '
+        lines = [self.mDev.StatsText(1)]
+        if self.nrpn_window:
+            lines.append('NRPN values coalesced:%d' % (self.nrpn_coalesced))
+            self.nrpn_coalesced = 0
+        thin = self.thin.Text(1)
+        if thin:
+            lines.append(thin)
+        return '\n'.join(lines)
+
     #---------------------------------------------------
     def MidimanToYoshiRouter_ShowMenuHelp(self):
         print('''ESC to exit.
@@ -788,6 +1780,9 @@ b - see/set yoshi bank
 c - see/set channel
 l - list midi ins/outs
 p - see/set yoshi program
+t - latency stats(-t1) since last t
+s - event counts, overruns, drops, filtered since last s
+x - the last 32 trace records(-x or -v)
 0 to 9 - set channel(where 0 is 10)
 A to Z - caps, use as cheap virtual keyboard(play a note)
 l - list midi devices
@@ -814,45 +1809,221 @@ l - list midi devices
     def MidimanToYoshiRouter_Loop(self):
         g = gl()
         k = g.mKeys
+        k.kb_raw() # so we have k.fd to wait on
         while 1:
-            c = k.getkey()
-            if c != None:
-                cn = ord(c[0:1])
-                if cn == 0xa or cn == 0xd: # we see 0xa(lf)
-                    #pr('cn %x' % (cn))
-                    #pr('last key:' + k.getlastkey())
-                    if k.getlastkey() == 'q':
-                        pr('bye, hope you had fun!')
-                        return
-                if cn == 0x1b:
-                        # make sure it's not esc sequence, like Fx keys, etc.
-                    c = k.getkey()
-                    if c == None:
-                        print('exiting ESC')
-                        s = k.our_input('quit?(y/n):')
-                        if s == 'y':
-                            return
-                    else:
-                        # print the funny esc sequence
-                        keystr = '1b '
-                        while c != None:
-                            keystr += '%x ' % (ord(c))
-                            c = k.getkey()
-                        print('unhandled keycode sequence:%s' % (keystr))
-                else:
-                    self.keymenu(c)
+            # sleep until midi or a keypress arrives, no busy polling.
+            midi_ready, keys_ready = self.mDev.seq.wait(self.sched.TimeoutMs(), [k.fd])
+            self.sched.RunDue()
+            if keys_ready and not self.HandleKey():
+                return
             while (self.MidimanToYoshiRouter_Poll()):
                 pass
-            time.sleep(0.0010) # sleep 1ms, play nice
+
+    #---------------------------------------------------
+    def MidimanToYoshiRouter_Threaded(self):
+        ' -j1, route on a RouterThread, this thread only runs the console '
+        k = gl().mKeys
+        k.kb_raw() # so we have k.fd to wait on
+        self.readYoshiBankInfo() # disk scan now, not on the router later
+        if hasattr(sys, 'setswitchinterval'):
+            sys.setswitchinterval(0.0005) # console hands the GIL over sooner
+        self.router = RouterThread(self)
+        self.router.start()
+        while 1:
+            select.select([k.fd], [], [])
+            if not self.HandleKey():
+                break
+        self.router.Stop()
+        self.router = None
+
+    #---------------------------------------------------
+    def HandleKey(self):
+        ' a key is waiting, act on it.  Returns False to quit '
+        k = gl().mKeys
+        c = k.getkey()
+        if c != None:
+            cn = ord(c[0:1])
+            if cn == 0xa or cn == 0xd: # we see 0xa(lf)
+                #pr('cn %x' % (cn))
+                #pr('last key:' + k.getlastkey())
+                if k.getlastkey() == 'q':
+                    pr('bye, hope you had fun!')
+                    return False
+            if cn == 0x1b:
+                    # make sure it's not esc sequence, like Fx keys, etc.
+                c = k.getkey()
+                if c == None:
+                    print('exiting ESC')
+                    s = k.our_input('quit?(y/n):')
+                    if s == 'y':
+                        return False
+                else:
+                    # print the funny esc sequence
+                    keystr = '1b '
+                    while c != None:
+                        keystr += '%x ' % (ord(c))
+                        c = k.getkey()
+                    print('unhandled keycode sequence:%s' % (keystr))
+            else:
+                self.keymenu(c)
+        return True
+
+    #---------------------------------------------------
+    def RouterTable(self):
+        ''' Rules for alsaseq.routes(), the fixed mappings of
+        MidimanToYoshiRouter_Event() done in C so the note path never goes
+        thru python.  Anything stateful is left for python. '''
+        rules = []
+        if not self.c_routes:
+            return rules
+        tx_ch = self.mChannel
+        CC = alsaseq.SND_SEQ_EVENT_CONTROLLER
+        # knob 0-3 to the 4 yoshi system effects(4) level(0) NRPN,
+        # knob 5 to pan(1) of the last of those used.
+        # With -n they come to us instead, for Send_NRPN() to coalesce.
+        knobs = self.knobs[0:4]
+        for effect_index in range(len(knobs)):
+            if self.nrpn_window:
+                rules.append((CC, -1, knobs[effect_index], alsaseq.ROUTE_PYTHON))
+            else:
+                rules.append((CC, -1, knobs[effect_index], alsaseq.ROUTE_NRPN,
+                              tx_ch, 4, effect_index, 0))
+        if self.nrpn_window:
+            rules.append((CC, -1, self.knobs[5], alsaseq.ROUTE_PYTHON))
+        else:
+            rules.append((CC, -1, self.knobs[5], alsaseq.ROUTE_NRPN, tx_ch, 4, -1, 1))
+        rules.append((CC, -1, self.knobs[4], alsaseq.ROUTE_CC, tx_ch, 10)) # PAN
+        rules.append((CC, -1, self.knobs[6], alsaseq.ROUTE_CC, tx_ch, 65)) # porta
+        rules.append((CC, -1, self.knobs[7], alsaseq.ROUTE_CC, tx_ch, 64)) # sustain
+        if not self.pass_thru:
+            return rules + self.ThinRules()
+
+        # pass thru the rest on our channel
+        for mtype in (alsaseq.SND_SEQ_EVENT_KEYPRESS, CC,
+                      alsaseq.SND_SEQ_EVENT_PGMCHANGE,
+                      alsaseq.SND_SEQ_EVENT_CHANPRESS,
+                      alsaseq.SND_SEQ_EVENT_PITCHBEND):
+            rules.append((mtype, -1, -1, alsaseq.ROUTE_CHANNEL, tx_ch))
+        if self.modwheel_bankprog or self.modwheel_pitch:
+            rules.append((CC, -1, 1, alsaseq.ROUTE_PYTHON)) # we watch it
+        notes_to_us = self.modwheel_pitch or self.zones or \
+            (self.modwheel_bankprog and self.last_modwheel > 100)
+        if not notes_to_us:
+            for mtype in (alsaseq.SND_SEQ_EVENT_NOTEON,
+                          alsaseq.SND_SEQ_EVENT_NOTEOFF):
+                rules.append((mtype, -1, -1, alsaseq.ROUTE_CHANNEL, tx_ch))
+        return rules + self.ThinRules()
+
+    #---------------------------------------------------
+    def ThinRules(self):
+        ' routes() rules sending what the Thinner thins up to us, go last '
+        rules = []
+        for (ch, cc) in sorted(self.thin.rules):
+            if cc == Thinner.BEND:
+                rules.append((alsaseq.SND_SEQ_EVENT_PITCHBEND, ch, -1,
+                              alsaseq.ROUTE_PYTHON))
+            else:
+                rules.append((alsaseq.SND_SEQ_EVENT_CONTROLLER, ch, cc,
+                              alsaseq.ROUTE_PYTHON))
+        return rules
+
+    #---------------------------------------------------
+    def UpdateRoutes(self):
+        ' rebuild alsaseq routes() table, after channel or mode changes '
+        if self.mDev != None:
+            self.mDev.SetRoutes(self.RouterTable(), self.c_routes)
+
+    #---------------------------------------------------
+    def ThinControllers(self):
+        ' what -d thins, THIN_CCS with our knobs '
+        return (1,) + tuple(self.knobs) + SLIDERS + (Thinner.BEND,)
+
+    #---------------------------------------------------
+    def SetThin(self):
+        ''' a Thinner for thin_args on ThinControllers(), anything the old
+            one holds it still flushes '''
+        thin = Thinner(self.sched, self.ThinSend)
+        if self.thin_args != None:
+            (rate, delta) = self.thin_args
+            for cc in self.ThinControllers():
+                thin.Set(-1, cc, rate, delta)
+        self.thin = thin
+
+    #---------------------------------------------------
+    def ApplyConfig(self, cfg):
+        ''' take on a loaded RouterConfig, on the routing thread between
+            pkts.  It is all checked and compiled already, here it is
+            assignments and a BuildDispatch() that makes its table aside
+            and puts it in with one, so the next pkt routes all new. '''
+        global IN_MATCH, OUT_MATCH
+        c = cfg.settings
+        if 'knobs' in c:
+            self.knobs = c['knobs']
+        if 'prog_table' in c:
+            self.prog_table = c['prog_table']
+        if 'inputs' in c:
+            IN_MATCH = c['inputs'] # ports that come from now on
+        if 'outputs' in c:
+            OUT_MATCH = c['outputs']
+        if 'modwheel_bankprog' in c:
+            self.modwheel_bankprog = c['modwheel_bankprog']
+        if 'modwheel_to_pitch' in c:
+            self.modwheel_pitch = c['modwheel_to_pitch']
+        if 'zones' in c:
+            self.zones = c['zones'] # zone_on keeps the note offs owed
+        if 'nrpn_window' in c:
+            self.nrpn_window = c['nrpn_window']
+        if 'thin' in c:
+            self.thin_args = c['thin']
+        if 'thin' in c or 'knobs' in c:
+            self.SetThin()
+        self.config = cfg
+        if self.dispatch != None: # routing already, else Run() builds them
+            self.BuildDispatch()
+            self.UpdateRoutes()
+
+    #---------------------------------------------------
+    def CheckConfig(self):
+        ' Scheduler, swap in the last config ConfigWatcher loaded, if any '
+        cfg = None
+        while self.new_configs:
+            cfg = self.new_configs.popleft()
+        if cfg != None:
+            self.ApplyConfig(cfg)
+            print('config %s loaded' % (cfg.path))
+        self.sched.After(ConfigWatcher.PERIOD, self.CheckConfig)
 
     #---------------------------------------------------
     def Send_NRPN(self, tx_ch, effect_num, effect_index,
                                    msb_effect_ctrl, cc_data):
-        ' Send a NRPN midi message '
-        self.mDev.Write([0xb0 | tx_ch, 99,effect_num]) # MSB NRPN
-        self.mDev.Write([0xb0 | tx_ch, 98, effect_index]) # LSB NRPN
-        self.mDev.Write([0xb0 | tx_ch, 6,  msb_effect_ctrl])
-        self.mDev.Write([0xb0 | tx_ch, 38, cc_data])
+        ''' Send a NRPN midi message, the CCs go out together, the address
+            ones only when it changes(see MidiDevice.WriteNRPN()).  With -n
+            a knob turned faster than nrpn_window sends the latest value
+            once the window is up, the ones between are dropped. '''
+        if self.nrpn_window > 0:
+            key = (tx_ch, effect_num, effect_index, msb_effect_ctrl)
+            if key in self.nrpn_pending: # FlushNRPN() already on the way
+                self.nrpn_pending[key] = cc_data
+                self.nrpn_coalesced += 1
+                return
+            t = now()
+            wait = self.nrpn_sent.get(key, -self.nrpn_window) + self.nrpn_window - t
+            if wait > 0:
+                self.nrpn_pending[key] = cc_data
+                self.sched.After(wait, self.FlushNRPN, key)
+                return
+            self.nrpn_sent[key] = t
+        self.mDev.WriteNRPN(tx_ch, effect_num, effect_index,
+                            msb_effect_ctrl, cc_data)
+
+    #---------------------------------------------------
+    def FlushNRPN(self, key):
+        ' window is up, Scheduler sends the latest value Send_NRPN() kept '
+        cc_data = self.nrpn_pending.pop(key)
+        self.nrpn_sent[key] = now()
+        (tx_ch, effect_num, effect_index, msb_effect_ctrl) = key
+        self.mDev.WriteNRPN(tx_ch, effect_num, effect_index,
+                            msb_effect_ctrl, cc_data)
 
     #---------------------------------------------------
     def ProgBankListSelect(self, key_select):
@@ -863,6 +2034,12 @@ l - list midi devices
         pr('switch to %d %d.%s %d.%s' % (key_select, bn,bs, pn,ps))
         self.yoshiBank.sendBankProgSelect(self.mChannel, bn, pn)
 
+    #---------------------------------------------------
+    def SysexDump(self, dump):
+        ' -v1, note each sysex dump that comes in '
+        print('sysex dump %d bytes: %s ...' % (len(dump),
+              ' '.join(['%02x' % b for b in dump[0:8]])))
+
     #---------------------------------------------------
     def MidimanToYoshiRouter_Poll(self):
         ' Router, worker, poll often, so we do not have to use threads ;)'
@@ -871,163 +2048,267 @@ l - list midi devices
             return False # no midi events, nothing processed
 
         #print('got a midi event!')
-        pkt = self.mDev.ReadMidi() # read only 1 message at a time
-        if pkt == None:
-            # ignore bogus(alsaseq giving 3 odd pkts per sec)
-            return True # processed something
-        m_b0 = pkt[0] # rx_ch | midi_ctrl
-        m_b1 = pkt[1] # note or param
-        m_b2 = pkt[2] # velocity or value
-
-        rx_ch = m_b0 & 0xf        # The channel in lower first nibble
-        tx_ch = self.mChannel # send channel, send on channel we select
-
-        if (m_b0 & 0xf0) == 0xb0: # CC control message upper nibble
-
-            idxEffectKnob = -1
-            if m_b1 == KNOB0_CC: idxEffectKnob = 0
-            if m_b1 == KNOB1_CC: idxEffectKnob = 1
-            if m_b1 == KNOB2_CC: idxEffectKnob = 2
-            if m_b1 == KNOB3_CC: idxEffectKnob = 3
-            if idxEffectKnob >= 0: # knob 0-3 change CC event?
-                # map them to the 4 yoshi system effects 0 level control
-                effect_num  = 4 # system effect(4=system, 8=insert)
-                effect_index = idxEffectKnob # effect index
-                self.last_sys_effect = effect_index
-                if self.verbose & 1:
-                    map_desc = 'system effect level(%d)= %d' % (effect_index+1, m_b2)
-                msb_effect_ctrl = 0 # level(volume, dry/wet)
-                cc_data = m_b2 # route CC data value to new use
-                self.Send_NRPN(tx_ch, effect_num, effect_index,
-                               msb_effect_ctrl, cc_data)
-                if self.verbose & 1:
-                    print('map CC %d %d to: ' % (m_b1, m_b2) + map_desc)
-            elif m_b1 == KNOB4_CC:
-                if self.verbose & 1:
-                    map_desc = ' master PAN CC-10= %d' % (m_b2)
-                self.mDev.Write([0xb0 | tx_ch, 10, m_b2]) # route to CC-10 PAN(master)
-                if self.verbose & 1:
-                    print('map CC-%d %d to PAN CC-10:' % (m_b1, m_b2) + map_desc)
-            elif m_b1 == KNOB5_CC:
-                # this one routes pan based on last first 4 knobs used.
-                # routes pan to that system effect.
-                effect_num  = 4 # system effect(4=system, 8=insert)
-                effect_index = self.last_sys_effect # effect index, last vol chged above
-                if self.verbose & 1:
-                    map_desc = ' Effect Pan, System(%d)= %d' % (effect_index+1, m_b2)
-                msb_effect_ctrl = 1 # Pan
-                cc_data = m_b2 # route CC data value to new use
-                self.Send_NRPN(tx_ch, effect_num, effect_index,
-                               msb_effect_ctrl, cc_data)
-                if self.verbose & 1:
-                    print('map CC %d %d to: ' % (m_b1, m_b2) + map_desc)
-            elif m_b1 == KNOB6_CC:
-                if self.verbose & 1:
-                    map_desc = 'master Yoshi-Portamento CC-65= %d' % (m_b2)
-                # This is digital on/off, > 64 is on, less off
-                self.mDev.Write([0xb0 | tx_ch, 65, m_b2]) # route to CC-65 Yoshi portamento
-                if self.verbose & 1:
-                    print('map CC-%d %d to: ' % (m_b1, m_b2) + map_desc)
-            elif m_b1 == KNOB7_CC:
-                # yoshi expression cc-11, seems like same as master volume?
-                #map_desc = 'master Yoshi-Expression CC-11= %d' % (m_b2)
-                #mOut.Write([0xb0 | tx_ch, 11, m_b2]) # route to CC-11 Yoshi portamento
-                if self.verbose & 1:
-                    map_desc = 'master Yoshi-Sustain CC-64= %d' % (m_b2)
-                self.mDev.Write([0xb0 | tx_ch, 64, m_b2]) # route to CC-11 Yoshi sustain?
-                if self.verbose & 1:
-                    print('map CC-%d %d to: ' % (m_b1, m_b2) + map_desc)
+        # drain all pending in one call, bogus ones(alsaseq giving 3 odd
+        # pkts per sec) are already skipped.
+        dev = self.mDev
+        for pkt in dev.ReadMidiMany():
+            if dev.rx_port:
+                self.LaneEvent(pkt)
             else:
-                if m_b1 == 1: # mod wheel
-                    if MODWHEEL_BANKPROG_KEY_FEATURE:
-                    # mod wheel escape for setting bank/prog selection.
-                    # we save last mod value to try out using to set
-                    # bank/prog as escape sequence - push mod up > 100
-                    # then press a key, then pull mod down < 100
-                    # kludgy, don't think I like it very much, but..
-                        self.last_modwheel = m_b2
-                        if self.last_modwheel > 100:
-                            if self.verbose & 2:
-                                pr('Filter Mod-Wheel %d' % (self.last_modwheel))
-                            return True # processed, filter out
-                    if MODWHEEL_TO_PITCH_FEATURE:
-                        # mod wheel convert to differential pitch modulation
-                        # make it do what pitch wheel does, but without dead middle spot
-                        diff_mod = m_b2 - self.last_modwheel
-                        self.last_modwheel = m_b2
-                        # pitch value see from -8192 to 8191
-                        self.virtual_pitchval += (diff_mod * 64)
-                        if self.virtual_pitchval > 8191: self.virtual_pitchval = 8191
-                        if self.virtual_pitchval < -8192: self.virtual_pitchval = -8192
-                        ev = alsamidi.pitchbendevent(tx_ch, self.virtual_pitchval)
-                        if self.verbose & 4:
-                            print('made:')
-                            print(ev)
-                        fixed_ev = (13,0,0,253, (0,0), (0,0), (0,0), (0,0,0, 0,0, self.virtual_pitchval))
-                        ev = fixed_ev
-                        if self.verbose & 4:
-                            print('fixed:')
-                            print(ev)
-                        #self.mDev.Write(ev) # send out as pitch wheel control
-                        alsaseq.output(ev)
-                        # put out a pitch wheel change based on mod wheel change
-                        if self.verbose & 2:
-                            pr('Filter Mod-Wheel %d, to pitch %d bend' % (self.last_modwheel, self.virtual_pitchval))
-                        return True # processed, filter out
-
-                if self.pass_thru:
-                    if self.verbose & 2:
-                        desc = self.mDev.SummaryCC_Desc(m_b1, m_b2)
-                        print('pass thru CC event:' + desc)
-                    #self.mDev.WriteAlsaEvent(alsa_event)
-                    alsaseq.outlast((tx_ch | 0x10, 0,0,0)) # modify first(channel)
-
-        elif (m_b0 & 0xf0) == 0x90:
-            if self.verbose & 2:
-                print('ch:%d NoteOff:%d Vel:%d' % (rx_ch, m_b1, m_b2))
-            self.mDev.Write([0x90 | tx_ch, m_b1, m_b2])
-        elif (m_b0 & 0xf0) == 0x80:
-            if self.verbose & 2:
-                print('ch:%d NoteOn:%d Vel:%d' % (rx_ch, m_b1, m_b2))
-
-            if MODWHEEL_BANKPROG_KEY_FEATURE:
-                if self.last_modwheel > 100:
-                # using top of modwheel to set program(12 choices)
-                    if m_b2 != 0: # velocity: off (only do when key on)
-                        self.key_select = m_b1 % 12 # C-B, 12 choices, any octave
-                        self.ProgBankListSelect(self.key_select)
-                    if self.verbose & 2:
-                        pr('Filter Prog Key')
-                    return True # processed, don't pass thru, filter
-
-            if MODWHEEL_TO_PITCH_FEATURE:
-                if self.virtual_pitchval != 0:
-                    self.virtual_pitchval = 0 # reset it and send out
-                    ev = alsamidi.pitchbendevent(tx_ch, self.virtual_pitchval)
-                    #fixed_ev = (13,0,0,253, (0,0), (28,0), (130,0), (0,0,0, 0,0,0))
-                    ev = fixed_ev
-                    #self.mDev.Write(ev) # send out as pitch wheel control
-                    self.mDev.WriteAlsaEvent(ev)
-                    #alsaseq.output(ev)
-                    # put out a pitch wheel change based on mod wheel change
-                    if self.verbose & 2:
-                        pr('RESET Filter Mod-Wheel %d, to pitch %d bend' % (self.last_modwheel, self.virtual_pitchval))
-
-            if self.pass_thru:
-                if self.verbose & 2:
-                    print('pass thru noteon')
-                alsaseq.outlast((tx_ch | 0x10, 0,0,0)) # modify first(channel)
-        else:
-            if self.verbose & 1:
-                print('Unhandled event ch:%d Cmd:%d Vel:%d' % (rx_ch, m_b1, m_b2))
-            if self.pass_thru:
-                if self.verbose & 2:
-                    print('pass thru event')
-                #self.mDev.WriteAlsaEvent(alsa_event)
-                #self.mDev.Write([0x80 | tx_ch, m_b1, m_b2])
-                alsaseq.outlast((tx_ch | 0x10, 0,0,0)) # modify first(channel)
+                self.MidimanToYoshiRouter_Event(pkt)
+            if self.stamp:
+                self.mDev.RecordLatency()
         return True # processed something
 
+    #---------------------------------------------------
+    def LaneEvent(self, pkt):
+        ''' a pkt in on a -m lane the routes() table didn't take(-r0),
+            on out the lane's output port '''
+        lane = self.mDev.lanes[self.mDev.rx_port]
+        self.mDev.WriteLast(lane.mods, lane.out_port)
+
+    #---------------------------------------------------
+    def BuildDispatch(self):
+        ''' Compile the knob mapping and feature flags into the dispatch
+            table, dispatch[status >> 4][param] -> handler(pkt, m_b1, m_b2),
+            so the router does one lookup per pkt.  Run again when a mode
+            changes what a slot should do(mod wheel up, see Ev_ModWheel). '''
+        table = [[self.Ev_Other] * 128 for i in range(16)]
+        # WriteLast() mods of what passes thru, modify first(channel)
+        self.pass_mods = (self.mChannel | 0x10, 0,0,0)
+
+        cc = table[0xb]
+        for i in range(128):
+            cc[i] = self.Ev_ControlPass
+        knobs = self.knobs
+        for i in range(4):
+            cc[knobs[i]] = functools.partial(self.Ev_EffectLevel, i)
+        cc[knobs[4]] = functools.partial(self.Ev_RemapCC, 10, 'master PAN')
+        cc[knobs[5]] = self.Ev_EffectPan
+        # This is digital on/off, > 64 is on, less off
+        cc[knobs[6]] = functools.partial(self.Ev_RemapCC, 65, 'master Yoshi-Portamento')
+        # yoshi expression cc-11, seems like same as master volume?
+        cc[knobs[7]] = functools.partial(self.Ev_RemapCC, 64, 'master Yoshi-Sustain')
+        if self.modwheel_bankprog or self.modwheel_pitch:
+            cc[1] = self.Ev_ModWheel
+
+        note_on = self.Ev_NoteOn
+        note_off = self.Ev_NoteOff
+        if self.zones:
+            self.BuildZones()
+            note_on = note_off = self.Ev_Zone
+        if self.modwheel_pitch:
+            note_on = functools.partial(self.Ev_NoteOnPitchReset, note_on)
+        if self.modwheel_bankprog and self.last_modwheel > 100:
+            note_on = self.Ev_ProgKey # using top of modwheel to set program
+        table[0x8] = [note_off] * 128
+        table[0x9] = [note_on] * 128
+
+        # -d, the Thinner goes in front of what it thins
+        for thin_cc in self.thin.Controllers():
+            if thin_cc == Thinner.BEND:
+                table[0xe] = [functools.partial(self.Ev_Thin, h) for h in table[0xe]]
+            else:
+                cc[thin_cc] = functools.partial(self.Ev_Thin, cc[thin_cc])
+        self.dispatch = table
+
+    #---------------------------------------------------
+    def BuildZones(self):
+        ''' compile the zones to zone_keys[key], a list per key of what to
+            send for it, (vel_lo, vel_hi, note on status, note, vel_map),
+            so a split or layer costs one list lookup per note '''
+        keys = [[] for i in range(128)]
+        for z in self.zones:
+            for key in range(max(0, z.lo), min(127, z.hi) + 1):
+                note = key + z.transpose
+                if note < 0 or note > 127:
+                    continue
+                for ch in z.channels:
+                    if ch < 0:
+                        ch = self.mChannel
+                    keys[key].append((z.vel_lo, z.vel_hi, 0x90 | ch, note, z.vel_map))
+        self.zone_keys = keys
+
+    #---------------------------------------------------
+    def MidimanToYoshiRouter_Event(self, pkt):
+        ' Router, handle one MIDI pkt from ReadMidi() '
+        try:
+            (status, m_b1, m_b2) = pkt # note or param, velocity or value
+        except ValueError: # program change, pressure, system, 1-2 bytes
+            status = pkt[0]
+            m_b1 = m_b2 = 0
+            if len(pkt) > 1:
+                m_b1 = pkt[1]
+        self.dispatch[status >> 4][m_b1](pkt, m_b1, m_b2)
+        return True # processed something
+
+    #---------------------------------------------------
+    def Ev_Thin(self, handler, pkt, m_b1, m_b2):
+        ' a thinned controller or bend, handler gets it if the Thinner says '
+        if (pkt[0] & 0xf0) == 0xe0:
+            ok = self.thin.Check(pkt, Thinner.BEND, m_b2 << 7 | m_b1, handler)
+        else:
+            ok = self.thin.Check(pkt, m_b1, m_b2, handler)
+        if ok:
+            handler(pkt, m_b1, m_b2)
+        elif self.trace != None:
+            self.trace.Add(T_DROP, pkt[0], m_b1, m_b2)
+
+    #---------------------------------------------------
+    def ThinSend(self, handler, pkt):
+        ' Thinner flush, handle a pkt it held back, from the Scheduler '
+        m_b1 = 0
+        m_b2 = 0
+        if len(pkt) > 1:
+            m_b1 = pkt[1]
+        if len(pkt) > 2:
+            m_b2 = pkt[2]
+        self.mDev.replay = pkt # not in the alsaseq rx ring now
+        try:
+            handler(pkt, m_b1, m_b2)
+        finally:
+            self.mDev.replay = None
+
+    #---------------------------------------------------
+    def Ev_EffectLevel(self, effect_index, pkt, m_b1, m_b2):
+        ' knob 0-3, map them to the 4 yoshi system effects 0 level control '
+        effect_num  = 4 # system effect(4=system, 8=insert)
+        self.mDev.EffectLsb(effect_index) # knob 5 pans it now
+        msb_effect_ctrl = 0 # level(volume, dry/wet)
+        cc_data = m_b2 # route CC data value to new use
+        self.Send_NRPN(self.mChannel, effect_num, effect_index,
+                       msb_effect_ctrl, cc_data)
+        if self.trace != None: # system effect level(effect_index+1)
+            self.trace.Add(T_MAP, pkt[0], m_b1, m_b2, effect_index+1)
+
+    #---------------------------------------------------
+    def Ev_EffectPan(self, pkt, m_b1, m_b2):
+        ''' knob 5, routes pan based on last first 4 knobs used.
+            routes pan to that system effect. '''
+        effect_num  = 4 # system effect(4=system, 8=insert)
+        effect_index = self.mDev.EffectLsb() # effect index, last vol chged above
+        msb_effect_ctrl = 1 # Pan
+        cc_data = m_b2 # route CC data value to new use
+        self.Send_NRPN(self.mChannel, effect_num, effect_index,
+                       msb_effect_ctrl, cc_data)
+        if self.trace != None: # Effect Pan, System(effect_index+1)
+            self.trace.Add(T_MAP, pkt[0], m_b1, m_b2, effect_index+1)
+
+    #---------------------------------------------------
+    def Ev_RemapCC(self, tx_cc, name, pkt, m_b1, m_b2):
+        ' knob 4, 6, 7, send on as controller tx_cc '
+        self.mDev.Write([0xb0 | self.mChannel, tx_cc, m_b2])
+        if self.trace != None:
+            self.trace.Add(T_MAP, pkt[0], m_b1, m_b2, tx_cc)
+
+    #---------------------------------------------------
+    def Ev_ModWheel(self, pkt, m_b1, m_b2):
+        ' mod wheel, with MODWHEEL_ features on '
+        if self.modwheel_bankprog:
+        # mod wheel escape for setting bank/prog selection.
+        # we save last mod value to try out using to set
+        # bank/prog as escape sequence - push mod up > 100
+        # then press a key, then pull mod down < 100
+        # kludgy, don't think I like it very much, but..
+            was_up = self.last_modwheel > 100
+            self.last_modwheel = m_b2
+            if was_up != (self.last_modwheel > 100):
+                self.UpdateRoutes() # notes to us while up
+                self.BuildDispatch() # and to Ev_ProgKey
+            if self.last_modwheel > 100:
+                if self.trace != None: # Filter Mod-Wheel
+                    self.trace.Add(T_DROP, pkt[0], m_b1, m_b2)
+                return # processed, filter out
+        if self.modwheel_pitch:
+            # mod wheel convert to differential pitch modulation
+            # make it do what pitch wheel does, but without dead middle spot
+            diff_mod = m_b2 - self.last_modwheel
+            self.last_modwheel = m_b2
+            # pitch value see from -8192 to 8191
+            self.virtual_pitchval += (diff_mod * 64)
+            if self.virtual_pitchval > 8191: self.virtual_pitchval = 8191
+            if self.virtual_pitchval < -8192: self.virtual_pitchval = -8192
+            ev = alsaseq.Event(alsaseq.SND_SEQ_EVENT_PITCHBEND,
+                               self.mChannel, 0, self.virtual_pitchval)
+            # put out a pitch wheel change based on mod wheel change
+            self.mDev.WriteAlsaEvent(ev)
+            if self.trace != None: # Filter Mod-Wheel, to pitch bend
+                self.trace.Add(T_MAP, pkt[0], m_b1, m_b2, self.virtual_pitchval)
+            return # processed, filter out
+        self.Ev_ControlPass(pkt, m_b1, m_b2)
+
+    #---------------------------------------------------
+    def Ev_ControlPass(self, pkt, m_b1, m_b2):
+        ' CC we do not map '
+        if self.pass_thru:
+            self.mDev.WriteLast(self.pass_mods)
+            if self.trace != None:
+                self.trace.Add(T_PASS, pkt[0], m_b1, m_b2)
+
+    #---------------------------------------------------
+    def Ev_NoteOff(self, pkt, m_b1, m_b2):
+        self.mDev.WriteLast(self.pass_mods)
+
+    #---------------------------------------------------
+    def Ev_NoteOn(self, pkt, m_b1, m_b2):
+        if self.pass_thru:
+            self.mDev.WriteLast(self.pass_mods)
+            if self.trace != None:
+                self.trace.Add(T_PASS, pkt[0], m_b1, m_b2)
+
+    #---------------------------------------------------
+    def Ev_Zone(self, pkt, m_b1, m_b2):
+        ''' -z, a note on or off thru the zone table, layers go out in one
+            WriteMany().  A note off goes where its note on went. '''
+        rx = (pkt[0] & 0xf) << 7 | m_b1
+        if (pkt[0] & 0xf0) == 0x90 and m_b2 != 0:
+            pkts = []
+            offs = []
+            for (vel_lo, vel_hi, status, note, vel_map) in self.zone_keys[m_b1]:
+                if vel_lo <= m_b2 <= vel_hi:
+                    pkts.append((status, note, vel_map[m_b2]))
+                    offs.append((status & 0x8f, note, 0)) # 0x80 | ch
+            if offs:
+                self.zone_on[rx] = offs
+        else:
+            pkts = self.zone_on.pop(rx, None)
+            if pkts == None: # on before the zones changed, off everywhere
+                pkts = [(status & 0x8f, note, 0) for (vel_lo, vel_hi, status, note, vel_map)
+                        in self.zone_keys[m_b1]]
+        if pkts:
+            self.mDev.WriteMany(pkts)
+        if self.trace != None:
+            self.trace.Add(T_MAP, pkt[0], m_b1, m_b2, len(pkts))
+
+    #---------------------------------------------------
+    def Ev_NoteOnPitchReset(self, note_on, pkt, m_b1, m_b2):
+        ' MODWHEEL_TO_PITCH_FEATURE, a note puts the pitch back '
+        if self.virtual_pitchval != 0:
+            self.virtual_pitchval = 0 # reset it and send out
+            ev = alsaseq.Event(alsaseq.SND_SEQ_EVENT_PITCHBEND,
+                               self.mChannel, 0, self.virtual_pitchval)
+            self.mDev.WriteAlsaEvent(ev)
+            if self.trace != None: # RESET pitch bend
+                self.trace.Add(T_MAP, 0xe0 | self.mChannel, 0, 0, 0)
+        note_on(pkt, m_b1, m_b2)
+
+    #---------------------------------------------------
+    def Ev_ProgKey(self, pkt, m_b1, m_b2):
+        ' MODWHEEL_BANKPROG_KEY_FEATURE, note on while mod wheel is up '
+        if m_b2 != 0: # velocity: off (only do when key on)
+            self.key_select = m_b1 % 12 # C-B, 12 choices, any octave
+            self.ProgBankListSelect(self.key_select)
+        if self.trace != None: # Filter Prog Key
+            self.trace.Add(T_PROG, pkt[0], m_b1, m_b2, self.key_select)
+
+    #---------------------------------------------------
+    def Ev_Other(self, pkt, m_b1, m_b2):
+        ' program change, pitch bend and the rest, pass on '
+        if self.pass_thru:
+            self.mDev.WriteLast(self.pass_mods)
+            if self.trace != None:
+                self.trace.Add(T_PASS, pkt[0], m_b1, m_b2)
+
     #---------------------------------------------------
     def ProcessArgs(self):
         src_list = []
@@ -1037,13 +2318,11 @@ l - list midi devices
             self.cmdargs += a + ' '
 
             if a.startswith('-i'):
-                for nstr in a[2:].split(','):
-                    src_list.append(int(nstr))
+                src_list += ArgInts(a[2:], 0, 255, 1, 16)
             elif a.startswith('-o'):
-                for nstr in a[2:].split(','):
-                    dest_list.append(int(nstr))
+                dest_list += ArgInts(a[2:], 0, 255, 1, 16)
             elif a.startswith('-v'):
-                self.verbose = int(a[2:])
+                self.verbose = ArgInts(a[2:], 0, 255)[0]
                 if self.verbose:
                     global verbose
                     verbose = self.verbose
@@ -1055,6 +2334,45 @@ l - list midi devices
                 self.pass_thru = 0
             elif a.startswith('-a0'):
                 self.auto_midi_conn = 0 # turn off string match connect
+            elif a.startswith('-r0'):
+                self.c_routes = 0 # route all in python
+            elif a.startswith('-t1'):
+                self.stamp = 1 # time stamp in, latency stats
+            elif a.startswith('-e1'):
+                if asyncio == None:
+                    print('-e1 needs python3 asyncio')
+                    usage()
+                self.aio = 1 # asyncio event loop
+            elif a.startswith('-x'):
+                self.trace_size = 4096
+                if a[2:]:
+                    self.trace_size = ArgInts(a[2:], 1, 1 << 24)[0]
+            elif a.startswith('-j1'):
+                self.threaded = 1 # RouterThread
+            elif a.startswith('-k1'):
+                self.keep_clock = 1 # don't drop clock in alsaseq
+            elif a.startswith('-d'):
+                self.thin_args = tuple(ArgInts(a[2:], 0, 100000, 2, 2)) # rate, delta
+                self.SetThin()
+            elif a.startswith('-c'):
+                self.config_path = a[2:]
+            elif a.startswith('-m'):
+                words = a[2:].split(':')
+                if len(words) < 2:
+                    usage()
+                ch = -1
+                if len(words) > 2 and words[2]:
+                    ch = ArgInts(words[2], 1, 16)[0] - 1
+                self.lanes.append(Lane(words[0], words[1], ch))
+            elif a.startswith('-z'):
+                try:
+                    self.zones.append(ParseZone(a[2:]))
+                except ValueError:
+                    usage()
+            elif a.startswith('-n'):
+                self.nrpn_window = ArgInts(a[2:], 0, 10000)[0] / 1000.0 # NRPN coalescing
+            elif a.startswith('-b'):
+                self.sizes = ArgInts(a[2:], 0, 1 << 24, 1, 4)
             elif a.startswith('-o'):
                 self.options = a[1:] # cheesy hack for misc options string
             else:
@@ -1064,17 +2382,49 @@ l - list midi devices
 
     #---------------------------------------------------
     def Run(self):
+        if self.config_path != None:
+            cfg = RouterConfig(self.config_path)
+            try:
+                cfg.Load()
+            except ValueError as e:
+                print('config %s not loaded, %s' % (cfg.path, e))
+                return False
+            self.ApplyConfig(cfg) # before Open(), it has inputs, outputs
+
         self.mDev = MidiDevice()
         self.mDev.verbose = self.verbose
         self.mDev.pass_thru = self.pass_thru
         self.mDev.auto_midi_conn = self.auto_midi_conn # set string match connect option
+        self.mDev.stamp = self.stamp
+        self.mDev.sizes = self.sizes
+        self.mDev.keep_clock = self.keep_clock
+        self.mDev.lanes += self.lanes
+        if self.verbose & 1:
+            self.mDev.sysex_dump = self.SysexDump
+        if self.verbose and not self.trace_size:
+            self.trace_size = 4096
+        if self.trace_size:
+            self.trace = TraceRing(self.trace_size)
+            self.mDev.trace = self.trace
+            if self.verbose:
+                TraceFlusher(self.trace, self.verbose).start()
 
         if not self.mDev.Open(self.src_list, self.dest_list):
             print('failed to open midi device')
             return False
 
+        self.UpdateRoutes()
+        self.BuildDispatch()
+        if self.config != None:
+            ConfigWatcher(self.config, self).start()
+            self.sched.After(ConfigWatcher.PERIOD, self.CheckConfig)
         self.MidimanToYoshiRouter_Start()
-        self.MidimanToYoshiRouter_Loop()
+        if self.threaded:
+            self.MidimanToYoshiRouter_Threaded()
+        elif self.aio:
+            AsyncRunner(self).Run()
+        else:
+            self.MidimanToYoshiRouter_Loop()
 
 
 #---------------------------------------
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# router_bench.py - replay MIDI through the whole router, no ALSA needed.
+#  fakeseq stands in for alsaseq, so this runs anywhere: a MidiDevice is
+#  opened on it and Main routes as it would live, ReadMidiMany(), the
+#  dispatch table, WriteMany()/WriteLast() and all.  The alsaseq routes()
+#  table is off(like -r0), every pkt goes thru python.
+#
+#  Each workload is fed in whole, then drained by MidimanToYoshiRouter_Poll():
+#   knobs  - dense sweeps on the 8 knobs, what a fast hand on them sends
+#   trills - two notes on/off back and forth, as fast as a keyboard goes
+#   mixed  - all 16 channels, notes, CCs, bend, pressure, program changes
+#   file   - a recorded stream, -f path(see fakeseq Load()/Save())
+#  An untimed pass gives events/sec, a second pass times each pkt in
+#  MidimanToYoshiRouter_Event() for p50/p99 per event type.  With -a a
+#  third pass counts memory(python3 tracemalloc), blocks allocated per
+#  batch and left over after it, the python side only, fakeseq isn't the
+#  C alsaseq.
+#
+#  usage: python router_bench.py [-n num_events] [-f recorded_file] [-s save_file]
+#                                [-w nrpn_window_ms] [-d rate,delta] [-z zone].. [-a]
+#   -s writes the mixed workload out as a recorded stream, to start from.
+#   -w coalesces knob NRPNs as midiroute -n#, a replay comes in faster
+#      than live so most knob values get dropped.
+#   -d thins the controllers as midiroute -d#,#, same goes.
+#   -z adds a keyboard zone as midiroute -z, give several to layer.
+# kbongosmusic at gmail_com - GPLv2
+from __future__ import print_function
+import os
+import sys
+import time
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None # python2
+
+import fakeseq
+sys.modules['alsaseq'] = fakeseq # before midiroute imports it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alsaseq'))
+
+import midiroute
+from midiroute import KNOB0_CC, KNOB1_CC, KNOB2_CC, KNOB3_CC
+from midiroute import KNOB4_CC, KNOB5_CC, KNOB6_CC, KNOB7_CC
+
+TYPE_NAMES = {0x80: 'noteoff', 0x90: 'noteon', 0xa0: 'keypress',
+              0xb0: 'control', 0xc0: 'program', 0xd0: 'chanpress',
+              0xe0: 'bend'}
+STEP = 0.001 # recorded time between generated events, secs
+clock = getattr(time, 'perf_counter', time.time)
+
+#-------------------------------------------
+def KnobSweeps(num):
+    ' the 8 knobs swept up and down, interleaved '
+    knobs = (KNOB0_CC, KNOB1_CC, KNOB2_CC, KNOB3_CC,
+             KNOB4_CC, KNOB5_CC, KNOB6_CC, KNOB7_CC)
+    events = []
+    for i in range(num):
+        v = (i // 8) % 254
+        if v > 127:
+            v = 253 - v # back down
+        events.append((i * STEP, bytearray([0xb0, knobs[i % 8], v])))
+    return events
+
+#-------------------------------------------
+def Trills(num):
+    ' 60 and 62 on/off back and forth, note ons with vel 0 now and then '
+    events = []
+    for i in range(num):
+        note = 60 + 2 * ((i // 2) % 2)
+        if i % 2 == 0:
+            pkt = bytearray([0x90, note, 100])
+        elif i % 16 == 15:
+            pkt = bytearray([0x90, note, 0]) # running status style off
+        else:
+            pkt = bytearray([0x80, note, 64])
+        events.append((i * STEP, pkt))
+    return events
+
+#-------------------------------------------
+def Mixed(num):
+    ' every channel, most kinds of channel message, mod wheel kept < 100 '
+    events = []
+    for i in range(num):
+        ch = i % 16
+        n = (i // 16) % 10
+        if n < 3:
+            pkt = bytearray([0x90 | ch, 36 + i % 48, 90])
+        elif n < 5:
+            pkt = bytearray([0x80 | ch, 36 + (i - 32) % 48, 0])
+        elif n < 6:
+            pkt = bytearray([0xb0 | ch, 7 + i % 4, i % 128]) # vol, bal, 9, pan
+        elif n < 7:
+            pkt = bytearray([0xb0 | ch, 1, i % 100]) # mod wheel, not up
+        elif n < 8:
+            pkt = bytearray([0xe0 | ch, i % 128, 64 + i % 8])
+        elif n < 9:
+            pkt = bytearray([0xd0 | ch, i % 128])
+        elif i % 7 == 0:
+            pkt = bytearray([0xc0 | ch, i % 128])
+        else:
+            pkt = bytearray([0xa0 | ch, 36 + i % 48, i % 128])
+        events.append((i * STEP, pkt))
+    return events
+
+#-------------------------------------------
+def MakeMain(nrpn_window, thin=None, zones=[]):
+    ''' a Main routing on a MidiDevice opened on fakeseq, thin is
+        (rate, delta) for the Thinner, zones -z specs '''
+    main = midiroute.Main()
+    main.zones = [midiroute.ParseZone(z) for z in zones]
+    main.c_routes = 0
+    main.nrpn_window = nrpn_window
+    if thin != None:
+        for cc in midiroute.THIN_CCS:
+            main.thin.Set(-1, cc, thin[0], thin[1])
+    dev = midiroute.MidiDevice()
+    dev.auto_midi_conn = 0
+    main.mDev = dev
+    if not dev.Open():
+        sys.exit(1)
+    dev.seq.keep_sent = False # just count, runs get long
+    main.BuildDispatch()
+    main.UpdateRoutes()
+    return main
+
+#-------------------------------------------
+def Drain(main):
+    ''' route all that is fed, same loop as MidimanToYoshiRouter_Loop(),
+        then let the Scheduler finish(-w NRPN flushes) '''
+    while main.MidimanToYoshiRouter_Poll():
+        main.sched.RunDue()
+    while main.sched.heap:
+        time.sleep(main.sched.TimeoutMs() / 1000.0)
+        main.sched.RunDue()
+
+#-------------------------------------------
+def Percentile(times, pct):
+    if len(times) == 0:
+        return 0.0
+    return times[min(len(times) - 1, int(len(times) * pct / 100.0))]
+
+#-------------------------------------------
+def CountAllocs(main, events):
+    ''' route events once more under tracemalloc.  Returns the most one
+        batch(a MidimanToYoshiRouter_Poll(), up to RX_RING pkts) had
+        allocated at once, bytes, and the blocks still allocated after
+        them all, from anything but tracemalloc itself '''
+    seq = main.mDev.seq
+    seq.FeedMany(events)
+    mine = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    base = tracemalloc.take_snapshot().filter_traces(mine)
+    peak = 0
+    while True:
+        cur = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak() # 3.9, else peak is since start
+        if not main.MidimanToYoshiRouter_Poll():
+            break
+        main.sched.RunDue()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - cur)
+    Drain(main)
+    left = tracemalloc.take_snapshot().filter_traces(mine).compare_to(base, 'filename')
+    tracemalloc.stop()
+    return (peak, sum([stat.count_diff for stat in left]))
+
+#-------------------------------------------
+def RunWorkload(name, main, events, allocs=False):
+    seq = main.mDev.seq
+
+    # pass 1: untimed, events per sec thru the router
+    seq.FeedMany(events)
+    seq.nsent = 0
+    t0 = clock()
+    Drain(main)
+    secs = clock() - t0
+    sent = seq.nsent
+
+    # pass 2: time each pkt, by event type
+    times = {}
+    route = main.MidimanToYoshiRouter_Event
+    def Timed(pkt):
+        t = clock()
+        route(pkt)
+        times.setdefault(pkt[0] & 0xf0, []).append(clock() - t)
+        return True
+    main.MidimanToYoshiRouter_Event = Timed # instance attr, just for this run
+    seq.FeedMany(events)
+    Drain(main)
+    del main.MidimanToYoshiRouter_Event
+
+    print('%-7s events:%7d  out:%7d  %6.3f sec  %9.0f events/sec' % (
+          name, len(events), sent, secs, len(events) / secs))
+    for mtype in sorted(times):
+        t = sorted(times[mtype])
+        print('   %-10s %7d  p50:%6.2f usec  p99:%6.2f usec' % (
+              TYPE_NAMES.get(mtype, '%02x' % mtype), len(t),
+              Percentile(t, 50) * 1e6, Percentile(t, 99) * 1e6))
+    if allocs:
+        (peak, left) = CountAllocs(main, events)
+        print('   memory     batch peak:%6d bytes  blocks left after:%d' % (peak, left))
+
+#-------------------------------------------
+def main():
+    num = 100000
+    rec_file = None
+    save_file = None
+    nrpn_window = 0.0
+    thin = None
+    zones = []
+    allocs = False
+    args = sys.argv[1:]
+    while args:
+        a = args.pop(0)
+        if a == '-n':
+            num = int(args.pop(0))
+        elif a == '-f':
+            rec_file = args.pop(0)
+        elif a == '-s':
+            save_file = args.pop(0)
+        elif a == '-w':
+            nrpn_window = int(args.pop(0)) / 1000.0
+        elif a == '-d':
+            thin = [int(nstr) for nstr in args.pop(0).split(',')]
+        elif a == '-z':
+            zones.append(args.pop(0))
+        elif a == '-a' and tracemalloc != None:
+            allocs = True
+        else:
+            print('usage: python router_bench.py [-n num_events] [-f recorded_file] [-s save_file] [-w nrpn_window_ms] [-d rate,delta] [-z zone].. [-a]')
+            sys.exit(1)
+
+    if save_file != None:
+        fakeseq.Save(save_file, Mixed(num))
+        print('saved %d events to %s' % (num, save_file))
+        return
+
+    main = MakeMain(nrpn_window, thin, zones)
+    if rec_file != None:
+        workloads = [('file', fakeseq.Load(rec_file))]
+    else:
+        workloads = [('knobs', KnobSweeps(num)), ('trills', Trills(num)),
+                     ('mixed', Mixed(num))]
+    for (name, events) in workloads:
+        RunWorkload(name, main, events, allocs)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+# test_midiroute.py - behaviour of the python side of the router, no ALSA.
+#  fakeseq stands in for alsaseq, pkts are fed in and what comes out is
+#  checked in Client.sent.  The clock midiroute reads is swapped for one
+#  the tests move, so the Scheduler, Thinner and NRPN windows run without
+#  sleeping.
+#
+#  usage: python -m unittest test_midiroute   (or python -m pytest test_midiroute.py,
+#         old_test_yoshibanks is an interactive python2 script, not a test)
+# kbongosmusic at gmail_com - GPLv2
+from __future__ import print_function
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import fakeseq
+from fakeseq import ROUTE_DROP, ROUTE_PASS, ROUTE_CHANNEL, ROUTE_CC, ROUTE_NRPN, ROUTE_PYTHON
+sys.modules['alsaseq'] = fakeseq # before midiroute imports it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alsaseq'))
+
+import midiroute
+from midiroute import KNOB0_CC, KNOB4_CC, KNOBS
+
+#-------------------------------------------
+def MakeMain(nrpn_window=0.0, thin=None, zones=(), c_routes=0, lanes=()):
+    ''' a Main routing on a MidiDevice opened on fakeseq, as Run() sets
+        it up for -n, -d(thin is (rate, delta)), -z, -r and -m(lanes are
+        channels, -1 to keep the rx one) '''
+    main = midiroute.Main()
+    main.nrpn_window = nrpn_window
+    main.thin_args = thin
+    main.SetThin()
+    main.zones = [midiroute.ParseZone(z) for z in zones]
+    main.c_routes = c_routes
+    dev = midiroute.MidiDevice()
+    dev.auto_midi_conn = 0
+    dev.lanes += [midiroute.Lane('in%d' % (i), 'out%d' % (i), lanes[i])
+                  for i in range(len(lanes))]
+    main.mDev = dev
+    if not dev.Open():
+        raise RuntimeError('fakeseq client would not open')
+    main.BuildDispatch()
+    main.UpdateRoutes()
+    return main
+
+#-------------------------------------------
+class Clock:
+    ' midiroute.now() for a test, moves only when told to '
+    def __init__(self):
+        self.t = 0.0
+    def __call__(self):
+        return self.t
+
+#-------------------------------------------
+def Pkts(sent):
+    ' Client.sent bytes to a list of MIDI pkts, as tuples '
+    data = bytearray().join([bytearray(s) for s in sent])
+    return [tuple(pkt) for pkt in fakeseq.SplitPkts(data)]
+
+#-------------------------------------------
+class RouterTest(unittest.TestCase):
+    ' a Main on fakeseq, the clock stopped '
+    nrpn_window = 0.0
+    thin = None
+    zones = ()
+    c_routes = 0
+
+    def setUp(self):
+        self.clock = Clock()
+        self.org_now = midiroute.now
+        midiroute.now = self.clock
+        self.main = MakeMain(self.nrpn_window, self.thin, self.zones, self.c_routes)
+        self.seq = self.main.mDev.seq
+        self.seq.keep_sent = True
+        del self.seq.sent[:] # what Open() sent
+
+    def tearDown(self):
+        midiroute.now = self.org_now
+
+    def Route(self, *pkts):
+        ' feed pkts in, all at the time on the clock, and route them '
+        for pkt in pkts:
+            self.seq.Feed(bytearray(pkt), 0.0)
+        while self.main.MidimanToYoshiRouter_Poll():
+            pass
+        self.main.sched.RunDue()
+
+    def Later(self, secs):
+        ' move the clock on, run what the Scheduler has due '
+        self.clock.t += secs
+        self.main.sched.RunDue()
+
+    def Sent(self):
+        pkts = Pkts(self.seq.sent)
+        del self.seq.sent[:]
+        return pkts
+
+#-------------------------------------------
+class TestSplitEvent(RouterTest):
+    def test_nrpn_event(self):
+        ' one event decoding to 4 CCs, each handled and passed '
+        nrpn = (0xb0, 99, 1, 0xb0, 98, 2, 0xb0, 6, 3, 0xb0, 38, 4)
+        self.Route(nrpn, (0x90, 60, 100))
+        self.assertEqual(self.Sent(), [(0xb0, 99, 1), (0xb0, 98, 2), (0xb0, 6, 3),
+                                       (0xb0, 38, 4), (0x90, 60, 100)])
+
+    def test_read_midi(self):
+        ' ReadMidi() hands them out one a call, none lost, never waits '
+        dev = self.main.mDev
+        self.assertEqual(dev.ReadMidi(), None)
+        self.seq.Feed(bytearray((0xb0, 99, 1, 0xb0, 98, 2, 0xb0, 6, 3, 0xb0, 38, 4)), 0.0)
+        self.seq.Feed(bytearray((0x90, 60, 100)), 0.0)
+        pkts = []
+        pkt = dev.ReadMidi()
+        while pkt != None:
+            pkts.append(tuple(pkt))
+            pkt = dev.ReadMidi()
+        self.assertEqual(pkts, [(0xb0, 99, 1), (0xb0, 98, 2), (0xb0, 6, 3),
+                                (0xb0, 38, 4), (0x90, 60, 100)])
+
+#-------------------------------------------
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.org_now = midiroute.now
+        midiroute.now = self.clock
+
+    def tearDown(self):
+        midiroute.now = self.org_now
+
+    def test_order(self):
+        sched = midiroute.Scheduler()
+        ran = []
+        sched.After(0.2, ran.append, 'c')
+        sched.After(0.1, ran.append, 'a')
+        sched.After(0.1, ran.append, 'b') # same time, after 'a'
+        self.assertEqual(sched.TimeoutMs(), 100)
+        sched.RunDue()
+        self.assertEqual(ran, [])
+        self.clock.t += 0.1
+        sched.RunDue()
+        self.assertEqual(ran, ['a', 'b'])
+        self.clock.t += 0.1
+        sched.RunDue()
+        self.assertEqual(ran, ['a', 'b', 'c'])
+        self.assertEqual(sched.TimeoutMs(), -1)
+
+    def test_cancel(self):
+        sched = midiroute.Scheduler()
+        ran = []
+        entry = sched.After(0.1, ran.append, 'a')
+        sched.After(0.1, ran.append, 'b')
+        sched.Cancel(entry)
+        self.clock.t += 0.1
+        sched.RunDue()
+        self.assertEqual(ran, ['b'])
+        self.assertEqual(sched.heap, [])
+
+#-------------------------------------------
+class TestNrpnWindow(RouterTest):
+    nrpn_window = 0.05
+
+    def test_coalesce(self):
+        self.Route((0xb0, KNOB0_CC, 10), (0xb0, KNOB0_CC, 20), (0xb0, KNOB0_CC, 30))
+        pkts = self.Sent()
+        self.assertEqual(pkts[-1], (0xb0, 38, 10)) # data LSB, the first goes now
+        self.assertEqual(self.main.nrpn_coalesced, 1)
+        self.Later(0.05)
+        self.assertEqual(self.Sent(), [(0xb0, 6, 0), (0xb0, 38, 30)]) # same address
+        self.Later(1.0)
+        self.assertEqual(self.Sent(), [])
+
+
+class TestNrpnNoWindow(RouterTest):
+    def test_each_value(self):
+        self.Route((0xb0, KNOB0_CC, 10), (0xb0, KNOB0_CC, 20))
+        data = [pkt[2] for pkt in self.Sent() if pkt[1] == 38]
+        self.assertEqual(data, [10, 20])
+
+    def test_address_once(self):
+        ' the address CCs only go out when it changes '
+        self.Route((0xb0, KNOB0_CC, 10))
+        self.assertEqual([pkt[1] for pkt in self.Sent()], [99, 98, 6, 38])
+        self.Route((0xb0, KNOB0_CC, 20))
+        self.assertEqual([pkt[1] for pkt in self.Sent()], [6, 38])
+
+    def test_new_synth(self):
+        ' a new subscriber to our output port gets the address in full '
+        self.Route((0xb0, KNOB0_CC, 10))
+        self.Sent()
+        self.main.mDev.SysEvent(midiroute.alsaseq.SND_SEQ_EVENT_PORT_SUBSCRIBED,
+                                self.seq.id(), self.seq.ninputports, 129 << 8)
+        self.Route((0xb0, KNOB0_CC, 20))
+        self.assertEqual([pkt[1] for pkt in self.Sent()], [99, 98, 6, 38])
+
+    def test_nrpnforget(self):
+        self.seq.nrpn(0, 4, 0, 0, 10)
+        self.seq.nrpnforget(1) # another channel
+        self.assertEqual(self.seq.nrpn(0, 4, 0, 0, 11), 2)
+        self.seq.nrpnforget()
+        self.assertEqual(self.seq.tx_nrpn, {})
+        self.assertEqual(self.seq.nrpn(0, 4, 0, 0, 12), 4)
+
+#-------------------------------------------
+class TestThinRate(RouterTest):
+    thin = (10, 0) # 10 per sec, any move
+
+    def test_held_then_flushed(self):
+        self.Route((0xb0, KNOB4_CC, 10), (0xb0, KNOB4_CC, 20), (0xb0, KNOB4_CC, 30))
+        self.assertEqual(self.Sent(), [(0xb0, 10, 10)]) # knob 4 is pan, CC-10
+        self.Later(0.05) # still within the interval
+        self.assertEqual(self.Sent(), [])
+        self.Later(0.1)
+        self.assertEqual(self.Sent(), [(0xb0, 10, 30)]) # where it stopped
+        self.assertEqual(self.main.sched.heap, [])
+
+    def test_after_interval(self):
+        self.Route((0xb0, KNOB4_CC, 10))
+        self.Later(0.1)
+        self.Route((0xb0, KNOB4_CC, 20))
+        self.assertEqual(self.Sent(), [(0xb0, 10, 10), (0xb0, 10, 20)])
+
+
+class TestThinDelta(RouterTest):
+    thin = (0, 4) # no rate limit, moves of 4 or more
+
+    def test_small_moves(self):
+        self.Route((0xb0, KNOB4_CC, 10), (0xb0, KNOB4_CC, 12), (0xb0, KNOB4_CC, 15))
+        self.assertEqual(self.Sent(), [(0xb0, 10, 10), (0xb0, 10, 15)])
+        self.Later(1.0) # 15 went out, nothing held
+        self.assertEqual(self.Sent(), [])
+
+    def test_final_flush(self):
+        self.Route((0xb0, KNOB4_CC, 10), (0xb0, KNOB4_CC, 12))
+        self.assertEqual(self.Sent(), [(0xb0, 10, 10)])
+        self.Later(midiroute.Thinner.GAP)
+        self.assertEqual(self.Sent(), [(0xb0, 10, 12)])
+
+#-------------------------------------------
+class TestZones(RouterTest):
+    zones = ['0-59:2:12', '60-127:3', '60-127:4::100-127']
+
+    def test_split(self):
+        self.Route((0x90, 40, 100))
+        self.assertEqual(self.Sent(), [(0x91, 52, 100)])
+
+    def test_layer_velocity(self):
+        self.Route((0x90, 70, 90), (0x90, 72, 110))
+        self.assertEqual(self.Sent(), [(0x92, 70, 90), (0x92, 72, 110), (0x93, 72, 110)])
+
+    def test_note_off_follows_on(self):
+        self.Route((0x90, 72, 110))
+        self.Sent()
+        self.main.zones = [midiroute.ParseZone('0-127:5')] # changed, key still down
+        self.main.BuildDispatch()
+        self.Route((0x80, 72, 0))
+        self.assertEqual(self.Sent(), [(0x82, 72, 0), (0x83, 72, 0)])
+
+    def test_build(self):
+        keys = self.main.zone_keys
+        self.assertEqual([z[2:4] for z in keys[40]], [(0x91, 52)])
+        self.assertEqual([z[:4] for z in keys[60]], [(1, 127, 0x92, 60), (100, 127, 0x93, 60)])
+        self.assertEqual(len(keys[120]), 2)
+
+
+class TestParseZone(unittest.TestCase):
+    def test_good(self):
+        z = midiroute.ParseZone('36-59:1,0:-12:10-100:soft')
+        self.assertEqual((z.lo, z.hi, z.channels, z.transpose, z.vel_lo, z.vel_hi),
+                         (36, 59, (0, -1), -12, 10, 100))
+        self.assertTrue(z.vel_map[64] > 64) # soft, a light touch comes out louder
+        z = midiroute.ParseZone('0-127:16')
+        self.assertEqual((z.channels, z.transpose, z.curve), ((15,), 0, 'lin'))
+
+    def test_bad(self):
+        for spec in ('60', '60:1', '50-40:1', '0-128:1', '0-59:17', '0-59:-1',
+                     '0-59:1:200', '0-59:1:x', '0-59:1:0:0-127', '0-59:1:0:1-200',
+                     '0-59:1:0:1-127:loud', 'x-y:1'):
+            self.assertRaises(ValueError, midiroute.ParseZone, spec)
+
+#-------------------------------------------
+CC = fakeseq.SND_SEQ_EVENT_CONTROLLER
+
+def Workload():
+    ' a bit of everything the routes() rules and python both take '
+    pkts = []
+    for v in (10, 20, 30):
+        pkts += [(0xb0, cc, v) for cc in KNOBS]
+    pkts += [(0xb0, KNOBS[3], 40), (0xb0, KNOBS[5], 50), # pan the effect 3
+             (0x90, 60, 100), (0x80, 60, 0), (0x93, 62, 90), (0x90, 62, 0),
+             (0xa0, 60, 30), (0xb3, 7, 100), (0xb0, 80, 5), (0xc0, 5),
+             (0xd2, 40), (0xe0, 0, 80), (0xe1, 127, 127)]
+    return pkts
+
+class TestRoutes(RouterTest):
+    ' alsaseq routes() table, run by fakeseq as alsaseq runs it '
+    c_routes = 1
+
+    def test_knob_rules(self):
+        ch = self.main.mChannel
+        self.assertEqual(self.main.RouterTable()[:8], [
+            (CC, -1, KNOBS[0], ROUTE_NRPN, ch, 4, 0, 0),
+            (CC, -1, KNOBS[1], ROUTE_NRPN, ch, 4, 1, 0),
+            (CC, -1, KNOBS[2], ROUTE_NRPN, ch, 4, 2, 0),
+            (CC, -1, KNOBS[3], ROUTE_NRPN, ch, 4, 3, 0),
+            (CC, -1, KNOBS[5], ROUTE_NRPN, ch, 4, -1, 1),
+            (CC, -1, KNOBS[4], ROUTE_CC, ch, 10),
+            (CC, -1, KNOBS[6], ROUTE_CC, ch, 65),
+            (CC, -1, KNOBS[7], ROUTE_CC, ch, 64)])
+        self.Route((0xb0, KNOBS[2], 10), (0xb0, KNOBS[5], 20), (0xb0, KNOBS[4], 30))
+        self.assertEqual(self.seq.last, None) # none got up to python
+        self.assertEqual(self.main.mDev.EffectLsb(), 2)
+        self.assertEqual(self.Sent(), [(0xb0 | ch, 99, 4), (0xb0 | ch, 98, 2),
+                                       (0xb0 | ch, 6, 0), (0xb0 | ch, 38, 10),
+                                       (0xb0 | ch, 6, 1), (0xb0 | ch, 38, 20),
+                                       (0xb0 | ch, 10, 30)])
+
+    def test_window_thin_rules(self):
+        ' -n sends the NRPN knobs up, -d what it thins, the later rule wins '
+        self.main.nrpn_window = 0.05
+        self.main.thin_args = (10, 0)
+        self.main.SetThin()
+        self.main.BuildDispatch()
+        self.main.UpdateRoutes()
+        rules = self.main.RouterTable()
+        for cc in KNOBS[:4] + KNOBS[5:6]:
+            self.assertTrue((CC, -1, cc, ROUTE_PYTHON) in rules)
+        thin = rules[-len(self.main.thin.rules):]
+        self.assertTrue((CC, -1, KNOBS[4], ROUTE_PYTHON) in thin)
+        self.assertTrue(rules.index((CC, -1, KNOBS[4], ROUTE_CC, self.main.mChannel, 10))
+                        < len(rules) - len(thin))
+        self.Route((0xb0, KNOBS[4], 10), (0xb0, KNOBS[4], 20), (0xb0, KNOBS[4], 30))
+        self.assertEqual(self.Sent(), [(0xb0, 10, 10)]) # the Thinner has the rest
+
+    def test_rule_order(self):
+        ' one channel/param beats -1, a later rule replaces an earlier one '
+        self.seq.routes([(CC, -1, -1, ROUTE_PASS), (CC, 2, 7, ROUTE_DROP),
+                         (CC, -1, 7, ROUTE_CC, 5, 11), (CC, -1, 7, ROUTE_CC, 5, 12)])
+        self.Route((0xb0, 7, 1), (0xb2, 7, 2), (0xb2, 8, 3))
+        self.assertEqual(self.Sent(), [(0xb5, 12, 1), (0xb2, 8, 3)])
+        self.assertRaises(ValueError, self.seq.routes, [(CC, -1, 7, ROUTE_CC, 5, 128)])
+        self.assertRaises(ValueError, self.seq.routes, [(CC, -1, 7, ROUTE_NRPN, 0, 4, -2, 0)])
+
+    def test_lane_rules(self):
+        self.assertEqual(midiroute.Lane('a', 'b', 3).RouteRules()[3],
+                         (CC, -1, -1, ROUTE_CHANNEL, 3))
+        self.assertEqual(midiroute.Lane('a', 'b').RouteRules()[3],
+                         (CC, -1, -1, ROUTE_PASS, -1))
+
+def Streams(pkts):
+    ''' pkts by status byte, CCs by controller too, each in the order sent.
+        What the routes() table sends goes as it is read, before python
+        has the batch, so only the order of each of these is the same. '''
+    streams = {}
+    for pkt in pkts:
+        key = pkt[0]
+        if (pkt[0] & 0xf0) == 0xb0:
+            key = pkt[:2]
+        streams.setdefault(key, []).append(pkt)
+    return streams
+
+class TestRoutesSame(unittest.TestCase):
+    ' the routes() table and python routing send the same '
+    def Run(self, c_routes, nrpn_window=0.0, thin=None, lanes=()):
+        ' Workload() in on each input port, what comes out and where '
+        clock = Clock()
+        org_now = midiroute.now
+        midiroute.now = clock
+        try:
+            main = MakeMain(nrpn_window, thin, (), c_routes, lanes)
+            seq = main.mDev.seq
+            del seq.sent[:]
+            for port in range(len(lanes) + 1):
+                seq.FeedMany([(0.0, bytearray(pkt)) for pkt in Workload()], port)
+            while main.MidimanToYoshiRouter_Poll():
+                pass
+            clock.t += 1.0 # -n, -d flushes
+            main.sched.RunDue()
+            return (Streams(Pkts(seq.sent)), sorted(seq.nsent_port.items()))
+        finally:
+            midiroute.now = org_now
+
+    def test_default(self):
+        self.assertEqual(self.Run(1), self.Run(0))
+
+    def test_thin(self):
+        self.assertEqual(self.Run(1, thin=(0, 8)), self.Run(0, thin=(0, 8)))
+
+    def test_window(self):
+        self.assertEqual(self.Run(1, nrpn_window=0.05), self.Run(0, nrpn_window=0.05))
+
+    def test_lanes(self):
+        (sent, ports) = self.Run(1, lanes=(5,))
+        self.assertEqual((sent, ports), self.Run(0, lanes=(5,)))
+        self.assertEqual(len(ports), 2) # the lane's output port too
+
+#-------------------------------------------
+class TestRouterConfig(unittest.TestCase):
+    def setUp(self):
+        (fd, self.path) = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def Load(self, doc):
+        f = open(self.path, 'w')
+        f.write(doc if isinstance(doc, str) else json.dumps(doc))
+        f.close()
+        cfg = midiroute.RouterConfig(self.path)
+        cfg.Load()
+        return cfg.settings
+
+    def test_good(self):
+        knobs = [20, 21, 22, 23, 24, 25, 26, 27]
+        s = self.Load({'knobs': knobs, 'zones': ['0-59:2'], 'thin': [50, 2],
+                       'nrpn_window': 20, 'modwheel_to_pitch': True})
+        self.assertEqual(s['knobs'], tuple(knobs))
+        self.assertEqual(s['zones'][0].channels, (1,))
+        self.assertEqual(s['thin'], (50, 2))
+        self.assertEqual(s['nrpn_window'], 0.02)
+        self.assertEqual(s['modwheel_to_pitch'], True)
+        self.assertFalse('inputs' in s) # left out, stays as it is
+        self.assertEqual(self.Load({'thin': None})['thin'], None)
+
+    def test_repo_file(self):
+        cfg = midiroute.RouterConfig(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                  'midiroute.json'))
+        cfg.Load()
+        self.assertEqual(cfg.settings['knobs'], KNOBS)
+
+    def test_bad(self):
+        knobs = list(KNOBS)
+        for doc in ('{', '[]', {'knob': knobs},
+                    {'knobs': knobs[:7]}, {'knobs': knobs[:7] + [1]},
+                    {'knobs': knobs[:7] + [70]}, {'knobs': knobs[:7] + [128]},
+                    {'knobs': knobs[:7] + [True]}, {'knobs': knobs[:7] + ['77']},
+                    {'zones': ['0-59:17']}, {'zones': '0-59:1'}, {'zones': ['']},
+                    {'thin': [50]}, {'thin': [50, 128]}, {'thin': [-1, 0]},
+                    {'nrpn_window': 10001}, {'nrpn_window': 2.5},
+                    {'modwheel_bankprog': 1}, {'inputs': ['']},
+                    {'prog_table': [[0, 'bank', 0, 'prog']] * 11}):
+            self.assertRaises(ValueError, self.Load, doc)
+
+    def test_bad_keeps_settings(self):
+        cfg = midiroute.RouterConfig(self.path)
+        f = open(self.path, 'w')
+        f.write('{"nrpn_window": 5}')
+        f.close()
+        cfg.Load()
+        f = open(self.path, 'w')
+        f.write('{"nrpn_window": -5}')
+        f.close()
+        self.assertRaises(ValueError, cfg.Load)
+        self.assertEqual(cfg.settings, {'nrpn_window': 0.005})
+
+    def test_missing(self):
+        cfg = midiroute.RouterConfig(self.path + '.none')
+        self.assertRaises(ValueError, cfg.Load)
+
+class TestApplyConfig(RouterTest):
+    def test_knobs(self):
+        ' new knobs take over on a running Main, the old CC passes '
+        (fd, path) = tempfile.mkstemp(suffix='.json')
+        os.write(fd, b'{"knobs": [20, 21, 22, 23, 24, 25, 26, 27]}')
+        os.close(fd)
+        try:
+            cfg = midiroute.RouterConfig(path)
+            cfg.Load()
+        finally:
+            os.remove(path)
+        self.main.ApplyConfig(cfg)
+        self.Route((0xb0, 20, 10), (0xb0, KNOB0_CC, 11))
+        self.assertEqual(self.Sent()[-2:], [(0xb0, 38, 10), (0xb0, KNOB0_CC, 11)])
+
+#-------------------------------------------
+if __name__ == '__main__':
+    unittest.main()
@@ -181,14 +181,15 @@ class YoshiBankProg:
     #---------------------------------------------------
     def sendBankProgSelect(self, ch, bank_num, prog_num):
         ' Send bank and prog_num, or just prog_num '
+        pkts = []
         if bank_num >= 0:
-            if self.mDev != None:
-                self.mDev.Write([0xb0 | ch,0,0]) # msb, leave 0 like yamaha output
-                self.mDev.Write([0xb0 | ch,0x20,bank_num]) # lsb, for primary bank selection
+            pkts.append([0xb0 | ch,0,0]) # msb, leave 0 like yamaha output
+            pkts.append([0xb0 | ch,0x20,bank_num]) # lsb, for primary bank selection
             self.ChanSelection[self.mChannel][0] = bank_num
         # need to send prog change to activate ?  I think so..
+        pkts.append([0xc0 | ch, prog_num-1])
         if self.mDev != None:
-            self.mDev.Write([0xc0 | ch, prog_num-1])
+            self.mDev.WriteMany(pkts) # all together, one alsa drain
         self.ChanSelection[self.mChannel][1] = prog_num
 
     #---------------------------------------------------